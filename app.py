@@ -1,10 +1,24 @@
+import time
+_inicio_importacion = time.perf_counter()
+
 import os
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+import hmac
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, g, Response
 from dotenv import load_dotenv
 from backend.config.firebase_config import firebase_config
-from firebase_admin import auth
-import requests
-import json
+from backend.services.roles import obtener_rol_usuario, consultar_rol, guardar_rol_en_sesion
+from backend.services.horarios import configuracion_horarios, guardar_configuracion, nueva_version
+from backend.services.calendario import lunes_de, reconstruir_semana
+from backend.services.ocupacion import reconstruir_ocupacion, materializar_series
+from backend.services.desnormalizacion import completar_pendientes
+from backend.services.busqueda import tokens_paciente
+from backend.services.versiones import incrementar
+from backend.services.cache import cache_referencias, obtener_coleccion, invalidar_coleccion
+from backend.services.autenticacion import iniciar_sesion, metricas_auth
+from backend.services.arranque import tiempos_arranque
+from backend.services.consumo_firestore import iniciar_consumo, consumo_actual, LOG_UMBRAL_MS
+from backend.services.metricas import metricas, solicitudes_http, duracion_http
+import click
 from datetime import datetime, date,timedelta
 from backend.routes.usuarios import usuarios_bp
 from backend.routes.pacientes import pacientes_bp
@@ -12,6 +26,7 @@ from backend.routes.servicios import servicios_bp
 from backend.routes.citas import citas_bp
 from backend.routes.reprogramaciones import reprogramaciones_bp
 from backend.routes.api import api_bp
+from backend.routes.api_async import api_async_bp
 
 
 from functools import wraps
@@ -30,6 +45,51 @@ app.register_blueprint(servicios_bp)
 app.register_blueprint(citas_bp)
 app.register_blueprint(reprogramaciones_bp)
 app.register_blueprint(api_bp)
+app.register_blueprint(api_async_bp)
+
+
+# Tiempo del primer request de la instancia (incluye inicializar Firebase y la primera consulta)
+@app.before_request
+def marcar_inicio_request():
+    g.inicio_request = time.perf_counter()
+
+@app.after_request
+def reportar_arranque(response):
+    if 'primer_request' not in tiempos_arranque.etapas and 'inicio_request' in g:
+        tiempos_arranque.registrar('primer_request', time.perf_counter() - g.inicio_request)
+        tiempos_arranque.imprimir_una_vez()
+    return response
+
+
+# Consumo de Firestore por request (Server-Timing). Las respuestas en streaming se
+# envían después de after_request: el header solo incluye lo leído antes del primer byte.
+@app.before_request
+def iniciar_consumo_firestore():
+    iniciar_consumo()
+
+@app.after_request
+def reportar_consumo_firestore(response):
+    consumo = consumo_actual()
+    if consumo is not None:
+        response.headers.add('Server-Timing', consumo.server_timing())
+        if consumo.milisegundos >= LOG_UMBRAL_MS:
+            print(f"Firestore lento: {request.method} {request.path} {consumo.resumen()}")
+    return response
+
+
+# Métricas por endpoint (/metrics). Se registran en teardown_request, que también corre
+# cuando la vista lanza una excepción (sin after_request): esos requests cuentan como 500
+@app.after_request
+def guardar_estado_http(response):
+    g.estado_http = response.status_code
+    return response
+
+@app.teardown_request
+def registrar_metricas_http(error=None):
+    endpoint = request.endpoint or 'sin_endpoint'
+    solicitudes_http.incrementar(endpoint, request.method, str(g.get('estado_http', 500)))
+    if 'inicio_request' in g:
+        duracion_http.observar(time.perf_counter() - g.inicio_request, endpoint, request.method)
 
 
 # Configuración prroducción
@@ -38,26 +98,6 @@ if os.getenv('VERCEL_ENV') == 'production':
     app.config['SESSION_COOKIE_HTTPONLY'] = True
     
     
-def obtener_rol_usuario():
-    """Obtiene el rol del usuario actual"""
-    if 'user_id' not in session:
-        return None
-    
-    try:
-        db = firebase_config.get_db()
-        # Buscar usuario por UID de Firebase
-        usuarios_ref = db.collection('usuarios_sistema')
-        usuarios = usuarios_ref.where('uid', '==', session['user_id']).limit(1).stream()
-        
-        for doc in usuarios:
-            usuario_data = doc.to_dict()
-            return usuario_data.get('rol', 'profesional')  # Default profesional
-        
-        return 'profesional' 
-    except:
-        return 'profesional'
-    
-    
 def requiere_administrador(f):
     """Decorador para rutas que requieren rol administrador"""
     @wraps(f)
@@ -103,9 +143,15 @@ def requiere_rol(rol_requerido):
 @app.context_processor
 def inject_user_role():
     """agrega el rol del usuario en todos los templates"""
-    return {
-        'user_role': obtener_rol_usuario() if 'user_id' in session else None
-    }
+    if 'user_id' not in session:
+        return {'user_role': None}
+    try:
+        rol = obtener_rol_usuario()
+    except Exception as e:
+        # Solo se usa para mostrar: los permisos los validan los decoradores, que no caen al de la sesión
+        print(f"Error consultando rol, se muestra el de la sesión: {e}")
+        rol = session.get('user_role')
+    return {'user_role': rol}
 
 @app.route("/")
 def home():
@@ -122,27 +168,16 @@ def login():
         password = request.form['password']
         
         try:
-            # API Key de Firebase
-            api_key = os.getenv('FIREBASE_WEB_API_KEY')  
+            # Firebase Auth REST API (conexión reutilizada, con timeout y reintentos)
+            status_code, result = iniciar_sesion(email, password)
             
-            # Endpoint de Firebase Auth REST API
-            url = f"https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword?key={api_key}"
-            
-            payload = {
-                "email": email,
-                "password": password,
-                "returnSecureToken": True
-            }
-            
-            response = requests.post(url, data=json.dumps(payload))
-            result = response.json()
-            
-            if response.status_code == 200:
-                # Login exitoso
+            if status_code == 200:
+                # Login exitoso (el rol se consulta antes de abrir la sesión)
+                rol = consultar_rol(result['localId'])
                 session['user_id'] = result['localId']
                 session['user_email'] = result['email']
                 session['id_token'] = result['idToken']
-                session['user_role'] = "administrador"
+                guardar_rol_en_sesion(rol)
                 flash('Login exitoso', 'success')
                 return redirect(url_for('dashboard'))
             else:
@@ -183,6 +218,7 @@ def inicializar_horarios():
         # Verificar si ya existe configuración
         existing = horarios_ref.document('configuracion_centro').get()
         if existing.exists:
+            configuracion_horarios.actualizar(existing.to_dict())
             return
         
         # Crear configuración por defecto
@@ -190,38 +226,17 @@ def inicializar_horarios():
             "hora_inicio": "09:00",
             "hora_termino": "18:00", 
             "activo": True,
-            "fecha_creacion": datetime.now().isoformat()
+            "fecha_creacion": datetime.now().isoformat(),
+            "version": nueva_version()
         }
         
         horarios_ref.document('configuracion_centro').set(config_data)
+        configuracion_horarios.actualizar(config_data)
         print("Configuración de horarios inicializada")
         
     except Exception as e:
         print(f"Error inicializando horarios: {e}")
 
-def generar_horarios():
-    """Genera horarios basados en configuración del centro"""
-    try:
-        db = firebase_config.get_db()
-        config_doc = db.collection('horarios').document('configuracion_centro').get()
-        
-        if config_doc.exists:
-            config = config_doc.to_dict()
-            hora_inicio = int(config['hora_inicio'].split(':')[0])
-            hora_termino = int(config['hora_termino'].split(':')[0])
-        else:
-            hora_inicio, hora_termino = 9, 18
-        
-        horarios = []
-        for hora in range(hora_inicio, hora_termino + 1):
-            horarios.append(f"{hora:02d}:00")
-        
-        return horarios
-        
-    except Exception as e:
-        print(f"Error obteniendo configuración: {e}")
-        return ["09:00", "10:00", "11:00", "12:00", "13:00", "14:00", "15:00", "16:00", "17:00", "18:00"]
-
 @app.route("/horarios", methods=['GET', 'POST'])
 @requiere_administrador 
 def horarios():
@@ -235,16 +250,8 @@ def horarios():
         
         try:
             db = firebase_config.get_db()
-            # ccolección horarios
-            config_ref = db.collection('horarios').document('configuracion_centro')
-            
-            # Usar set() con merge=True para crear o actualizar
-            config_ref.set({
-                'hora_inicio': hora_inicio,
-                'hora_termino': hora_termino,
-                'activo': True,
-                'fecha_modificacion': datetime.now().isoformat()
-            }, merge=True)
+            # Guarda en la colección horarios y actualiza la configuración en memoria
+            guardar_configuracion(db, hora_inicio, hora_termino)
             
             flash('Horarios actualizados correctamente', 'horarios_success')
             return redirect(url_for('horarios'))
@@ -256,15 +263,7 @@ def horarios():
     
     # Obtener configuración actual
     try:
-        db = firebase_config.get_db()
-        config_doc = db.collection('horarios').document('configuracion_centro').get()
-        
-        if config_doc.exists:
-            configuracion = config_doc.to_dict()
-        else:
-            # Inicializar si no existe
-            configuracion = {"hora_inicio": "09:00", "hora_termino": "18:00"}
-            db.collection('horarios').document('configuracion_centro').set(configuracion)
+        configuracion = configuracion_horarios.obtener_configuracion()
         
         return render_template('horarios.html', configuracion=configuracion)
         
@@ -283,7 +282,7 @@ def inicializar_especialidades():
         # Verificar si ya existen
         existing = list(especialidades_ref.limit(1).stream())
         if existing:
-            return
+            return False
         
         # Crear especialidades básicas
         especialidades_default = [
@@ -311,10 +310,13 @@ def inicializar_especialidades():
         for especialidad in especialidades_default:
             especialidades_ref.add(especialidad)
         
+        invalidar_coleccion('especialidades')
         print("Especialidades inicializadas")
+        return True
         
     except Exception as e:
         print(f"Error inicializando especialidades: {e}")
+        return False
 
 @app.route("/especialidades")
 @requiere_administrador 
@@ -325,12 +327,11 @@ def especialidades():
     
     try:
         db = firebase_config.get_db()
-        especialidades = []
+        especialidades = obtener_coleccion(db, 'especialidades')
         
-        for doc in db.collection('especialidades').stream():
-            especialidad_data = doc.to_dict()
-            especialidad_data['id'] = doc.id
-            especialidades.append(especialidad_data)
+        # Primer uso en una base nueva: crear las especialidades básicas
+        if not especialidades and inicializar_especialidades():
+            especialidades = obtener_coleccion(db, 'especialidades')
         
         return render_template('especialidades.html', especialidades=especialidades)
         
@@ -339,9 +340,129 @@ def especialidades():
         return render_template('especialidades.html', especialidades=[])
     
 
-# Inicializar datos base
-inicializar_horarios()
-inicializar_especialidades()
+@app.route("/cache/estadisticas")
+@requiere_administrador
+def cache_estadisticas():
+    """Contadores de hits/misses del cache de colecciones"""
+    return jsonify(cache_referencias.estadisticas())
+
+
+@app.route("/auth/estadisticas")
+@requiere_administrador
+def auth_estadisticas():
+    """Latencias y reintentos de las llamadas a Firebase Auth"""
+    return jsonify(metricas_auth.estadisticas())
+
+
+@app.route("/arranque")
+@requiere_administrador
+def arranque():
+    """Tiempos de arranque de esta instancia (ms)"""
+    return jsonify(tiempos_arranque.reporte())
+
+
+def requiere_token_metricas(f):
+    """Acepta el header Authorization: Bearer <METRICS_TOKEN> (scrapers) o una sesión de administrador"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        token = os.getenv('METRICS_TOKEN')
+        autorizacion = request.headers.get('Authorization', '')
+        if token and hmac.compare_digest(autorizacion.encode(), f"Bearer {token}".encode()):
+            return f(*args, **kwargs)
+        return requiere_administrador(f)(*args, **kwargs)
+    return decorated_function
+
+
+@app.route("/metrics")
+@requiere_token_metricas
+def metrics():
+    """Métricas de la instancia en formato de texto de Prometheus"""
+    return Response(metricas.exponer(), mimetype='text/plain; version=0.0.4')
+
+
+@app.cli.command("inicializar-datos")
+def inicializar_datos():
+    """Crea la configuración de horarios y las especialidades básicas si no existen"""
+    inicializar_horarios()
+    inicializar_especialidades()
+
+
+@app.cli.command("tiempos-arranque")
+def tiempos_arranque_cli():
+    """Mide el arranque en frío: importación, credenciales, cliente y primera consulta"""
+    db = firebase_config.get_db()
+    with tiempos_arranque.medir('primera_consulta'):
+        db.collection('horarios').document('configuracion_centro').get()
+    for etapa, ms in tiempos_arranque.reporte().items():
+        print(f"{etapa:<20} {ms:>8.1f} ms")
+
+
+@app.cli.command("reconstruir-calendario")
+@click.option('--desde', help='Fecha inicial YYYY-MM-DD (por defecto la semana actual)')
+@click.option('--hasta', help='Fecha final YYYY-MM-DD (por defecto la fecha de la última cita guardada)')
+def reconstruir_calendario(desde, hasta):
+    """
+    Reconstruye los documentos calendario_semanas y ocupacion_horarios de un rango de fechas.
+    Por defecto cubre desde hoy hasta la última cita: agendar solo revisa ocupacion_horarios,
+    así que las citas futuras sin su documento de ocupación podrían quedar con doble reserva.
+    """
+    db = firebase_config.get_db()
+    lunes = datetime.strptime(lunes_de(desde or date.today().strftime('%Y-%m-%d')), '%Y-%m-%d')
+    if not hasta:
+        ultima = list(db.collection('citas').order_by('fecha', direction='DESCENDING').limit(1).stream())
+        hasta = ultima[0].to_dict()['fecha'] if ultima else lunes.strftime('%Y-%m-%d')
+    ultimo_lunes = datetime.strptime(lunes_de(hasta), '%Y-%m-%d')
+    
+    while lunes <= ultimo_lunes:
+        lunes_str = lunes.strftime('%Y-%m-%d')
+        domingo_str = (lunes + timedelta(days=6)).strftime('%Y-%m-%d')
+        citas = reconstruir_semana(db, lunes_str)
+        bloques = reconstruir_ocupacion(db, lunes_str, domingo_str)
+        print(f"Semana {lunes_str}: {len(citas)} citas, {bloques} bloques ocupados")
+        lunes += timedelta(days=7)
+
+
+@app.cli.command("materializar-series")
+@click.option('--hasta', help='Fecha final YYYY-MM-DD (por defecto ayer)')
+def materializar_series_citas(hasta):
+    """Guarda como citas las ocurrencias ya realizadas de las series recurrentes"""
+    db = firebase_config.get_db()
+    hasta = hasta or (date.today() - timedelta(days=1)).strftime('%Y-%m-%d')
+    total = materializar_series(db, hasta)
+    print(f"{total} citas materializadas hasta {hasta}")
+
+
+@app.cli.command("propagar-nombres")
+def propagar_nombres():
+    """Reintenta los cambios de nombre que no alcanzaron a llegar a las citas"""
+    db = firebase_config.get_db()
+    completadas, fallidas = completar_pendientes(db)
+    print(f"{completadas} propagaciones completadas, {fallidas} con error")
+
+
+@app.cli.command("reindexar-pacientes")
+def reindexar_pacientes():
+    """Recalcula tokens_busqueda de todos los pacientes"""
+    db = firebase_config.get_db()
+    batch = db.batch()
+    total = 0
+    
+    for doc in db.collection('pacientes').stream():
+        batch.update(doc.reference, {'tokens_busqueda': tokens_paciente(doc.to_dict())})
+        total += 1
+        # Firestore admite hasta 500 escrituras por batch
+        if total % 500 == 0:
+            batch.commit()
+            batch = db.batch()
+    
+    batch.commit()
+    invalidar_coleccion('pacientes')
+    incrementar(db, ['pacientes'])
+    print(f"{total} pacientes reindexados")
+
+
+# Datos base: se crean con "flask inicializar-datos" (o al primer uso), no al importar
+tiempos_arranque.registrar('importacion', time.perf_counter() - _inicio_importacion)
 
 if __name__ == "__main__":
     
@@ -0,0 +1,40 @@
+# Acceso diferido a las dependencias pesadas (firebase_admin, google-cloud-firestore,
+# requests). Importarlas al cargar los módulos cuesta cientos de ms en cada arranque en
+# frío, incluso para rutas que no usan Firestore; así se importan en el primer uso.
+# Python deja el módulo en sys.modules, por lo que las llamadas siguientes son baratas.
+
+
+def firebase_admin():
+    """Paquete firebase_admin"""
+    import firebase_admin as modulo
+    return modulo
+
+
+def firebase_admin_modulo(nombre):
+    """Submódulo de firebase_admin: credentials, firestore, firestore_async o auth"""
+    import importlib
+    return importlib.import_module(f"firebase_admin.{nombre}")
+
+
+def firestore():
+    """Módulo google.cloud.firestore (DELETE_FIELD, Increment, ArrayUnion, transactional...)"""
+    from google.cloud import firestore as modulo
+    return modulo
+
+
+def field_path():
+    """Clase FieldPath de Firestore"""
+    from google.cloud.firestore_v1.field_path import FieldPath
+    return FieldPath
+
+
+def excepciones_google():
+    """Módulo google.api_core.exceptions (AlreadyExists, Conflict...)"""
+    from google.api_core import exceptions
+    return exceptions
+
+
+def requests():
+    """Paquete requests"""
+    import requests as modulo
+    return modulo
@@ -1,81 +1,139 @@
-import firebase_admin
-from firebase_admin import credentials, firestore, auth
 import os
-import json
+import threading
 from dotenv import load_dotenv
+from backend.config.dependencias import firebase_admin, firebase_admin_modulo
+from backend.services.arranque import tiempos_arranque
+from backend.services.consumo_firestore import medir_cliente
 
 load_dotenv()
 
 class FirebaseConfig:
+    """
+    Inicializa Firebase Admin la primera vez que se pide un cliente, no al importar:
+    así un arranque en frío no paga credenciales ni conexión antes del primer request.
+    """
     def __init__(self):
         self.db = None
+        self.db_async = None
         self.auth = None
-        self.initialize()
+        self._inicializado = False
+        self._lock = threading.Lock()
+    
+    def _asegurar_inicializado(self):
+        """
+        Inicializa una sola vez por proceso (seguro entre hilos). Si falla se
+        reintenta en la siguiente llamada, en vez de quedar sin cliente hasta reiniciar.
+        """
+        if self._inicializado:
+            return
+        with self._lock:
+            if not self._inicializado:
+                self._inicializado = bool(self.initialize())
     
     def initialize(self):
         """Inicializar Firebase Admin SDK"""
-        if not firebase_admin._apps:
+        if os.getenv('FIRESTORE_BACKEND') == 'memoria':
+            return self.initialize_memoria()
+
+        if not firebase_admin()._apps:
             try:
                 # Verificar si estamos en Vercel (producción)
                 if os.getenv('VERCEL_ENV'):
                     # En Vercel, usar variables de entorno para las credenciales
-                    firebase_credentials = {
-                        "type": os.getenv('FIREBASE_TYPE', 'service_account'),
-                        "project_id": os.getenv('FIREBASE_PROJECT_ID'),
-                        "private_key_id": os.getenv('FIREBASE_PRIVATE_KEY_ID'),
-                        "private_key": os.getenv('FIREBASE_PRIVATE_KEY', '').replace('\\n', '\n'),
-                        "client_email": os.getenv('FIREBASE_CLIENT_EMAIL'),
-                        "client_id": os.getenv('FIREBASE_CLIENT_ID'),
-                        "auth_uri": os.getenv('FIREBASE_AUTH_URI', 'https://accounts.google.com/o/oauth2/auth'),
-                        "token_uri": os.getenv('FIREBASE_TOKEN_URI', 'https://oauth2.googleapis.com/token'),
-                        "auth_provider_x509_cert_url": os.getenv('FIREBASE_AUTH_PROVIDER_CERT_URL', 'https://www.googleapis.com/oauth2/v1/certs'),
-                        "client_x509_cert_url": os.getenv('FIREBASE_CLIENT_CERT_URL')
-                    }
-                    
-                    # Validar que las credenciales estén completas
-                    if not all([firebase_credentials['project_id'], 
-                              firebase_credentials['private_key'], 
-                              firebase_credentials['client_email']]):
-                        raise ValueError("Credenciales Firebase incompletas en variables de entorno")
-                    
-                    cred = credentials.Certificate(firebase_credentials)
-                    firebase_admin.initialize_app(cred)
+                    with tiempos_arranque.medir('credenciales'):
+                        firebase_credentials = {
+                            "type": os.getenv('FIREBASE_TYPE', 'service_account'),
+                            "project_id": os.getenv('FIREBASE_PROJECT_ID'),
+                            "private_key_id": os.getenv('FIREBASE_PRIVATE_KEY_ID'),
+                            "private_key": os.getenv('FIREBASE_PRIVATE_KEY', '').replace('\\n', '\n'),
+                            "client_email": os.getenv('FIREBASE_CLIENT_EMAIL'),
+                            "client_id": os.getenv('FIREBASE_CLIENT_ID'),
+                            "auth_uri": os.getenv('FIREBASE_AUTH_URI', 'https://accounts.google.com/o/oauth2/auth'),
+                            "token_uri": os.getenv('FIREBASE_TOKEN_URI', 'https://oauth2.googleapis.com/token'),
+                            "auth_provider_x509_cert_url": os.getenv('FIREBASE_AUTH_PROVIDER_CERT_URL', 'https://www.googleapis.com/oauth2/v1/certs'),
+                            "client_x509_cert_url": os.getenv('FIREBASE_CLIENT_CERT_URL')
+                        }
+                        
+                        # Validar que las credenciales estén completas
+                        if not all([firebase_credentials['project_id'], 
+                                  firebase_credentials['private_key'], 
+                                  firebase_credentials['client_email']]):
+                            raise ValueError("Credenciales Firebase incompletas en variables de entorno")
+                        
+                        cred = firebase_admin_modulo('credentials').Certificate(firebase_credentials)
+                    with tiempos_arranque.medir('inicializar_app'):
+                        firebase_admin().initialize_app(cred)
                     print("Firebase inicializado con variables de entorno (Vercel)")
                 
                 else:
                     # Desarrollo local: usar archivo JSON
-                    cred_path = os.getenv('FIREBASE_CREDENTIALS_PATH')
-                    if not cred_path or not os.path.exists(cred_path):
-                        raise FileNotFoundError("Archivo de credenciales Firebase no encontrado")
-                    
-                    cred = credentials.Certificate(cred_path)
-                    firebase_admin.initialize_app(cred)
+                    with tiempos_arranque.medir('credenciales'):
+                        cred_path = os.getenv('FIREBASE_CREDENTIALS_PATH')
+                        if not cred_path or not os.path.exists(cred_path):
+                            raise FileNotFoundError("Archivo de credenciales Firebase no encontrado")
+                        
+                        cred = firebase_admin_modulo('credentials').Certificate(cred_path)
+                    with tiempos_arranque.medir('inicializar_app'):
+                        firebase_admin().initialize_app(cred)
                     print("Firebase inicializado con archivo JSON (local)")
                 
             except Exception as e:
                 print(f"Error inicializando Firebase: {e}")
                 return False
         
-        self.db = firestore.client()
-        self.auth = auth
+        with tiempos_arranque.medir('cliente_firestore'):
+            self.db = medir_cliente(firebase_admin_modulo('firestore').client())
+        self.auth = firebase_admin_modulo('auth')
+        return True
+    
+    def initialize_memoria(self):
+        """
+        Cliente en memoria (FIRESTORE_BACKEND=memoria), para medir rutas sin un proyecto
+        de Google. FIRESTORE_LATENCIA_MS simula la latencia de cada RPC y
+        FIRESTORE_MEMORIA_DATOS es un JSON {coleccion: {id: datos}} con los datos iniciales.
+        Sin Firebase Auth ni cliente asíncrono.
+        """
+        from backend.config.firestore_memoria import ClienteMemoria
+        with tiempos_arranque.medir('cliente_firestore'):
+            db = ClienteMemoria(latencia_ms=float(os.getenv('FIRESTORE_LATENCIA_MS', '0')))
+            ruta_datos = os.getenv('FIRESTORE_MEMORIA_DATOS')
+            if ruta_datos:
+                db.cargar_json(ruta_datos)
+            self.db = medir_cliente(db)
+        print("Firestore en memoria (FIRESTORE_BACKEND=memoria)")
         return True
     
     def get_db(self):
-        """Obtener cliente de Firestore"""
+        """Obtener cliente de Firestore (medido por request, ver consumo_firestore)"""
+        self._asegurar_inicializado()
         return self.db
     
+    def get_db_async(self):
+        """
+        Obtener cliente asíncrono de Firestore (AsyncClient).
+        Sus canales quedan atados al event loop donde se usa por primera vez: usar
+        solo dentro del loop de backend.services.asincrono
+        """
+        if os.getenv('FIRESTORE_BACKEND') == 'memoria':
+            return None
+        if self.db_async is None and self.get_db() is not None:
+            self.db_async = firebase_admin_modulo('firestore_async').client()
+        return self.db_async
+    
     def get_auth(self):
         """Obtener cliente de Authentication"""
+        self._asegurar_inicializado()
         return self.auth
     
     def verify_token(self, id_token):
         """Verificar token de Firebase Auth"""
+        self._asegurar_inicializado()
         try:
-            decoded_token = auth.verify_id_token(id_token)
+            decoded_token = self.auth.verify_id_token(id_token)
             return decoded_token
         except Exception as e:
             print(f"Error verificando token: {e}")
             return None
 
-# Instancia global
-firebase_config = FirebaseConfig()
\ No newline at end of file
+# Instancia global (sin inicializar hasta el primer uso)
+firebase_config = FirebaseConfig()
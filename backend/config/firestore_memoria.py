@@ -0,0 +1,485 @@
+# Cliente de Firestore en memoria para medir y probar rutas sin un proyecto de Google
+# (FIRESTORE_BACKEND=memoria). Implementa la parte de la API del cliente que usa la app:
+# referencias, consultas (where, rangos, order_by, start_after, limit, select, count),
+# get_all, batches y transacciones con los mismos centinelas (Increment, ArrayUnion,
+# DELETE_FIELD). Cada llamada que en Firestore es un RPC espera FIRESTORE_LATENCIA_MS,
+# así los tiempos locales se parecen a los de producción.
+import copy
+import json
+import time
+import random
+import string
+import threading
+from functools import cmp_to_key
+from datetime import datetime, timezone
+from backend.config.dependencias import firestore, excepciones_google
+
+MAX_ESCRITURAS_BATCH = 500
+MAX_INTENTOS_TRANSACCION = 5
+
+# Campo especial que representa el ID del documento (FieldPath.document_id())
+CAMPO_ID = '__name__'
+
+_FALTA = object()
+
+OPERADORES = {
+    '==': lambda valor, filtro: valor == filtro,
+    '!=': lambda valor, filtro: valor != filtro,
+    '<': lambda valor, filtro: valor < filtro,
+    '<=': lambda valor, filtro: valor <= filtro,
+    '>': lambda valor, filtro: valor > filtro,
+    '>=': lambda valor, filtro: valor >= filtro,
+    'in': lambda valor, filtro: valor in filtro,
+    'not-in': lambda valor, filtro: valor not in filtro,
+    'array_contains': lambda valor, filtro: isinstance(valor, list) and filtro in valor,
+    'array_contains_any': lambda valor, filtro: isinstance(valor, list) and any(v in valor for v in filtro),
+}
+OPERADORES['array-contains'] = OPERADORES['array_contains']
+OPERADORES['array-contains-any'] = OPERADORES['array_contains_any']
+
+OPERADORES_RANGO = {'<', '<=', '>', '>=', '!=', 'not-in'}
+
+
+def _id_automatico():
+    return ''.join(random.choices(string.ascii_letters + string.digits, k=20))
+
+
+def _leer_campo(doc_id, datos, campo):
+    """Valor de un campo (con puntos para mapas anidados), o _FALTA"""
+    if campo == CAMPO_ID:
+        return doc_id
+    valor = datos
+    for parte in campo.split('.'):
+        if not isinstance(valor, dict) or parte not in valor:
+            return _FALTA
+        valor = valor[parte]
+    return valor
+
+
+def _comparar(a, b):
+    if a == b:
+        return 0
+    try:
+        return -1 if a < b else 1
+    except TypeError:
+        # Tipos distintos: orden estable por nombre de tipo
+        return -1 if type(a).__name__ < type(b).__name__ else 1
+
+
+def _asignar(datos, ruta, valor):
+    """Asigna un valor (o aplica un centinela) en la ruta de campos indicada"""
+    fs = firestore()
+    *padres, campo = ruta
+    for parte in padres:
+        if not isinstance(datos.get(parte), dict):
+            datos[parte] = {}
+        datos = datos[parte]
+
+    if valor is fs.DELETE_FIELD:
+        datos.pop(campo, None)
+    elif valor is fs.SERVER_TIMESTAMP:
+        datos[campo] = datetime.now(timezone.utc)
+    elif isinstance(valor, fs.Increment):
+        actual = datos.get(campo)
+        datos[campo] = actual + valor.value if isinstance(actual, (int, float)) else valor.value
+    elif isinstance(valor, fs.ArrayUnion):
+        lista = list(datos.get(campo) or [])
+        datos[campo] = lista + [v for v in valor.values if v not in lista]
+    elif isinstance(valor, fs.ArrayRemove):
+        datos[campo] = [v for v in datos.get(campo) or [] if v not in valor.values]
+    else:
+        datos[campo] = copy.deepcopy(valor)
+
+
+def _aplanar(datos, prefijo=()):
+    """Rutas hoja de un dict anidado (para set con merge)"""
+    for campo, valor in datos.items():
+        ruta = prefijo + (campo,)
+        if isinstance(valor, dict) and valor:
+            yield from _aplanar(valor, ruta)
+        else:
+            yield ruta, valor
+
+
+class SnapshotMemoria:
+    """Equivalente a DocumentSnapshot"""
+
+    def __init__(self, referencia, datos, campos=None):
+        self.reference = referencia
+        self._datos = datos
+        self._campos = campos
+
+    @property
+    def id(self):
+        return self.reference.id
+
+    @property
+    def exists(self):
+        return self._datos is not None
+
+    def to_dict(self):
+        if self._datos is None:
+            return None
+        if self._campos is None:
+            return copy.deepcopy(self._datos)
+        proyeccion = {}
+        for campo in self._campos:
+            valor = _leer_campo(self.id, self._datos, campo)
+            if valor is not _FALTA:
+                _asignar(proyeccion, campo.split('.'), valor)
+        return proyeccion
+
+    def get(self, campo):
+        valor = _leer_campo(self.id, self._datos or {}, campo)
+        if valor is _FALTA:
+            raise KeyError(campo)
+        return copy.deepcopy(valor)
+
+
+class ReferenciaMemoria:
+    """Equivalente a DocumentReference"""
+
+    def __init__(self, cliente, coleccion, doc_id):
+        self._cliente = cliente
+        self._coleccion = coleccion
+        self.id = doc_id
+
+    @property
+    def path(self):
+        return f"{self._coleccion}/{self.id}"
+
+    @property
+    def parent(self):
+        return ColeccionMemoria(self._cliente, self._coleccion)
+
+    def __eq__(self, otra):
+        return isinstance(otra, ReferenciaMemoria) and otra.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def get(self, field_paths=None, transaction=None):
+        self._cliente.rpc()
+        return self._cliente.leer(self, field_paths, transaction)
+
+    def set(self, datos, merge=False):
+        self._cliente.escribir([('set', self, datos, merge)])
+
+    def create(self, datos):
+        self._cliente.escribir([('create', self, datos, False)])
+
+    def update(self, datos):
+        self._cliente.escribir([('update', self, datos, False)])
+
+    def delete(self):
+        self._cliente.escribir([('delete', self, None, False)])
+
+
+class ResultadoAgregacion:
+    def __init__(self, alias, value):
+        self.alias = alias
+        self.value = value
+
+
+class ConteoMemoria:
+    """Equivalente a AggregationQuery con count()"""
+
+    def __init__(self, consulta, alias):
+        self._consulta = consulta
+        self._alias = alias or 'field_1'
+
+    def get(self, transaction=None):
+        self._consulta._cliente.rpc()
+        return [[ResultadoAgregacion(self._alias, len(self._consulta._resultados()))]]
+
+
+class ConsultaMemoria:
+    """Equivalente a Query (inmutable: cada método retorna una consulta nueva)"""
+
+    def __init__(self, cliente, coleccion, filtros=(), orden=(), limite=None, saltar=0, cursor=None, campos=None):
+        self._cliente = cliente
+        self._coleccion = coleccion
+        self._filtros = tuple(filtros)
+        self._orden = tuple(orden)
+        self._limite = limite
+        self._saltar = saltar
+        self._cursor = cursor
+        self._campos = campos
+
+    def _copiar(self, **cambios):
+        valores = dict(filtros=self._filtros, orden=self._orden, limite=self._limite, saltar=self._saltar,
+                       cursor=self._cursor, campos=self._campos)
+        valores.update(cambios)
+        return ConsultaMemoria(self._cliente, self._coleccion, **valores)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        if op_string not in OPERADORES:
+            raise ValueError(f"Operador no soportado: {op_string}")
+        return self._copiar(filtros=self._filtros + ((field_path, op_string, value),))
+
+    def order_by(self, field_path, direction='ASCENDING'):
+        return self._copiar(orden=self._orden + ((field_path, direction),))
+
+    def limit(self, count):
+        return self._copiar(limite=count)
+
+    def offset(self, num_to_skip):
+        return self._copiar(saltar=num_to_skip)
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._copiar(cursor=document_fields_or_snapshot)
+
+    def select(self, field_paths):
+        return self._copiar(campos=list(field_paths))
+
+    def count(self, alias=None):
+        return ConteoMemoria(self, alias)
+
+    def _orden_efectivo(self):
+        """Orden explícito, o el campo del primer filtro de rango (como Firestore), más el ID"""
+        orden = list(self._orden)
+        if not orden:
+            rango = next((campo for campo, op, _ in self._filtros if op in OPERADORES_RANGO), None)
+            if rango:
+                orden.append((rango, 'ASCENDING'))
+        if not any(campo == CAMPO_ID for campo, _ in orden):
+            orden.append((CAMPO_ID, orden[-1][1] if orden else 'ASCENDING'))
+        return orden
+
+    def _resultados(self):
+        """Lista de (doc_id, datos) que cumplen la consulta, ordenada y paginada"""
+        orden = self._orden_efectivo()
+        candidatos = []
+        for doc_id, datos in self._cliente.documentos(self._coleccion):
+            cumple = True
+            for campo, op, filtro in self._filtros:
+                valor = _leer_campo(doc_id, datos, campo)
+                try:
+                    cumple = valor is not _FALTA and OPERADORES[op](valor, filtro)
+                except TypeError:
+                    cumple = False
+                if not cumple:
+                    break
+            # Firestore no retorna documentos sin los campos de orden
+            if cumple and all(_leer_campo(doc_id, datos, campo) is not _FALTA for campo, _ in orden):
+                candidatos.append((doc_id, datos))
+
+        def comparar(a, b):
+            for campo, direccion in orden:
+                resultado = _comparar(_leer_campo(a[0], a[1], campo), _leer_campo(b[0], b[1], campo))
+                if resultado:
+                    return -resultado if direccion == 'DESCENDING' else resultado
+            return 0
+
+        candidatos.sort(key=cmp_to_key(comparar))
+
+        if self._cursor is not None:
+            if isinstance(self._cursor, SnapshotMemoria):
+                cursor = (self._cursor.id, self._cursor._datos or {})
+            else:
+                cursor = (self._cursor.get(CAMPO_ID), self._cursor)
+            candidatos = [doc for doc in candidatos if comparar(doc, cursor) > 0]
+
+        candidatos = candidatos[self._saltar:]
+        if self._limite is not None:
+            candidatos = candidatos[:self._limite]
+        return candidatos
+
+    def stream(self, transaction=None):
+        self._cliente.rpc()
+        snapshots = []
+        for doc_id, datos in self._resultados():
+            referencia = ReferenciaMemoria(self._cliente, self._coleccion, doc_id)
+            if transaction is not None:
+                transaction.registrar_lectura(referencia)
+            snapshots.append(SnapshotMemoria(referencia, datos, self._campos))
+        return iter(snapshots)
+
+    def get(self, transaction=None):
+        return list(self.stream(transaction))
+
+
+class ColeccionMemoria(ConsultaMemoria):
+    """Equivalente a CollectionReference"""
+
+    @property
+    def id(self):
+        return self._coleccion
+
+    def document(self, document_id=None):
+        return ReferenciaMemoria(self._cliente, self._coleccion, document_id or _id_automatico())
+
+    def add(self, document_data, document_id=None):
+        referencia = self.document(document_id)
+        referencia.create(document_data)
+        return datetime.now(timezone.utc), referencia
+
+
+class BatchMemoria:
+    """Equivalente a WriteBatch: las escrituras se aplican juntas en commit()"""
+
+    def __init__(self, cliente):
+        self._cliente = cliente
+        self._escrituras = []
+
+    def set(self, referencia, datos, merge=False):
+        self._escrituras.append(('set', referencia, datos, merge))
+
+    def create(self, referencia, datos):
+        self._escrituras.append(('create', referencia, datos, False))
+
+    def update(self, referencia, datos):
+        self._escrituras.append(('update', referencia, datos, False))
+
+    def delete(self, referencia):
+        self._escrituras.append(('delete', referencia, None, False))
+
+    def commit(self):
+        escrituras, self._escrituras = self._escrituras, []
+        self._cliente.escribir(escrituras)
+        return escrituras
+
+
+class TransaccionMemoria(BatchMemoria):
+    """
+    Transacción optimista: registra la versión de cada documento leído y al confirmar
+    reintenta la función si alguno cambió, como hace Firestore con las transacciones.
+    """
+
+    def __init__(self, cliente):
+        super().__init__(cliente)
+        self._lecturas = {}
+
+    def registrar_lectura(self, referencia):
+        self._lecturas.setdefault(referencia.path, self._cliente.version(referencia))
+
+    def get_all(self, references, field_paths=None):
+        return self._cliente.get_all(references, field_paths, transaction=self)
+
+    def get(self, ref_or_query):
+        if isinstance(ref_or_query, ReferenciaMemoria):
+            return iter([ref_or_query.get(transaction=self)])
+        return ref_or_query.stream(transaction=self)
+
+    def ejecutar(self, funcion):
+        """Ejecuta funcion(transaction) y confirma; reintenta si hubo escrituras concurrentes"""
+        for _ in range(MAX_INTENTOS_TRANSACCION):
+            self._escrituras = []
+            self._lecturas = {}
+            resultado = funcion(self)
+            escrituras, self._escrituras = self._escrituras, []
+            if self._cliente.escribir(escrituras, self._lecturas):
+                return resultado
+        raise excepciones_google().Aborted('Demasiados conflictos en la transacción')
+
+
+class ClienteMemoria:
+    """Equivalente a firestore.Client, con los datos en un dict por colección"""
+
+    def __init__(self, latencia_ms=0, datos=None):
+        self.latencia = latencia_ms / 1000
+        self._colecciones = {}
+        self._versiones = {}
+        self._lock = threading.RLock()
+        if datos:
+            self.cargar(datos)
+
+    def rpc(self):
+        """Simula la latencia de ida y vuelta de un RPC"""
+        if self.latencia:
+            time.sleep(self.latencia)
+
+    def cargar(self, datos):
+        """Carga {coleccion: {doc_id: datos}}"""
+        with self._lock:
+            for coleccion, documentos in datos.items():
+                self._colecciones.setdefault(coleccion, {}).update(copy.deepcopy(documentos))
+
+    def cargar_json(self, ruta):
+        with open(ruta, encoding='utf-8') as archivo:
+            self.cargar(json.load(archivo))
+
+    def volcar(self):
+        """Copia de todos los datos ({coleccion: {doc_id: datos}})"""
+        with self._lock:
+            return copy.deepcopy(self._colecciones)
+
+    def collection(self, nombre):
+        return ColeccionMemoria(self, nombre)
+
+    def document(self, ruta):
+        coleccion, doc_id = ruta.split('/')
+        return ReferenciaMemoria(self, coleccion, doc_id)
+
+    def batch(self):
+        return BatchMemoria(self)
+
+    def transaction(self, **_):
+        return TransaccionMemoria(self)
+
+    def documentos(self, coleccion):
+        """(doc_id, datos) de una colección; los datos no deben modificarse"""
+        with self._lock:
+            return list(self._colecciones.get(coleccion, {}).items())
+
+    def version(self, referencia):
+        return self._versiones.get(referencia.path, 0)
+
+    def leer(self, referencia, campos=None, transaction=None):
+        with self._lock:
+            datos = self._colecciones.get(referencia._coleccion, {}).get(referencia.id)
+            if transaction is not None:
+                transaction.registrar_lectura(referencia)
+        return SnapshotMemoria(referencia, datos, campos)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        self.rpc()
+        return iter([self.leer(referencia, field_paths, transaction) for referencia in references])
+
+    def escribir(self, escrituras, lecturas=None):
+        """
+        Aplica las escrituras de forma atómica. Si se indican lecturas ({path: versión})
+        y alguna cambió, no escribe nada y retorna False.
+        """
+        if len(escrituras) > MAX_ESCRITURAS_BATCH:
+            raise excepciones_google().InvalidArgument(
+                f"Un batch admite hasta {MAX_ESCRITURAS_BATCH} escrituras ({len(escrituras)})"
+            )
+        self.rpc()
+        errores = excepciones_google()
+        with self._lock:
+            if lecturas and any(self._versiones.get(path, 0) != version for path, version in lecturas.items()):
+                return False
+
+            # Se aplican sobre copias para que un error deje los datos intactos
+            cambios = {}
+            for operacion, referencia, datos, merge in escrituras:
+                coleccion = self._colecciones.get(referencia._coleccion, {})
+                actual = cambios.get(referencia.path, coleccion.get(referencia.id))
+                if operacion == 'create' and actual is not None:
+                    raise errores.AlreadyExists(f"Documento ya existe: {referencia.path}")
+                if operacion == 'update' and actual is None:
+                    raise errores.NotFound(f"Documento no encontrado: {referencia.path}")
+
+                if operacion == 'delete':
+                    nuevo = None
+                elif operacion == 'update':
+                    nuevo = copy.deepcopy(actual)
+                    for campo, valor in datos.items():
+                        _asignar(nuevo, campo.split('.'), valor)
+                else:
+                    nuevo = copy.deepcopy(actual) if merge and actual is not None else {}
+                    for ruta, valor in _aplanar(datos):
+                        _asignar(nuevo, ruta, valor)
+                cambios[referencia.path] = nuevo
+
+            for path, nuevo in cambios.items():
+                coleccion, doc_id = path.split('/')
+                if nuevo is None:
+                    self._colecciones.get(coleccion, {}).pop(doc_id, None)
+                else:
+                    self._colecciones.setdefault(coleccion, {})[doc_id] = nuevo
+                self._versiones[path] = self._versiones.get(path, 0) + 1
+        return True
@@ -1,38 +1,143 @@
 from flask import Blueprint, jsonify, request
 from backend.config.firebase_config import firebase_config
+from backend.services.cache import obtener_coleccion
+from backend.services.busqueda import buscar_pacientes, LIMITE_RESULTADOS
+from backend.services.paginacion import leer_limite, PaginaEnStream, DocumentoCalculado
+from backend.services.streaming import respuesta_lista
+from backend.services.versiones import respuesta_condicional, claves_semanas
+from backend.routes.pacientes import pagina_pacientes, preparar_paciente, contar_pacientes
+from backend.services.ocupacion import crear_cita, liberar_cita, HorarioOcupadoError
+from backend.services.importacion import importar_citas, leer_filas_json, leer_filas_archivo
+from backend.services.series import VERSION_SERIES, obtener_series, ocurrencias
 from datetime import datetime
 
 api_bp = Blueprint('api', __name__)
 
+def variantes_respuesta():
+    """Lo que además de los datos cambia la respuesta: parámetros y formato pedido"""
+    return [request.full_path, request.headers.get('Accept', '')]
+
+# Orden de /api/citas (el ID del documento se agrega como desempate)
+ORDEN_CITAS = [('fecha', 'ASCENDING'), ('hora', 'ASCENDING')]
+
+def consulta_citas(db, args):
+    """
+    Consulta de /api/citas según los parámetros (sirve para el cliente síncrono y el asíncrono).
+    Retorna (query, campos)
+    """
+    estado = args.get('estado', 'programada')
+    campos = [campo.strip() for campo in args.get('fields', '').split(',') if campo.strip()]
+    query = db.collection('citas')
+    
+    # Filtros
+    if estado != 'todos':
+        query = query.where('estado', '==', estado)
+    for filtro in ['profesional_id', 'paciente_id']:
+        if args.get(filtro):
+            query = query.where(filtro, '==', args[filtro])
+    if args.get('fecha_desde'):
+        query = query.where('fecha', '>=', args['fecha_desde'])
+    if args.get('fecha_hasta'):
+        query = query.where('fecha', '<=', args['fecha_hasta'])
+    
+    # Proyección: los campos de orden se leen siempre para armar el cursor
+    if campos:
+        query = query.select(sorted(set(campos) | {campo for campo, _ in ORDEN_CITAS}))
+    
+    return query, campos
+
+def ocurrencias_citas(series, args):
+    """
+    Ocurrencias de series (aún no guardadas como citas) que cumplen los filtros de
+    /api/citas, como documentos calculados para intercalar en la página
+    """
+    if args.get('estado', 'programada') not in ('programada', 'todos'):
+        return []
+    citas = ocurrencias(series, args.get('fecha_desde') or '0001-01-01', args.get('fecha_hasta') or '9999-12-31')
+    for filtro in ['profesional_id', 'paciente_id']:
+        if args.get(filtro):
+            citas = [cita_data for cita_data in citas if cita_data.get(filtro) == args[filtro]]
+    return [DocumentoCalculado(cita_data) for cita_data in citas]
+
+def claves_citas(args):
+    """
+    Versiones que cubren una consulta de citas: las de las semanas de fecha_desde a fecha_hasta
+    y la de series. Sin un rango acotado retorna None y la respuesta va sin ETag.
+    """
+    claves = claves_semanas(args.get('fecha_desde'), args.get('fecha_hasta'))
+    return claves + [VERSION_SERIES] if claves is not None else None
+
+def datos_cita(doc, campos):
+    """Cita para la respuesta, solo con los campos pedidos (si se indicaron)"""
+    cita_data = doc.to_dict()
+    if campos:
+        cita_data = {campo: cita_data[campo] for campo in campos if campo in cita_data}
+    cita_data['id'] = doc.id
+    return cita_data
+
 @api_bp.route("/api/citas", methods=['GET'])
 def api_get_citas():
-    """API: Obtener citas"""
+    """
+    API: Obtener citas paginadas.
+    Parámetros: limit, cursor, fecha_desde, fecha_hasta, profesional_id, paciente_id,
+    estado (por defecto 'programada'; 'todos' para no filtrar) y fields (lista separada por comas).
+    Incluye las ocurrencias de series que todavía no se guardaron como citas (ID serie:<id>:<fecha>).
+    Responde con ETag (304 si no cambió) cuando fecha_desde y fecha_hasta cubren hasta 12 semanas.
+    """
     try:
+        limite = leer_limite(request.args.get('limit'))
+        
         db = firebase_config.get_db()
-        citas = []
+        query, campos = consulta_citas(db, request.args)
         
-        for doc in db.collection('citas').where('estado', '==', 'programada').stream():
-            cita_data = doc.to_dict()
-            cita_data['id'] = doc.id
-            citas.append(cita_data)
+        def generar(versiones):
+            # La versión de series ya leída para el ETag evita volver a leerla
+            series = obtener_series(db, versiones.get(VERSION_SERIES))
+            pagina = PaginaEnStream(query, ORDEN_CITAS, limite, request.args.get('cursor'),
+                                    ocurrencias_citas(series, request.args))
+            
+            def citas():
+                for doc in pagina:
+                    yield datos_cita(doc, campos)
+            
+            # Se serializa a medida que llegan los documentos (JSON o NDJSON según Accept)
+            return respuesta_lista('citas', citas(), lambda: {"next_cursor": pagina.next_cursor})
         
-        return jsonify({"citas": citas, "status": "success"})
+        return respuesta_condicional(db, claves_citas(request.args), generar,
+                                     extra=variantes_respuesta(), con_versiones=True)
     except Exception as e:
         return jsonify({"error": str(e), "status": "error"}), 400
 
 @api_bp.route("/api/pacientes", methods=['GET'])
 def api_get_pacientes():
-    """API: Obtener pacientes"""
+    """API: Obtener pacientes paginados. Parámetros: limit, cursor, orden (nombre | registro)"""
+    try:
+        limite = leer_limite(request.args.get('limit'))
+        db = firebase_config.get_db()
+        
+        def generar():
+            total = contar_pacientes(db)
+            pagina = pagina_pacientes(db, request.args.get('orden', 'nombre'), limite, request.args.get('cursor'))
+            
+            pacientes = (preparar_paciente(doc) for doc in pagina)
+            return respuesta_lista('pacientes', pacientes, lambda: {"next_cursor": pagina.next_cursor, "total": total})
+        
+        return respuesta_condicional(db, ['pacientes'], generar, extra=variantes_respuesta())
+    except Exception as e:
+        return jsonify({"error": str(e), "status": "error"}), 400
+
+@api_bp.route("/api/pacientes/buscar", methods=['GET'])
+def api_buscar_pacientes():
+    """API: Buscar pacientes por prefijo de nombre, apoderado o teléfono. Parámetros: q, limit"""
     try:
+        limite = leer_limite(request.args.get('limit'), defecto=LIMITE_RESULTADOS, maximo=50)
         db = firebase_config.get_db()
-        pacientes = []
         
-        for doc in db.collection('pacientes').stream():
-            paciente_data = doc.to_dict()
-            paciente_data['id'] = doc.id
-            pacientes.append(paciente_data)
+        def generar():
+            pacientes = buscar_pacientes(db, request.args.get('q', ''), limite)
+            return jsonify({"pacientes": pacientes, "status": "success"})
         
-        return jsonify({"pacientes": pacientes, "status": "success"})
+        return respuesta_condicional(db, ['pacientes'], generar, extra=variantes_respuesta())
     except Exception as e:
         return jsonify({"error": str(e), "status": "error"}), 400
 
@@ -59,10 +164,33 @@ def api_create_cita():
             'fecha_creacion': datetime.now().isoformat()
         }
         
-        timestamp, doc_ref = db.collection('citas').add(cita_data)
+        doc_ref = crear_cita(db, cita_data)
         cita_data['id'] = doc_ref.id
         
         return jsonify({"cita": cita_data, "status": "success"}), 201
+    except HorarioOcupadoError as e:
+        return jsonify({"error": str(e), "status": "error"}), 409
+    except Exception as e:
+        return jsonify({"error": str(e), "status": "error"}), 400
+
+@api_bp.route("/api/citas/bulk", methods=['POST'])
+def api_importar_citas():
+    """
+    API: Crear citas en forma masiva.
+    Acepta JSON ({"citas": [...]} o una lista) o un archivo .csv/.json en el campo 'archivo'.
+    Retorna el resultado de cada fila.
+    """
+    try:
+        if 'archivo' in request.files:
+            filas = leer_filas_archivo(request.files['archivo'])
+        else:
+            filas = leer_filas_json(request.get_json())
+        
+        db = firebase_config.get_db()
+        reporte = importar_citas(db, filas)
+        
+        reporte['status'] = 'success'
+        return jsonify(reporte), 201 if reporte['creadas'] else 200
     except Exception as e:
         return jsonify({"error": str(e), "status": "error"}), 400
 
@@ -74,18 +202,17 @@ def api_reprogramar_cita(cita_id):
         motivo = data.get('motivo', 'Sin motivo especificado')
         
         db = firebase_config.get_db()
-        cita_ref = db.collection('citas').document(cita_id)
         
-        if not cita_ref.get().exists:
-            return jsonify({"error": "Cita no encontrada", "status": "error"}), 404
-        
-        # Cambiar estado 
-        cita_ref.update({
+        # Cambiar estado y liberar el bloque en una transacción
+        cita_data = liberar_cita(db, cita_id, cambios={
             'estado': 'pendiente_reprogramacion',
             'motivo_reprogramacion': motivo,
             'fecha_reprogramacion': datetime.now().isoformat()
         })
         
+        if cita_data is None:
+            return jsonify({"error": "Cita no encontrada", "status": "error"}), 404
+        
         return jsonify({
             "message": "Cita marcada para reprogramar. Horario liberado.", 
             "status": "success"
@@ -100,14 +227,12 @@ def api_get_servicios():
     """API: Obtener servicios activos"""
     try:
         db = firebase_config.get_db()
-        servicios = []
         
-        for doc in db.collection('servicios').where('estado', '==', 'activo').stream():
-            servicio_data = doc.to_dict()
-            servicio_data['id'] = doc.id
-            servicios.append(servicio_data)
+        def generar():
+            servicios = obtener_coleccion(db, 'servicios', ('estado', '==', 'activo'))
+            return respuesta_lista('servicios', servicios)
         
-        return jsonify({"servicios": servicios, "status": "success"})
+        return respuesta_condicional(db, ['servicios'], generar, extra=variantes_respuesta())
     except Exception as e:
         return jsonify({"error": str(e), "status": "error"}), 400
     
@@ -0,0 +1,135 @@
+import asyncio
+from flask import Blueprint, jsonify, request
+from backend.services.asincrono import en_loop
+from backend.services.horarios import generar_horarios
+from backend.services.paginacion import leer_limite
+from backend.services.versiones import etag_de, cliente_actualizado, no_modificado, con_etag, clave_semana
+from backend.services.series import VERSION_SERIES
+from backend.services.calendario import lunes_de
+from backend.services.lecturas_async import (
+    cliente, obtener_versiones_async, obtener_coleccion_async, pagina_async,
+    obtener_semana_async, horarios_ocupados_async, obtener_series_async
+)
+from backend.routes.api import (
+    ORDEN_CITAS, consulta_citas, datos_cita, variantes_respuesta, claves_citas, ocurrencias_citas
+)
+from backend.routes.pacientes import ORDENES_PACIENTES, preparar_paciente
+
+# Variantes asíncronas (AsyncClient) de las lecturas de la API, bajo /api/async.
+# Las respuestas son las mismas que las de /api (sin streaming). Las corrutinas de datos
+# corren en el loop de fondo, sin contexto de Flask: retornan dicts y la vista arma el JSON.
+api_async_bp = Blueprint('api_async', __name__)
+
+async def respuesta_condicional_async(claves, generar, extra=(), con_versiones=False):
+    """
+    Variante asíncrona de versiones.respuesta_condicional: generar(db) es una corrutina que retorna
+    un dict (generar(db, versiones) con con_versiones)
+    """
+    db = cliente()
+
+    def _generar(versiones):
+        return generar(db, versiones) if con_versiones else generar(db)
+
+    if claves is None:
+        return jsonify(await en_loop(_generar({})))
+
+    try:
+        versiones = await en_loop(obtener_versiones_async(db, claves))
+        etag = etag_de(versiones, claves, extra)
+    except Exception as e:
+        print(f"Error calculando ETag: {e}")
+        return jsonify(await en_loop(_generar({})))
+
+    if cliente_actualizado(etag):
+        return no_modificado(etag)
+
+    return con_etag(jsonify(await en_loop(_generar(versiones))), etag)
+
+@api_async_bp.route("/api/async/citas", methods=['GET'])
+async def api_async_get_citas():
+    """API async: Obtener citas paginadas (mismos parámetros que /api/citas)"""
+    try:
+        limite = leer_limite(request.args.get('limit'))
+        args = request.args.to_dict()
+
+        async def generar(db, versiones):
+            query, campos = consulta_citas(db, args)
+            if VERSION_SERIES not in versiones:
+                versiones = await obtener_versiones_async(db, [VERSION_SERIES])
+            series = await obtener_series_async(db, versiones[VERSION_SERIES])
+            docs, next_cursor = await pagina_async(query, ORDEN_CITAS, limite, args.get('cursor'),
+                                                   ocurrencias_citas(series, args))
+            return {"citas": [datos_cita(doc, campos) for doc in docs],
+                    "next_cursor": next_cursor, "status": "success"}
+
+        return await respuesta_condicional_async(claves_citas(args), generar,
+                                                 extra=variantes_respuesta(), con_versiones=True)
+    except Exception as e:
+        return jsonify({"error": str(e), "status": "error"}), 400
+
+@api_async_bp.route("/api/async/pacientes", methods=['GET'])
+async def api_async_get_pacientes():
+    """API async: Obtener pacientes paginados (mismos parámetros que /api/pacientes)"""
+    try:
+        limite = leer_limite(request.args.get('limit'))
+        orden = request.args.get('orden', 'nombre')
+        cursor = request.args.get('cursor')
+        if orden not in ORDENES_PACIENTES:
+            raise ValueError('orden debe ser nombre o registro')
+
+        async def generar(db):
+            (docs, next_cursor), conteo = await asyncio.gather(
+                pagina_async(db.collection('pacientes'), ORDENES_PACIENTES[orden], limite, cursor),
+                db.collection('pacientes').count().get()
+            )
+            return {"pacientes": [preparar_paciente(doc) for doc in docs],
+                    "next_cursor": next_cursor, "total": conteo[0][0].value, "status": "success"}
+
+        return await respuesta_condicional_async(['pacientes'], generar, extra=variantes_respuesta())
+    except Exception as e:
+        return jsonify({"error": str(e), "status": "error"}), 400
+
+@api_async_bp.route("/api/async/servicios", methods=['GET'])
+async def api_async_get_servicios():
+    """API async: Obtener servicios activos"""
+    try:
+        async def generar(db):
+            servicios = await obtener_coleccion_async(db, 'servicios', ('estado', '==', 'activo'))
+            return {"servicios": servicios, "status": "success"}
+
+        return await respuesta_condicional_async(['servicios'], generar, extra=variantes_respuesta())
+    except Exception as e:
+        return jsonify({"error": str(e), "status": "error"}), 400
+
+@api_async_bp.route("/api/async/calendario", methods=['GET'])
+async def api_async_calendario():
+    """API async: Citas de la semana de una fecha (parámetro fecha, YYYY-MM-DD)"""
+    try:
+        lunes = lunes_de(request.args['fecha'])
+
+        async def generar(db):
+            citas = await obtener_semana_async(db, lunes)
+            return {"lunes": lunes, "citas": citas, "status": "success"}
+
+        return await respuesta_condicional_async([clave_semana(lunes), VERSION_SERIES], generar,
+                                                 extra=variantes_respuesta())
+    except Exception as e:
+        return jsonify({"error": str(e), "status": "error"}), 400
+
+@api_async_bp.route("/api/async/horarios-fecha", methods=['POST'])
+async def api_async_horarios_fecha():
+    """API async: Obtener horarios disponibles para una fecha específica"""
+    try:
+        data = request.get_json()
+        fecha = data.get('fecha')
+
+        if not fecha:
+            return jsonify({"error": "Fecha requerida", "status": "error"}), 400
+
+        todos_horarios = generar_horarios()
+        ocupados = await en_loop(horarios_ocupados_async(cliente(), fecha, todos_horarios))
+        horarios = [hora for hora in todos_horarios if hora not in ocupados]
+
+        return jsonify({"horarios": horarios, "status": "success"})
+    except Exception as e:
+        return jsonify({"error": str(e), "status": "error"}), 400
@@ -1,5 +1,14 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
 from backend.config.firebase_config import firebase_config
+from backend.services.roles import obtener_rol_usuario
+from backend.services.horarios import generar_horarios, configuracion_horarios
+from backend.services.versiones import respuesta_condicional, clave_semana
+from backend.services.cache import obtener_coleccion
+from backend.services.calendario import obtener_semana, lunes_de
+from backend.services.ocupacion import crear_cita, crear_serie, liberar_cita, HorarioOcupadoError
+from backend.services.series import VERSION_SERIES, fechas_ocurrencias, terminar_serie, validar_serie
+from backend.services.concurrencia import en_paralelo
+from backend.services.importacion import importar_citas, leer_filas_archivo, COLUMNAS_CSV, MAX_FILAS
 from datetime import datetime, date, timedelta
 from functools import wraps
 
@@ -22,8 +31,6 @@ def requiere_administrador(f):
         if 'user_id' not in session:
             return redirect(url_for('login'))
         
-        # Importar función de app.py
-        from app import obtener_rol_usuario
         if obtener_rol_usuario() != 'administrador':
             flash('No tienes permisos para esta acción', 'error')
             return redirect(url_for('citas.calendario'))
@@ -63,83 +70,11 @@ def obtener_mes_espanol(fecha):
     
     return meses[fecha.month - 1]
 
-def generar_horarios():
-    """Genera horarios basados en configuración del centro"""
+def obtener_citas_semana(lunes):
+    """Obtiene las citas de la semana desde la proyección calendario_semanas"""
     try:
         db = firebase_config.get_db()
-        config_doc = db.collection('horarios').document('configuracion_centro').get()
-        
-        if config_doc.exists:
-            config = config_doc.to_dict()
-            hora_inicio = int(config['hora_inicio'].split(':')[0])
-            hora_termino = int(config['hora_termino'].split(':')[0])
-        else:
-            hora_inicio, hora_termino = 9, 18
-        
-        horarios = []
-        for hora in range(hora_inicio, hora_termino + 1):
-            horarios.append(f"{hora:02d}:00")
-        
-        return horarios
-        
-    except Exception as e:
-        print(f"Error obteniendo configuración: {e}")
-        return ["09:00", "10:00", "11:00", "12:00", "13:00", "14:00", "15:00", "16:00", "17:00", "18:00"]
-
-def obtener_citas_semana(fecha_inicio, fecha_fin):
-    """Obtiene citas de Firestore para la semana"""
-    try:
-        db = firebase_config.get_db()
-        citas_ref = db.collection('citas')
-        
-        # Obtener citas del rango de fechas
-        citas = citas_ref.where('fecha', '>=', fecha_inicio)\
-                         .where('fecha', '<=', fecha_fin)\
-                         .stream()
-        
-        citas_dict = {}
-        
-        for doc in citas:
-            cita_data = doc.to_dict()
-            cita_data['id'] = doc.id
-            
-            # Excluir citas pendientes y reprogramadas
-            if cita_data.get('estado') in ['pendiente_reprogramacion', 'reprogramada']:
-                continue  
-            
-            # Obtener nombres de paciente, servicio y profesional
-            try:
-                # Obtener paciente
-                paciente_doc = db.collection('pacientes').document(cita_data['paciente_id']).get()
-                paciente_nombre = paciente_doc.to_dict()['nombre_paciente'] if paciente_doc.exists else 'Paciente'
-                
-                # Obtener servicio
-                servicio_doc = db.collection('servicios').document(cita_data['servicio_id']).get()
-                servicio_nombre = servicio_doc.to_dict()['nombre'] if servicio_doc.exists else 'Servicio'
-                
-                # Obtener profesional
-                profesional_doc = db.collection('usuarios_sistema').document(cita_data['profesional_id']).get()
-                profesional_nombre = profesional_doc.to_dict()['nombre'] if profesional_doc.exists else 'Profesional'
-                
-                # Crear clave para el diccionario (fecha_hora)
-                cita_key = f"{cita_data['fecha']}_{cita_data['hora']}"
-                
-                # Agregar al diccionario
-                citas_dict[cita_key] = {
-                    'id': cita_data['id'],
-                    'paciente': paciente_nombre,
-                    'servicio': servicio_nombre,
-                    'profesional': profesional_nombre,
-                    'estado': cita_data.get('estado', 'programada'),
-                    'observaciones': cita_data.get('observaciones', '')
-                }
-                
-
-            except Exception as e:
-                print(f"Error procesando cita {doc.id}: {e}")
-                continue
-        
-        return citas_dict
+        return obtener_semana(db, lunes)
         
     except Exception as e:
         print(f"Error obteniendo citas: {e}")
@@ -156,30 +91,38 @@ def calendario():
         # Obtener fecha desde parámetros URL
         fecha_inicio = request.args.get('fecha_inicio')
         
-        # Generar datos del calendario
+        # Generar datos del calendario (horarios en memoria y rol de la sesión, sin hilos:
+        # en paralelo van solo las lecturas de Firestore de obtener_semana)
         dias = generar_semana_actual(fecha_inicio)
         horarios = generar_horarios()
+        rol = obtener_rol_usuario()
+        lunes = dias[0]['fecha_str']
         
-        # Obtener citas
-        fecha_inicio_str = dias[0]['fecha_str']
-        fecha_fin_str = dias[-1]['fecha_str']
-        citas = obtener_citas_semana(fecha_inicio_str, fecha_fin_str)
-        
-        # Calcular fechas para navegación
-        lunes_actual = datetime.strptime(dias[0]['fecha_str'], '%Y-%m-%d')
-        semana_anterior = (lunes_actual - timedelta(days=7)).strftime('%Y-%m-%d')
-        semana_siguiente = (lunes_actual + timedelta(days=7)).strftime('%Y-%m-%d')
-        
-        # Agregar mes en español
-        mes_espanol = obtener_mes_espanol(dias[0]['fecha'])
+        def renderizar():
+            # Obtener citas (una lectura del documento de la semana)
+            citas = obtener_citas_semana(lunes)
+            
+            # Calcular fechas para navegación
+            lunes_actual = datetime.strptime(lunes, '%Y-%m-%d')
+            semana_anterior = (lunes_actual - timedelta(days=7)).strftime('%Y-%m-%d')
+            semana_siguiente = (lunes_actual + timedelta(days=7)).strftime('%Y-%m-%d')
+            
+            # Agregar mes en español
+            mes_espanol = obtener_mes_espanol(dias[0]['fecha'])
+            
+            return render_template('calendario.html', 
+                                 dias=dias, 
+                                 horarios=horarios, 
+                                 citas=citas,
+                                 mes_espanol=mes_espanol,
+                                 semana_anterior=semana_anterior,
+                                 semana_siguiente=semana_siguiente)
         
-        return render_template('calendario.html', 
-                             dias=dias, 
-                             horarios=horarios, 
-                             citas=citas,
-                             mes_espanol=mes_espanol,
-                             semana_anterior=semana_anterior,
-                             semana_siguiente=semana_siguiente)
+        # Si la semana no cambió se responde 304 sin leer las citas
+        db = firebase_config.get_db()
+        return respuesta_condicional(db, [clave_semana(lunes), VERSION_SERIES], renderizar, extra=[
+            configuracion_horarios.version, rol, session.get('user_email')
+        ])
     
     except Exception as e:
         flash(f'Error: {str(e)}', 'error')
@@ -206,13 +149,26 @@ def nueva_cita():
         servicio_id = request.form['servicio_id'].strip()
         profesional_id = request.form['profesional_id'].strip()
         observaciones = request.form['observaciones'].strip()
+        repetir = request.form.get('repetir')
+        fecha_fin = request.form.get('fecha_fin', '').strip()
         
         # Validación 
         if not all([paciente_id, servicio_id, profesional_id]):
             flash('Paciente, servicio y profesional son obligatorios', 'error')
             return render_template('cita_form.html', 
                                  fecha=fecha, hora=hora, 
-                                 pacientes=[], servicios=[], profesionales=[])
+                                 servicios=[], profesionales=[])
+        
+        if repetir and (not fecha_fin or fecha_fin <= fecha):
+            flash('Indica hasta qué fecha se repite la cita (posterior a la primera)', 'error')
+            return redirect(url_for('citas.nueva_cita', fecha=fecha, hora=hora))
+        
+        if repetir:
+            try:
+                cada_semanas = validar_serie(fecha, fecha_fin, request.form.get('cada_semanas', 1))
+            except ValueError as e:
+                flash(str(e), 'error')
+                return redirect(url_for('citas.nueva_cita', fecha=fecha, hora=hora))
         
         try:
             # Guardar cita en Firestore
@@ -229,8 +185,19 @@ def nueva_cita():
                 'creado_por': session.get('user_id')
             }
             
-            db.collection('citas').add(cita_data)
-            flash('Cita agendada correctamente', 'success')
+            if repetir:
+                # Serie recurrente: se guarda la regla, no cada ocurrencia
+                serie_data = dict(cita_data, fecha_inicio=fecha, fecha_fin=fecha_fin,
+                                  cada_semanas=cada_semanas,
+                                  excepciones=[], materializada_hasta=None, estado='activa')
+                del serie_data['fecha']
+                crear_serie(db, serie_data)
+                cantidad = len(fechas_ocurrencias(serie_data, fecha, fecha_fin))
+                flash(f'Serie agendada correctamente ({cantidad} citas)', 'success')
+            else:
+                # Cita, bloque ocupado y semana en una sola transacción
+                crear_cita(db, cita_data)
+                flash('Cita agendada correctamente', 'success')
             
             # Lógica para que a crear cita se mantenga en el mismo calendarios
             # Calcular el lunes de la semana de la cita creada
@@ -242,6 +209,9 @@ def nueva_cita():
             # Redirigir a la semana de la cita creada
             return redirect(url_for('citas.calendario', fecha_inicio=fecha_inicio))
             
+        except HorarioOcupadoError as e:
+            flash(f'Ya existe una cita el {e.fecha} a las {e.hora}. El box está ocupado.', 'error')
+            return redirect(url_for('citas.calendario', fecha_inicio=lunes_de(fecha)))
         except Exception as e:
             flash(f'Error: {str(e)}', 'error')
     
@@ -249,37 +219,45 @@ def nueva_cita():
     try:
         db = firebase_config.get_db()
         
-        # Obtener pacientes
-        pacientes = []
-        for doc in db.collection('pacientes').stream():
-            paciente_data = doc.to_dict()
-            paciente_data['id'] = doc.id
-            pacientes.append(paciente_data)
-        
-        # Obtener servicios activos
-        servicios = []
-        for doc in db.collection('servicios').where('estado', '==', 'activo').stream():
-            servicio_data = doc.to_dict()
-            servicio_data['id'] = doc.id
-            servicios.append(servicio_data)
-        
-        # Obtener profesionales
-        profesionales = []
-        for doc in db.collection('usuarios_sistema').where('rol', '==', 'profesional').stream():
-            profesional_data = doc.to_dict()
-            profesional_data['id'] = doc.id
-            profesionales.append(profesional_data)
+        # Obtener servicios activos y profesionales (cacheados, en paralelo)
+        # Los pacientes se buscan desde el formulario con /api/pacientes/buscar
+        datos = en_paralelo(
+            servicios=lambda: obtener_coleccion(db, 'servicios', ('estado', '==', 'activo')),
+            profesionales=lambda: obtener_coleccion(db, 'usuarios_sistema', ('rol', '==', 'profesional'))
+        )
         
         return render_template('cita_form.html', 
                              fecha=fecha, hora=hora,
-                             pacientes=pacientes, 
-                             servicios=servicios, 
-                             profesionales=profesionales)
+                             **datos)
     
     except Exception as e:
         flash(f'Error cargando datos: {str(e)}', 'error')
         return redirect(url_for('citas.calendario'))
 
+@citas_bp.route("/citas/importar", methods=['GET', 'POST'])
+@requiere_administrador
+def importar_citas_archivo():
+    """Importar citas desde un archivo CSV o JSON"""
+    reporte = None
+    
+    if request.method == 'POST':
+        archivo = request.files.get('archivo')
+        
+        if not archivo or not archivo.filename:
+            flash('Selecciona un archivo CSV o JSON', 'error')
+            return redirect(url_for('citas.importar_citas_archivo'))
+        
+        try:
+            db = firebase_config.get_db()
+            reporte = importar_citas(db, leer_filas_archivo(archivo), session.get('user_id'))
+            flash(f"Importación terminada: {reporte['creadas']} creadas, {reporte['errores']} con errores",
+                  'success' if not reporte['errores'] else 'error')
+        except Exception as e:
+            flash(f'Error al importar: {str(e)}', 'error')
+    
+    return render_template('citas_importar.html', reporte=reporte,
+                           columnas=COLUMNAS_CSV, max_filas=MAX_FILAS)
+
 @citas_bp.route("/citas/<cita_id>/reprogramar", methods=['POST'])
 @requiere_login
 def reprogramar_cita(cita_id):
@@ -289,23 +267,22 @@ def reprogramar_cita(cita_id):
     
     try:
         db = firebase_config.get_db()
-        cita_ref = db.collection('citas').document(cita_id)
-        
-        # Verificar que la cita existe
-        if not cita_ref.get().exists:
-            flash('Cita no encontrada', 'error')
-            return redirect(url_for('citas.calendario'))
         
         # Obtener motivo del formulario
         motivo = request.form.get('motivo', '').strip()
         
-        # Cambiar estado para liberar horario y guardars motivo
-        cita_ref.update({
+        # Cambiar estado, guardar motivo y liberar horario en una transacción
+        cita_data = liberar_cita(db, cita_id, cambios={
             'estado': 'pendiente_reprogramacion',
             'motivo_reprogramacion': motivo,
             'fecha_reprogramacion': datetime.now().isoformat()
         })
         
+        # Verificar que la cita existe
+        if cita_data is None:
+            flash('Cita no encontrada', 'error')
+            return redirect(url_for('citas.calendario'))
+        
         flash('Cita marcada para reprogramar. Horario liberado.', 'success')
         return redirect(url_for('citas.calendario'))
         
@@ -322,18 +299,33 @@ def eliminar_cita(cita_id):
     
     try:
         db = firebase_config.get_db()
-        cita_ref = db.collection('citas').document(cita_id)
         
-        # Verificar que la cita existe
-        cita_doc = cita_ref.get()
-        if not cita_doc.exists:
+        # Eliminar la cita y liberar su bloque en una transacción
+        if liberar_cita(db, cita_id, eliminar=True) is None:
             flash('Cita no encontrada', 'error')
         else:
-            # Eliminar la cita
-            cita_ref.delete()
             flash('Cita eliminada correctamente', 'success')
     
     except Exception as e:
         flash(f'Error al eliminar: {str(e)}', 'error')
     
-    return redirect(url_for('citas.calendario'))
\ No newline at end of file
+    return redirect(url_for('citas.calendario'))
+
+@citas_bp.route("/series/<serie_id>/terminar", methods=['POST'])
+@requiere_login
+def terminar_serie_citas(serie_id):
+    """Terminar una serie recurrente desde una fecha"""
+    desde = request.form.get('desde', '')
+    
+    try:
+        db = firebase_config.get_db()
+        
+        if terminar_serie(db, serie_id, desde):
+            flash('Serie terminada correctamente', 'success')
+        else:
+            flash('Serie no encontrada', 'error')
+    
+    except Exception as e:
+        flash(f'Error al terminar la serie: {str(e)}', 'error')
+    
+    return redirect(url_for('citas.calendario', fecha_inicio=desde or None))
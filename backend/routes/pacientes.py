@@ -1,5 +1,12 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
 from backend.config.firebase_config import firebase_config
+from backend.services.roles import obtener_rol_usuario
+from backend.services.cache import registrar_escritura, guardar_documento
+from backend.services.versiones import incrementar
+from backend.services.busqueda import tokens_paciente
+from backend.services.paginacion import PaginaEnStream, leer_limite, LIMITE_POR_DEFECTO
+from backend.services.desnormalizacion import registrar_propagacion, completar_propagacion
+from backend.services.concurrencia import en_paralelo
 from datetime import datetime, date
 from functools import wraps
 
@@ -15,8 +22,6 @@ def requiere_administrador(f):
         if 'user_id' not in session:
             return redirect(url_for('login'))
         
-        # Importar función de app.py
-        from app import obtener_rol_usuario
         if obtener_rol_usuario() != 'administrador':
             flash('No tienes permisos para esta acción', 'error')
             return redirect(url_for('citas.calendario'))
@@ -33,34 +38,63 @@ def calcular_edad(fecha_nacimiento):
         edad -= 1
     return edad
 
+# Ordenes disponibles para el listado (el ID del documento se agrega como desempate)
+ORDENES_PACIENTES = {
+    'nombre': [('nombre_paciente', 'ASCENDING')],
+    'registro': [('fecha_registro', 'DESCENDING')]
+}
+
+def pagina_pacientes(db, orden='nombre', limite=LIMITE_POR_DEFECTO, cursor=None):
+    """Página de pacientes que se lee a medida que se recorre"""
+    if orden not in ORDENES_PACIENTES:
+        raise ValueError('orden debe ser nombre o registro')
+    
+    return PaginaEnStream(db.collection('pacientes'), ORDENES_PACIENTES[orden], limite, cursor)
+
+def preparar_paciente(doc):
+    """Datos de un paciente para mostrar, con su edad calculada"""
+    paciente_data = doc.to_dict()
+    guardar_documento('pacientes', doc.id, paciente_data)
+    paciente_data['id'] = doc.id
+    
+    # Calcular edad
+    if 'fecha_nacimiento' in paciente_data:
+        paciente_data['edad'] = calcular_edad(paciente_data['fecha_nacimiento'])
+    
+    return paciente_data
+
+def contar_pacientes(db):
+    """Total de pacientes con una agregación count() (sin leer los documentos)"""
+    resultado = db.collection('pacientes').count().get()
+    return resultado[0][0].value
+
 @pacientes_bp.route("/pacientes")
 @requiere_administrador
 
 def pacientes():
-    """Listar pacientes"""
+    """Listar pacientes (paginado)"""
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
+    orden = request.args.get('orden', 'nombre')
+    
     try:
         db = firebase_config.get_db()
-        pacientes_ref = db.collection('pacientes')
-        pacientes = []
-        
-        for doc in pacientes_ref.stream():
-            paciente_data = doc.to_dict()
-            paciente_data['id'] = doc.id
-            
-            # Calcular edad
-            if 'fecha_nacimiento' in paciente_data:
-                paciente_data['edad'] = calcular_edad(paciente_data['fecha_nacimiento'])
-            
-            pacientes.append(paciente_data)
+        limite = leer_limite(request.args.get('limit'), defecto=25, maximo=100)
+        # Solo se lee y se calcula la edad de la página actual; el conteo va en paralelo
+        pagina = pagina_pacientes(db, orden, limite, request.args.get('cursor'))
+        datos = en_paralelo(
+            pacientes=lambda: [preparar_paciente(doc) for doc in pagina],
+            total=lambda: contar_pacientes(db)
+        )
         
-        return render_template('pacientes.html', pacientes=pacientes)
+        return render_template('pacientes.html', pacientes=datos['pacientes'], total=datos['total'],
+                             orden=orden, limite=limite, next_cursor=pagina.next_cursor)
         
     except Exception as e:
         flash(f'Error: {str(e)}', 'error')
-        return render_template('pacientes.html', pacientes=[])
+        return render_template('pacientes.html', pacientes=[], total=0,
+                             orden=orden, limite=25, next_cursor=None)
 
 @pacientes_bp.route("/pacientes/nuevo", methods=['GET', 'POST'])
 @requiere_administrador
@@ -92,8 +126,11 @@ def nuevo_paciente():
                 'estado': 'activo',
                 'fecha_registro': datetime.now().isoformat()
             }
+            paciente_data['tokens_busqueda'] = tokens_paciente(paciente_data)
             
-            db.collection('pacientes').add(paciente_data)
+            timestamp, doc_ref = db.collection('pacientes').add(paciente_data)
+            registrar_escritura('pacientes', doc_ref.id, paciente_data)
+            incrementar(db, ['pacientes'])
             flash('Paciente registrado correctamente', 'success')
             return redirect(url_for('pacientes.pacientes'))
             
@@ -142,9 +179,25 @@ def editar_paciente(paciente_id):
                 'email': email if email else '',
                 'fecha_modificacion': datetime.now().isoformat()
             }
+            update_data['tokens_busqueda'] = tokens_paciente(update_data)
+            
+            # Las citas y el calendario guardan el nombre del paciente: el cambio queda
+            # registrado como pendiente en el mismo batch y se propaga en este request
+            cambio_nombre = paciente.get('nombre_paciente') != nombre_paciente
+            batch = db.batch()
+            batch.update(doc_ref, update_data)
+            if cambio_nombre:
+                registrar_propagacion(db, 'paciente_id', paciente_id, nombre_paciente, batch)
+            batch.commit()
+            paciente.update(update_data)
+            registrar_escritura('pacientes', paciente_id, paciente)
+            incrementar(db, ['pacientes'])
             
-            doc_ref.update(update_data)
-            flash('Paciente actualizado correctamente', 'success')
+            if cambio_nombre and not completar_propagacion(db, 'paciente_id', paciente_id, nombre_paciente):
+                flash('Paciente actualizado, pero sus citas aún tienen el nombre anterior '
+                      '(se reintenta con flask propagar-nombres)', 'error')
+            else:
+                flash('Paciente actualizado correctamente', 'success')
             return redirect(url_for('pacientes.pacientes'))
         
         return render_template('paciente_edit_form.html', paciente=paciente)
@@ -170,6 +223,8 @@ def eliminar_paciente(paciente_id):
             flash('Paciente no encontrado', 'error')
         else:
             doc_ref.delete()
+            registrar_escritura('pacientes', paciente_id)
+            incrementar(db, ['pacientes'])
             flash('Paciente eliminado correctamente', 'success')
     
     except Exception as e:
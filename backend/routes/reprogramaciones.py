@@ -1,5 +1,13 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
 from backend.config.firebase_config import firebase_config
+from backend.services.roles import obtener_rol_usuario
+from backend.services.horarios import generar_horarios
+from backend.services.cache import obtener_coleccion
+from backend.services.ocupacion import (
+    reprogramar_cita, horarios_ocupados, HorarioOcupadoError, CitaNoDisponibleError
+)
+from backend.services.concurrencia import en_paralelo
+from backend.services.referencias import resolver_referencias, sin_nombres, nombre_cita, CAMPOS_CITA
 from datetime import datetime, timedelta
 from functools import wraps
 
@@ -13,8 +21,6 @@ def requiere_administrador(f):
         if 'user_id' not in session:
             return redirect(url_for('login'))
         
-        # Importar función de app.py
-        from app import obtener_rol_usuario
         if obtener_rol_usuario() != 'administrador':
             flash('No tienes permisos para esta acción', 'error')
             return redirect(url_for('citas.calendario'))
@@ -37,25 +43,26 @@ def reprogramaciones():
                              .where('estado', '==', 'pendiente_reprogramacion')\
                              .stream()
         
-        reprogramaciones = []
-        
+        citas = []
         for doc in citas_pendientes:
             cita = doc.to_dict()
             cita['id'] = doc.id
-            
+            citas.append(cita)
+        
+        # Los nombres vienen en cada cita; solo las antiguas sin ellos se resuelven (un get_all por colección)
+        referencias = resolver_referencias(db, sin_nombres(citas), CAMPOS_CITA)
+        
+        reprogramaciones = []
+        
+        for cita in citas:
             try:
-                # Obtener nombres
-                paciente_doc = db.collection('pacientes').document(cita['paciente_id']).get()
-                servicio_doc = db.collection('servicios').document(cita['servicio_id']).get()
-                profesional_doc = db.collection('usuarios_sistema').document(cita['profesional_id']).get()
-                
                 reprogramaciones.append({
                     'id': cita['id'],
-                    'paciente': paciente_doc.to_dict()['nombre_paciente'] if paciente_doc.exists else 'N/A',
+                    'paciente': nombre_cita(cita, referencias, 'paciente_id', 'N/A'),
                     'fecha_original': cita['fecha'],
                     'hora_original': cita['hora'],
-                    'servicio': servicio_doc.to_dict()['nombre'] if servicio_doc.exists else 'N/A',
-                    'profesional': profesional_doc.to_dict()['nombre'] if profesional_doc.exists else 'N/A',
+                    'servicio': nombre_cita(cita, referencias, 'servicio_id', 'N/A'),
+                    'profesional': nombre_cita(cita, referencias, 'profesional_id', 'N/A'),
                     'motivo': cita.get('motivo_reprogramacion', 'Sin motivo especificado')
                 })
                 
@@ -69,35 +76,19 @@ def reprogramaciones():
         return render_template('reprogramaciones.html', reprogramaciones=[])
 
 
-def verificar_conflicto_horario(db, fecha, hora, profesional_id=None):
-    """Verifica si ya existe una cita en el horario especificado - SIN importar profesional"""
-    try:
-        citas_conflicto = db.collection('citas')\
-                           .where('fecha', '==', fecha)\
-                           .where('hora', '==', hora)\
-                           .where('estado', '==', 'programada')\
-                           .limit(1)\
-                           .stream()
-        
-        return len(list(citas_conflicto)) > 0
-    except:
-        return False
-
 def obtener_datos_cita_para_form(db, cita_data):
     """Obtiene datos completos de la cita para mostrar en el formulario"""
     try:
-        # Obtener nombres completos
-        paciente_doc = db.collection('pacientes').document(cita_data['paciente_id']).get()
-        servicio_doc = db.collection('servicios').document(cita_data['servicio_id']).get()
-        profesional_doc = db.collection('usuarios_sistema').document(cita_data['profesional_id']).get()
+        # Obtener nombres completos (guardados en la cita)
+        referencias = resolver_referencias(db, sin_nombres([cita_data]), CAMPOS_CITA)
         
         return {
             'id': cita_data.get('id'),
-            'paciente': paciente_doc.to_dict()['nombre_paciente'] if paciente_doc.exists else 'N/A',
+            'paciente': nombre_cita(cita_data, referencias, 'paciente_id', 'N/A'),
             'fecha_original': cita_data['fecha'],
             'hora_original': cita_data['hora'],
-            'servicio': servicio_doc.to_dict()['nombre'] if servicio_doc.exists else 'N/A',
-            'profesional': profesional_doc.to_dict()['nombre'] if profesional_doc.exists else 'N/A',
+            'servicio': nombre_cita(cita_data, referencias, 'servicio_id', 'N/A'),
+            'profesional': nombre_cita(cita_data, referencias, 'profesional_id', 'N/A'),
             'profesional_id': cita_data['profesional_id']
         }
     except Exception as e:
@@ -115,60 +106,27 @@ def obtener_otros_profesionales(db, profesional_actual_id):
     """Obtiene lista de otros profesionales disponibles"""
     try:
         profesionales = []
-        for doc in db.collection('usuarios_sistema').where('rol', '==', 'profesional').stream():
-            profesional_data = doc.to_dict()
-            if doc.id != profesional_actual_id:  # Excluir el profesional actual
+        for profesional_data in obtener_coleccion(db, 'usuarios_sistema', ('rol', '==', 'profesional')):
+            if profesional_data['id'] != profesional_actual_id:  # Excluir el profesional actual
                 profesionales.append({
-                    'id': doc.id,
+                    'id': profesional_data['id'],
                     'nombre': profesional_data.get('nombre', 'Sin nombre')
                 })
         return profesionales
     except:
         return []
 
-def generar_horarios():
-    """Genera horarios basados en configuración del centro"""
-    try:
-        db = firebase_config.get_db()
-        config_doc = db.collection('horarios').document('configuracion_centro').get()
-        
-        if config_doc.exists:
-            config = config_doc.to_dict()
-            hora_inicio = int(config['hora_inicio'].split(':')[0])
-            hora_termino = int(config['hora_termino'].split(':')[0])
-        else:
-            hora_inicio, hora_termino = 9, 18
-        
-        horarios = []
-        for hora in range(hora_inicio, hora_termino + 1):
-            horarios.append(f"{hora:02d}:00")
-        
-        return horarios
-        
-    except Exception as e:
-        return ["09:00", "10:00", "11:00", "12:00", "13:00", "14:00", "15:00", "16:00", "17:00", "18:00"]
-    
-
 def obtener_horarios_disponibles(db, fecha, profesional_id=None):
     """Obtiene horarios disponibles para una fecha - SIN importar profesional"""
     try:
         # Generar todos los horarios posibles
         todos_horarios = generar_horarios()
         
-        # Consultar citas existentes para esa fech
-        citas_ocupadas = db.collection('citas')\
-                          .where('fecha', '==', fecha)\
-                          .where('estado', '==', 'programada')\
-                          .stream()
-        
-        # Extraer horarios ocupados
-        horarios_ocupados = set()
-        for cita in citas_ocupadas:
-            cita_data = cita.to_dict()
-            horarios_ocupados.add(cita_data['hora'])
+        # Bloques ocupados de esa fecha (un solo get_all)
+        ocupados = horarios_ocupados(db, fecha, todos_horarios)
         
         # Filtrar horarios disponibles
-        horarios_disponibles = [hora for hora in todos_horarios if hora not in horarios_ocupados]
+        horarios_disponibles = [hora for hora in todos_horarios if hora not in ocupados]
         
         return horarios_disponibles
         
@@ -177,6 +135,24 @@ def obtener_horarios_disponibles(db, fecha, profesional_id=None):
         return generar_horarios()  
 
 
+def renderizar_formulario(db, cita_data, fecha_sugerida):
+    """Obtiene en paralelo los datos del formulario de reprogramación y lo renderiza"""
+    datos = en_paralelo(
+        cita_original=lambda: obtener_datos_cita_para_form(db, cita_data),
+        otros_profesionales=lambda: obtener_otros_profesionales(db, cita_data['profesional_id']),
+        # Horarios disponibles para la fecha sugerida (SIN profesional)
+        horarios_disponibles=lambda: obtener_horarios_disponibles(db, fecha_sugerida)
+    )
+    
+    # Fecha mínima hoy
+    fecha_minima = datetime.now().strftime('%Y-%m-%d')
+    
+    return render_template('reprogramar_form.html',
+                         fecha_minima=fecha_minima,
+                         fecha_sugerida=fecha_sugerida,
+                         **datos)
+
+
 @reprogramaciones_bp.route("/reprogramaciones/<cita_id>/reprogramar", methods=['GET', 'POST'])
 @requiere_administrador
 def reprogramar_cita_form(cita_id):
@@ -186,23 +162,10 @@ def reprogramar_cita_form(cita_id):
     
     db = firebase_config.get_db()
     
+    # Fecha sugerida mañana
+    fecha_form = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+    
     try:
-        # Obtener la cita pendiente de reprogramación
-        cita_ref = db.collection('citas').document(cita_id)
-        cita_doc = cita_ref.get()
-        
-        if not cita_doc.exists:
-            flash('Cita no encontrada', 'error')
-            return redirect(url_for('reprogramaciones.reprogramaciones'))
-        
-        cita_data = cita_doc.to_dict()
-        cita_data['id'] = cita_id
-        
-        # Verificar que esté en estado pendiente_reprogramacion
-        if cita_data.get('estado') != 'pendiente_reprogramacion':
-            flash('Esta cita no está pendiente de reprogramación', 'error')
-            return redirect(url_for('reprogramaciones.reprogramaciones'))
-        
         if request.method == 'POST':
             # reprogramación
             nueva_fecha = request.form['nueva_fecha'].strip()
@@ -213,85 +176,59 @@ def reprogramar_cita_form(cita_id):
             # Validaciones
             if not all([nueva_fecha, nueva_hora, profesional_id]):
                 flash('Todos los campos marcados con * son obligatorios', 'error')
+                fecha_form = nueva_fecha or fecha_form
+            else:
+                def armar_nueva_cita(cita_data):
+                    return {
+                        'fecha': nueva_fecha,
+                        'hora': nueva_hora,
+                        'paciente_id': cita_data['paciente_id'],
+                        'servicio_id': cita_data['servicio_id'],
+                        'profesional_id': profesional_id,
+                        'estado': 'programada',
+                        'observaciones': f"Reprogramada desde {cita_data['fecha']} {cita_data['hora']}. {observaciones}",
+                        'cita_original_id': cita_id,
+                        'fecha_creacion': datetime.now().isoformat(),
+                        'reprogramado_por': session.get('user_id')
+                    }
                 
-                cita_original = obtener_datos_cita_para_form(db, cita_data)
-                fecha_form = nueva_fecha if nueva_fecha else (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
-                horarios_disponibles = obtener_horarios_disponibles(db, fecha_form) 
-                otros_profesionales = obtener_otros_profesionales(db, cita_data['profesional_id'])
-                fecha_minima = datetime.now().strftime('%Y-%m-%d')
-                
-                return render_template('reprogramar_form.html',
-                                     cita_original=cita_original,
-                                     horarios_disponibles=horarios_disponibles,
-                                     otros_profesionales=otros_profesionales,
-                                     fecha_minima=fecha_minima,
-                                     fecha_sugerida=fecha_form)
-            
-            # Verificar que no haya conflicto de horario 
-            conflicto = verificar_conflicto_horario(db, nueva_fecha, nueva_hora)
-            if conflicto:
-                flash('Ya existe una cita en ese horario. El box está ocupado.', 'error')
-                
-                # Recargar datos para mostrar formulario con error
-                cita_original = obtener_datos_cita_para_form(db, cita_data)
-                horarios_disponibles = obtener_horarios_disponibles(db, nueva_fecha)  
-                otros_profesionales = obtener_otros_profesionales(db, cita_data['profesional_id'])
-                fecha_minima = datetime.now().strftime('%Y-%m-%d')
+                try:
+                    # Crear la nueva cita y cerrar la original en una sola transacción
+                    reprogramar_cita(db, cita_id, nueva_fecha, nueva_hora, armar_nueva_cita, {
+                        'estado': 'reprogramada',
+                        'fecha_reprogramacion_final': datetime.now().isoformat(),
+                        'nueva_fecha': nueva_fecha,
+                        'nueva_hora': nueva_hora
+                    })
+                    
+                    flash('Cita reprogramada exitosamente', 'success')
+                    return redirect(url_for('reprogramaciones.reprogramaciones'))
                 
-                return render_template('reprogramar_form.html',
-                                     cita_original=cita_original,
-                                     horarios_disponibles=horarios_disponibles,
-                                     otros_profesionales=otros_profesionales,
-                                     fecha_minima=fecha_minima,
-                                     fecha_sugerida=nueva_fecha)
-            
-            # Crear la nueva cita
-            nueva_cita_data = {
-                'fecha': nueva_fecha,
-                'hora': nueva_hora,
-                'paciente_id': cita_data['paciente_id'],
-                'servicio_id': cita_data['servicio_id'],
-                'profesional_id': profesional_id,
-                'estado': 'programada',
-                'observaciones': f"Reprogramada desde {cita_data['fecha']} {cita_data['hora']}. {observaciones}",
-                'cita_original_id': cita_id,
-                'fecha_creacion': datetime.now().isoformat(),
-                'reprogramado_por': session.get('user_id')
-            }
-            
-            # Guardar nueva cita
-            db.collection('citas').add(nueva_cita_data)
-            
-            # Actualizar cita original a estado "reprogramada"
-            cita_ref.update({
-                'estado': 'reprogramada',
-                'fecha_reprogramacion_final': datetime.now().isoformat(),
-                'nueva_fecha': nueva_fecha,
-                'nueva_hora': nueva_hora
-            })
-            
-            flash('Cita reprogramada exitosamente', 'success')
-            return redirect(url_for('reprogramaciones.reprogramaciones'))
+                except HorarioOcupadoError:
+                    flash('Ya existe una cita en ese horario. El box está ocupado.', 'error')
+                    fecha_form = nueva_fecha
+                except CitaNoDisponibleError as e:
+                    flash(str(e), 'error')
+                    return redirect(url_for('reprogramaciones.reprogramaciones'))
         
-        # Mostrar formulario
-        # Obtener datos para el formulario
-        cita_original = obtener_datos_cita_para_form(db, cita_data)
-        otros_profesionales = obtener_otros_profesionales(db, cita_data['profesional_id'])
+        # Obtener la cita pendiente de reprogramación
+        cita_doc = db.collection('citas').document(cita_id).get()
         
-        # Fecha mínima hoy y sugerida mañana
-        fecha_minima = datetime.now().strftime('%Y-%m-%d')
-        fecha_sugerida = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+        if not cita_doc.exists:
+            flash('Cita no encontrada', 'error')
+            return redirect(url_for('reprogramaciones.reprogramaciones'))
         
-        # Obtener horarios disponibles para la fecha sugerida (SIN profesional)
-        horarios_disponibles = obtener_horarios_disponibles(db, fecha_sugerida)
+        cita_data = cita_doc.to_dict()
+        cita_data['id'] = cita_id
         
-        return render_template('reprogramar_form.html',
-                             cita_original=cita_original,
-                             horarios_disponibles=horarios_disponibles,
-                             otros_profesionales=otros_profesionales,
-                             fecha_minima=fecha_minima,
-                             fecha_sugerida=fecha_sugerida)
+        # Verificar que esté en estado pendiente_reprogramacion
+        if cita_data.get('estado') != 'pendiente_reprogramacion':
+            flash('Esta cita no está pendiente de reprogramación', 'error')
+            return redirect(url_for('reprogramaciones.reprogramaciones'))
+        
+        # Mostrar formulario
+        return renderizar_formulario(db, cita_data, fecha_form)
     
     except Exception as e:
         flash(f'Error: {str(e)}', 'error')
-        return redirect(url_for('reprogramaciones.reprogramaciones'))
\ No newline at end of file
+        return redirect(url_for('reprogramaciones.reprogramaciones'))
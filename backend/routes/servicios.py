@@ -1,5 +1,10 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
 from backend.config.firebase_config import firebase_config
+from backend.services.roles import obtener_rol_usuario
+from backend.services.cache import obtener_coleccion, registrar_escritura
+from backend.services.versiones import incrementar
+from backend.services.desnormalizacion import registrar_propagacion, completar_propagacion
+from backend.services.referencias import obtener_documentos
 from datetime import datetime
 from functools import wraps
 
@@ -13,8 +18,6 @@ def requiere_administrador(f):
         if 'user_id' not in session:
             return redirect(url_for('login'))
         
-        # Importar función de app.py
-        from app import obtener_rol_usuario
         if obtener_rol_usuario() != 'administrador':
             flash('No tienes permisos para esta acción', 'error')
             return redirect(url_for('citas.calendario'))
@@ -31,23 +34,19 @@ def servicios():
     
     try:
         db = firebase_config.get_db()
-        servicios_ref = db.collection('servicios')
-        servicios = []
+        servicios = obtener_coleccion(db, 'servicios')
         
-        for doc in servicios_ref.stream():
-            servicio_data = doc.to_dict()
-            servicio_data['id'] = doc.id
-            
-            # Obtener código de especialidad
-            if 'especialidad_id' in servicio_data:
-                try:
-                    esp_doc = db.collection('especialidades').document(servicio_data['especialidad_id']).get()
-                    if esp_doc.exists:
-                        servicio_data['especialidad_codigo'] = esp_doc.to_dict()['codigo']
-                except:
+        # Obtener código de especialidad (un solo get_all)
+        try:
+            especialidades = obtener_documentos(db, 'especialidades', [item.get('especialidad_id') for item in servicios])
+            for servicio_data in servicios:
+                esp_data = especialidades.get(servicio_data.get('especialidad_id'))
+                if esp_data:
+                    servicio_data['especialidad_codigo'] = esp_data['codigo']
+        except:
+            for servicio_data in servicios:
+                if 'especialidad_id' in servicio_data:
                     servicio_data['especialidad_codigo'] = 'Error'
-            
-            servicios.append(servicio_data)
         
         return render_template('servicios.html', servicios=servicios)
         
@@ -86,7 +85,9 @@ def nuevo_servicio():
                 'fecha_creacion': datetime.now().isoformat()
             }
             
-            db.collection('servicios').add(servicio_data)
+            timestamp, doc_ref = db.collection('servicios').add(servicio_data)
+            registrar_escritura('servicios', doc_ref.id, servicio_data)
+            incrementar(db, ['servicios'])
             flash('Servicio creado correctamente', 'success')
             return redirect(url_for('servicios.servicios'))
             
@@ -139,8 +140,23 @@ def editar_servicio(servicio_id):
                 'fecha_modificacion': datetime.now().isoformat()
             }
             
-            doc_ref.update(update_data)
-            flash('Servicio actualizado correctamente', 'success')
+            # Las citas y el calendario guardan el nombre del servicio: el cambio queda
+            # registrado como pendiente en el mismo batch y se propaga en este request
+            cambio_nombre = servicio.get('nombre') != nombre
+            batch = db.batch()
+            batch.update(doc_ref, update_data)
+            if cambio_nombre:
+                registrar_propagacion(db, 'servicio_id', servicio_id, nombre, batch)
+            batch.commit()
+            servicio.update(update_data)
+            registrar_escritura('servicios', servicio_id, servicio)
+            incrementar(db, ['servicios'])
+            
+            if cambio_nombre and not completar_propagacion(db, 'servicio_id', servicio_id, nombre):
+                flash('Servicio actualizado, pero sus citas aún tienen el nombre anterior '
+                      '(se reintenta con flask propagar-nombres)', 'error')
+            else:
+                flash('Servicio actualizado correctamente', 'success')
             return redirect(url_for('servicios.servicios'))
         
         especialidades = cargar_especialidades()
@@ -166,6 +182,8 @@ def eliminar_servicio(servicio_id):
             flash('Servicio no encontrado', 'error')
         else:
             doc_ref.delete()
+            registrar_escritura('servicios', servicio_id)
+            incrementar(db, ['servicios'])
             flash('Servicio eliminado correctamente', 'success')
     
     except Exception as e:
@@ -177,12 +195,7 @@ def cargar_especialidades():
     """Función para cargar especialidades"""
     try:
         db = firebase_config.get_db()
-        especialidades = []
-        for doc in db.collection('especialidades').stream():
-            esp_data = doc.to_dict()
-            esp_data['id'] = doc.id
-            especialidades.append(esp_data)
-        return especialidades
+        return obtener_coleccion(db, 'especialidades')
     except Exception as e:
         print(f"Error cargando especialidades: {e}")
         return []
\ No newline at end of file
@@ -1,9 +1,10 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
 from backend.config.firebase_config import firebase_config
+from backend.services.roles import obtener_rol_usuario
+from backend.services.cache import obtener_coleccion, registrar_escritura
+from backend.services.referencias import obtener_documentos
 from datetime import datetime
-import requests
-import json
-import os
+from backend.services.autenticacion import crear_cuenta
 
 from functools import wraps
 
@@ -18,8 +19,6 @@ def requiere_administrador(f):
         if 'user_id' not in session:
             return redirect(url_for('login'))
         
-        # función de app.py
-        from app import obtener_rol_usuario
         if obtener_rol_usuario() != 'administrador':
             flash('No tienes permisos para esta acción', 'error')
             return redirect(url_for('citas.calendario'))
@@ -47,23 +46,19 @@ def usuarios():
     
     try:
         db = firebase_config.get_db()
-        usuarios_ref = db.collection('usuarios_sistema')
-        usuarios = []
+        usuarios = obtener_coleccion(db, 'usuarios_sistema')
         
-        for doc in usuarios_ref.stream():
-            usuario_data = doc.to_dict()
-            usuario_data['id'] = doc.id
-            
-            # Obtener nombre de especialidad si existe
-            if 'especialidad_id' in usuario_data:
-                try:
-                    esp_doc = db.collection('especialidades').document(usuario_data['especialidad_id']).get()
-                    if esp_doc.exists:
-                        usuario_data['especialidad_nombre'] = esp_doc.to_dict()['codigo']
-                except:
+        # Obtener código de especialidad (un solo get_all)
+        try:
+            especialidades = obtener_documentos(db, 'especialidades', [item.get('especialidad_id') for item in usuarios])
+            for usuario_data in usuarios:
+                esp_data = especialidades.get(usuario_data.get('especialidad_id'))
+                if esp_data:
+                    usuario_data['especialidad_nombre'] = esp_data['codigo']
+        except:
+            for usuario_data in usuarios:
+                if 'especialidad_id' in usuario_data:
                     usuario_data['especialidad_nombre'] = 'Error'
-            
-            usuarios.append(usuario_data)
         
         return render_template('usuarios.html', usuarios=usuarios)
         
@@ -82,11 +77,7 @@ def nuevo_usuario():
     # Cargar especialidades
     try:
         db = firebase_config.get_db()
-        especialidades = []
-        for doc in db.collection('especialidades').where('estado', '==', 'activa').stream():
-            esp_data = doc.to_dict()
-            esp_data['id'] = doc.id
-            especialidades.append(esp_data)
+        especialidades = obtener_coleccion(db, 'especialidades', ('estado', '==', 'activa'))
     except:
         especialidades = []
     
@@ -109,19 +100,9 @@ def nuevo_usuario():
         
         try:
             # Crear en Firebase Auth
-            api_key = os.getenv('FIREBASE_WEB_API_KEY')
-            url = f"https://identitytoolkit.googleapis.com/v1/accounts:signUp?key={api_key}"
-            
-            payload = {
-                "email": email,
-                "password": password,
-                "returnSecureToken": True
-            }
-            
-            response = requests.post(url, data=json.dumps(payload))
-            result = response.json()
+            status_code, result = crear_cuenta(email, password)
             
-            if response.status_code == 200:
+            if status_code == 200:
                 # Guardar en Firestore
                 db = firebase_config.get_db()
                 usuario_data = {
@@ -136,7 +117,8 @@ def nuevo_usuario():
                 if rol == 'profesional' and especialidad_id:
                     usuario_data['especialidad_id'] = especialidad_id
                 
-                db.collection('usuarios_sistema').add(usuario_data)
+                timestamp, doc_ref = db.collection('usuarios_sistema').add(usuario_data)
+                registrar_escritura('usuarios_sistema', doc_ref.id, usuario_data)
                 flash('Usuario creado correctamente', 'success')
                 return redirect(url_for('usuarios.usuarios'))
             else:
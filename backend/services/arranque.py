@@ -0,0 +1,54 @@
+# Tiempos de arranque en frío (importación, credenciales, cliente de Firestore, primer request).
+# En serverless cada instancia nueva paga estas etapas antes de responder: se registran
+# una vez por proceso y se imprimen en una línea para seguir regresiones.
+import time
+import threading
+from contextlib import contextmanager
+from backend.services.metricas import metricas
+
+
+class RegistroArranque:
+    """Duración de cada etapa del arranque de este proceso"""
+
+    def __init__(self):
+        self.etapas = {}
+        self._lock = threading.Lock()
+        self._reportado = False
+
+    def registrar(self, etapa, segundos):
+        with self._lock:
+            self.etapas.setdefault(etapa, round(segundos * 1000, 1))
+
+    @contextmanager
+    def medir(self, etapa):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(etapa, time.perf_counter() - inicio)
+
+    def reporte(self):
+        """Milisegundos por etapa"""
+        with self._lock:
+            return dict(self.etapas)
+
+    def imprimir_una_vez(self):
+        """Imprime el reporte la primera vez que se llama en el proceso"""
+        with self._lock:
+            if self._reportado:
+                return
+            self._reportado = True
+        print('Arranque: ' + ' '.join(f"{etapa}={ms}ms" for etapa, ms in self.reporte().items()))
+
+
+# Instancia global
+tiempos_arranque = RegistroArranque()
+
+
+def _recolectar_metricas():
+    """Etapas del arranque para /metrics"""
+    return [('arranque_etapa_milisegundos', 'gauge', 'Duración de cada etapa del arranque de esta instancia',
+             [({'etapa': etapa}, ms) for etapa, ms in tiempos_arranque.reporte().items()])]
+
+
+metricas.agregar_recolector(_recolectar_metricas)
@@ -0,0 +1,29 @@
+# Event loop de fondo para el camino asíncrono de Firestore.
+# Flask ejecuta cada vista async en un loop nuevo, y los canales del AsyncClient quedan
+# atados al loop donde se crean. Todas las corrutinas de Firestore corren en este único
+# loop de larga vida, así el cliente y sus conexiones se reutilizan entre requests.
+import asyncio
+import threading
+
+_loop = None
+_lock = threading.Lock()
+
+
+def _obtener_loop():
+    """Inicia el loop de fondo la primera vez que se usa"""
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='firestore-async', daemon=True).start()
+    return _loop
+
+
+def en_loop(corrutina):
+    """Ejecuta una corrutina en el loop de fondo; se espera con await desde cualquier otro loop"""
+    return asyncio.wrap_future(asyncio.run_coroutine_threadsafe(corrutina, _obtener_loop()))
+
+
+def ejecutar(corrutina, timeout=None):
+    """Ejecuta una corrutina en el loop de fondo y espera el resultado (código síncrono)"""
+    return asyncio.run_coroutine_threadsafe(corrutina, _obtener_loop()).result(timeout)
@@ -0,0 +1,149 @@
+# Cliente de la API REST de Firebase Auth (identitytoolkit).
+# Una sola requests.Session con pool de conexiones keep-alive: los logins reutilizan la
+# conexión TLS en vez de abrir una nueva. Todas las llamadas tienen timeout y los errores
+# transitorios (5xx, fallas de conexión) se reintentan con backoff exponencial, dentro de
+# un plazo total por llamada que cabe en un request serverless.
+import os
+import time
+import threading
+from collections import deque
+from backend.config.dependencias import requests
+from backend.services.metricas import duracion_auth
+
+URL_BASE = 'https://identitytoolkit.googleapis.com/v1/accounts'
+
+# Emulador de Firebase Auth (la misma variable que usa firebase_admin)
+if os.getenv('FIREBASE_AUTH_EMULATOR_HOST'):
+    URL_BASE = f"http://{os.getenv('FIREBASE_AUTH_EMULATOR_HOST')}/identitytoolkit.googleapis.com/v1/accounts"
+
+TIMEOUT_CONEXION = float(os.getenv('AUTH_TIMEOUT_CONEXION', '3.05'))
+TIMEOUT_LECTURA = float(os.getenv('AUTH_TIMEOUT_LECTURA', '10'))
+MAX_REINTENTOS = int(os.getenv('AUTH_MAX_REINTENTOS', '2'))
+BACKOFF_SEGUNDOS = 0.25
+
+# Tiempo total de una llamada, reintentos incluidos; no se reintenta si no queda al menos
+# MIN_INTENTO_SEGUNDOS después de la espera
+PLAZO_SEGUNDOS = float(os.getenv('AUTH_PLAZO_SEGUNDOS', '5'))
+MIN_INTENTO_SEGUNDOS = 1.0
+
+
+class MetricasLatencia:
+    """Latencias y contadores por operación (se guardan las últimas muestras)"""
+
+    def __init__(self, max_muestras=500):
+        self.max_muestras = max_muestras
+        self._operaciones = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, operacion, segundos, error=False, reintentos=0):
+        with self._lock:
+            datos = self._operaciones.setdefault(operacion, {
+                'total': 0, 'errores': 0, 'reintentos': 0, 'muestras': deque(maxlen=self.max_muestras)
+            })
+            datos['total'] += 1
+            datos['errores'] += int(error)
+            datos['reintentos'] += reintentos
+            datos['muestras'].append(segundos)
+
+    def estadisticas(self):
+        """Contadores y percentiles (ms) de cada operación"""
+        with self._lock:
+            resultado = {}
+            for operacion, datos in self._operaciones.items():
+                muestras = sorted(datos['muestras'])
+                resultado[operacion] = {
+                    'total': datos['total'],
+                    'errores': datos['errores'],
+                    'reintentos': datos['reintentos'],
+                    'p50_ms': round(muestras[len(muestras) // 2] * 1000, 1),
+                    'p95_ms': round(muestras[max(0, int(len(muestras) * 0.95) - 1)] * 1000, 1),
+                    'max_ms': round(muestras[-1] * 1000, 1)
+                }
+            return resultado
+
+
+# Instancias globales
+metricas_auth = MetricasLatencia()
+
+_sesion = None
+_lock_sesion = threading.Lock()
+
+
+def obtener_sesion():
+    """Sesión compartida, creada en el primer uso (requests se importa recién ahí)"""
+    global _sesion
+    with _lock_sesion:
+        if _sesion is None:
+            _sesion = requests().Session()
+            _sesion.mount('https://', requests().adapters.HTTPAdapter(
+                pool_connections=1, pool_maxsize=int(os.getenv('AUTH_POOL_CONEXIONES', '10'))
+            ))
+    return _sesion
+
+
+def _registrar(operacion, inicio, error, reintentos):
+    segundos = time.perf_counter() - inicio
+    metricas_auth.registrar(operacion, segundos, error=error, reintentos=reintentos)
+    duracion_auth.observar(segundos, operacion, 'si' if error else 'no')
+
+
+def _json(response):
+    """Cuerpo JSON de la respuesta, o {} si no lo es (páginas de error de un proxy, 502 en HTML)"""
+    try:
+        return response.json()
+    except ValueError:
+        return {}
+
+
+def _post(operacion, payload, reintentar_respuestas=True):
+    """
+    POST a identitytoolkit. Retorna (status_code, json).
+    Los timeouts de conexión siempre se reintentan; las respuestas 5xx y las demás
+    fallas de red solo si reintentar_respuestas. Todo dentro de PLAZO_SEGUNDOS.
+    """
+    url = f"{URL_BASE}:{operacion}?key={os.getenv('FIREBASE_WEB_API_KEY')}"
+    errores_red = requests().exceptions
+    inicio = time.perf_counter()
+    intento = 0
+
+    while True:
+        restante = PLAZO_SEGUNDOS - (time.perf_counter() - inicio)
+        try:
+            response = obtener_sesion().post(url, json=payload, timeout=(
+                min(TIMEOUT_CONEXION, restante), min(TIMEOUT_LECTURA, restante)
+            ))
+            error = None
+        except errores_red.RequestException as e:
+            response, error = None, e
+
+        # Solo se reintenta si después de la espera queda plazo para otro intento
+        espera = BACKOFF_SEGUNDOS * (2 ** intento)
+        queda_plazo = PLAZO_SEGUNDOS - (time.perf_counter() - inicio) - espera >= MIN_INTENTO_SEGUNDOS
+        puede_reintentar = intento < MAX_REINTENTOS and queda_plazo
+
+        if error is None:
+            if response.status_code < 500 or not reintentar_respuestas or not puede_reintentar:
+                _registrar(operacion, inicio, response.status_code >= 500, intento)
+                return response.status_code, _json(response)
+        else:
+            # Si no se pudo conectar el request no llegó; otras fallas de red son ambiguas
+            reintentable = isinstance(error, errores_red.ConnectTimeout) or (
+                reintentar_respuestas and isinstance(error, (errores_red.ConnectionError, errores_red.Timeout))
+            )
+            if not reintentable or not puede_reintentar:
+                _registrar(operacion, inicio, True, intento)
+                raise error
+
+        time.sleep(espera)
+        intento += 1
+
+
+def iniciar_sesion(email, password):
+    """signInWithPassword. Retorna (status_code, json)"""
+    return _post('signInWithPassword', {"email": email, "password": password, "returnSecureToken": True})
+
+
+def crear_cuenta(email, password):
+    """signUp. Un 5xx puede haber creado la cuenta, así que solo se reintentan los timeouts de conexión"""
+    return _post('signUp', {"email": email, "password": password, "returnSecureToken": True},
+                 reintentar_respuestas=False)
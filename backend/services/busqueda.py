@@ -0,0 +1,81 @@
+# Índice de búsqueda por prefijo para pacientes.
+# Cada paciente guarda en tokens_busqueda los prefijos normalizados (sin tildes, en
+# minúsculas) de su nombre y del nombre del apoderado, y los dígitos del teléfono.
+# Una búsqueda es entonces una sola consulta array_contains.
+import re
+import unicodedata
+
+MAX_LARGO_TOKEN = 20
+MIN_DIGITOS_TELEFONO = 3
+LIMITE_RESULTADOS = 10
+
+
+def normalizar(texto):
+    """Minúsculas, sin tildes y con espacios simples"""
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r'[^a-z0-9 ]', ' ', texto.lower())
+    return ' '.join(texto.split())
+
+
+def _prefijos(texto, minimo=1):
+    prefijos = {texto[:largo] for largo in range(minimo, min(len(texto), MAX_LARGO_TOKEN) + 1)}
+    # La consulta normalizada nunca termina en espacio
+    return {prefijo for prefijo in prefijos if not prefijo.endswith(' ')}
+
+
+def tokens_nombre(nombre):
+    """Prefijos de cada palabra y del nombre completo"""
+    nombre = normalizar(nombre)
+    tokens = _prefijos(nombre)
+    for palabra in nombre.split():
+        tokens |= _prefijos(palabra)
+    return tokens
+
+
+def tokens_telefono(telefono):
+    """Prefijos de los dígitos del teléfono, con y sin código de país"""
+    digitos = re.sub(r'\D', '', telefono or '')
+    tokens = _prefijos(digitos, MIN_DIGITOS_TELEFONO)
+    # Número local chileno (9 dígitos) sin el 56
+    if len(digitos) > 9:
+        tokens |= _prefijos(digitos[-9:], MIN_DIGITOS_TELEFONO)
+    return tokens
+
+
+def tokens_paciente(paciente_data):
+    """Tokens de búsqueda para guardar en el documento del paciente"""
+    tokens = tokens_nombre(paciente_data.get('nombre_paciente', ''))
+    tokens |= tokens_nombre(paciente_data.get('nombre_apoderado', ''))
+    tokens |= tokens_telefono(paciente_data.get('telefono', ''))
+    return sorted(tokens)
+
+
+def token_consulta(q):
+    """Token a buscar para un texto ingresado por el usuario"""
+    if re.fullmatch(r'[\d\s+()-]+', q or ''):
+        digitos = re.sub(r'\D', '', q)
+        return digitos[:MAX_LARGO_TOKEN] if len(digitos) >= MIN_DIGITOS_TELEFONO else ''
+    return normalizar(q)[:MAX_LARGO_TOKEN]
+
+
+def buscar_pacientes(db, q, limite=LIMITE_RESULTADOS):
+    """Busca pacientes por prefijo de nombre, apoderado o teléfono (una consulta)"""
+    token = token_consulta(q)
+    if not token:
+        return []
+
+    query = db.collection('pacientes')\
+              .where('tokens_busqueda', 'array_contains', token)\
+              .limit(limite)
+
+    pacientes = []
+    for doc in query.stream():
+        paciente_data = doc.to_dict()
+        pacientes.append({
+            'id': doc.id,
+            'nombre_paciente': paciente_data.get('nombre_paciente', ''),
+            'nombre_apoderado': paciente_data.get('nombre_apoderado', ''),
+            'telefono': paciente_data.get('telefono', '')
+        })
+    return pacientes
@@ -0,0 +1,159 @@
+# Cache en memoria para colecciones de referencia (pacientes, servicios, usuarios, especialidades)
+# Las escrituras hechas en esta instancia actualizan o invalidan el cache al momento;
+# los cambios hechos por otras instancias se ven a más tardar después del TTL.
+import os
+import time
+import threading
+from collections import OrderedDict
+from backend.services.metricas import metricas
+
+# Colecciones que cambian poco y se pueden cachear
+COLECCIONES_CACHEADAS = {'pacientes', 'servicios', 'usuarios_sistema', 'especialidades'}
+
+
+class CacheTTL:
+    """Cache LRU con tamaño máximo y expiración por TTL"""
+
+    def __init__(self, max_entradas=5000, ttl=300):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def obtener(self, clave):
+        """Retorna (encontrado, valor)"""
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None or entrada[0] < time.monotonic():
+                if entrada is not None:
+                    del self._datos[clave]
+                self.misses += 1
+                return False, None
+
+            self._datos.move_to_end(clave)
+            self.hits += 1
+            return True, entrada[1]
+
+    def guardar(self, clave, valor):
+        """Guarda un valor, descartando el menos usado si se supera el tamaño"""
+        with self._lock:
+            self._datos[clave] = (time.monotonic() + self.ttl, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def invalidar(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def invalidar_si(self, condicion):
+        """Invalida todas las claves que cumplan la condición"""
+        with self._lock:
+            for clave in [c for c in self._datos if condicion(c)]:
+                del self._datos[clave]
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def estadisticas(self):
+        """Contadores de hits/misses"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'ratio_hits': round(self.hits / total, 4) if total else 0.0,
+            'entradas': len(self._datos),
+            'max_entradas': self.max_entradas,
+            'ttl_segundos': self.ttl
+        }
+
+
+# Instancia global
+cache_referencias = CacheTTL(
+    max_entradas=int(os.getenv('CACHE_MAX_ENTRADAS', '5000')),
+    ttl=int(os.getenv('CACHE_TTL_SEGUNDOS', '300'))
+)
+
+
+def _recolectar_metricas():
+    """Contadores del cache para /metrics"""
+    datos = cache_referencias.estadisticas()
+    cache = {'cache': 'referencias'}
+    return [
+        ('cache_consultas_total', 'counter', 'Consultas al cache por resultado',
+         [(dict(cache, resultado='hit'), datos['hits']), (dict(cache, resultado='miss'), datos['misses'])]),
+        ('cache_ratio_hits', 'gauge', 'Proporción de consultas al cache resueltas sin Firestore',
+         [(cache, datos['ratio_hits'])]),
+        ('cache_entradas', 'gauge', 'Entradas guardadas en el cache', [(cache, datos['entradas'])]),
+    ]
+
+
+metricas.agregar_recolector(_recolectar_metricas)
+
+
+def obtener_coleccion(db, coleccion, filtro=None):
+    """
+    Lista los documentos de una colección (con 'id'), usando el cache.
+    filtro: tupla opcional (campo, operador, valor)
+    """
+    clave = ('lista', coleccion, filtro)
+    encontrado, documentos = cache_referencias.obtener(clave)
+
+    if not encontrado:
+        query = db.collection(coleccion)
+        if filtro:
+            query = query.where(*filtro)
+
+        documentos = []
+        for doc in query.stream():
+            datos = doc.to_dict()
+            datos['id'] = doc.id
+            documentos.append(datos)
+            cache_referencias.guardar(('doc', coleccion, doc.id), datos)
+
+        cache_referencias.guardar(clave, documentos)
+
+    # Copias para que las vistas puedan modificar los dicts sin tocar el cache
+    return [dict(datos) for datos in documentos]
+
+
+def obtener_documentos_cacheados(coleccion, ids):
+    """Busca documentos en el cache. Retorna ({id: datos}, ids_faltantes)"""
+    encontrados = {}
+    faltantes = set()
+    for doc_id in ids:
+        encontrado, datos = cache_referencias.obtener(('doc', coleccion, doc_id))
+        if encontrado:
+            encontrados[doc_id] = dict(datos)
+        else:
+            faltantes.add(doc_id)
+    return encontrados, faltantes
+
+
+def guardar_documento(coleccion, doc_id, datos):
+    """Guarda un documento leído desde Firestore en el cache"""
+    datos = dict(datos)
+    datos['id'] = doc_id
+    cache_referencias.guardar(('doc', coleccion, doc_id), datos)
+
+
+def registrar_escritura(coleccion, doc_id, datos=None):
+    """
+    Actualiza el cache después de una escritura (write-through).
+    datos=None indica que el documento fue eliminado.
+    """
+    if datos is None:
+        cache_referencias.invalidar(('doc', coleccion, doc_id))
+    else:
+        guardar_documento(coleccion, doc_id, datos)
+
+    # Los listados de la colección quedan obsoletos
+    cache_referencias.invalidar_si(lambda clave: clave[0] == 'lista' and clave[1] == coleccion)
+
+
+def invalidar_coleccion(coleccion):
+    """Invalida todo lo cacheado de una colección"""
+    cache_referencias.invalidar_si(lambda clave: clave[1] == coleccion)
@@ -0,0 +1,255 @@
+# Proyección materializada del calendario: un documento calendario_semanas/{lunes}
+# por semana, con el mapa de bloques listo para renderizar.
+# Se actualiza de forma incremental en cada escritura de citas. Las ocurrencias de las
+# series recurrentes no se guardan aquí: se agregan al leer la semana.
+from datetime import datetime, timedelta
+from backend.config.dependencias import firestore
+from backend.services.versiones import incrementar, ejecutar_transaccion, clave_semana, lunes_de
+from backend.services.referencias import resolver_referencias, sin_nombres, nombre_cita, CAMPOS_CITA
+from backend.services.series import version_ref, version_de, obtener_series, ocurrencias
+from backend.services.concurrencia import en_paralelo
+
+COLECCION_SEMANAS = 'calendario_semanas'
+
+# Estados que no ocupan horario en el calendario
+ESTADOS_OCULTOS = ['pendiente_reprogramacion', 'reprogramada']
+
+
+# Campo de la entrada de calendario con el nombre de cada referencia de la cita
+CAMPOS_ENTRADA = {'paciente_id': 'paciente', 'servicio_id': 'servicio', 'profesional_id': 'profesional'}
+
+
+def clave_cita(cita_data):
+    """Clave del bloque en el calendario (fecha_hora)"""
+    return f"{cita_data['fecha']}_{cita_data['hora']}"
+
+
+def entrada_calendario(cita_id, cita_data, referencias):
+    """Datos de una cita tal como los usa calendario.html"""
+    return {
+        'id': cita_id,
+        'paciente': nombre_cita(cita_data, referencias, 'paciente_id', 'Paciente'),
+        'servicio': nombre_cita(cita_data, referencias, 'servicio_id', 'Servicio'),
+        'profesional': nombre_cita(cita_data, referencias, 'profesional_id', 'Profesional'),
+        'estado': cita_data.get('estado', 'programada'),
+        'observaciones': cita_data.get('observaciones', ''),
+        'serie_id': cita_data.get('serie_id')
+    }
+
+
+def _escribir(db, lunes, datos, escritor=None):
+    """
+    Escribe en el documento de la semana, directo o dentro de un batch/transacción.
+    Toda escritura de citas pasa por aquí, así que también incrementa la versión de la semana.
+    """
+    propio = escritor is None
+    if propio:
+        escritor = db.batch()
+
+    escritor.set(db.collection(COLECCION_SEMANAS).document(lunes), datos, merge=True)
+    incrementar(db, [clave_semana(lunes)], escritor)
+
+    if propio:
+        escritor.commit()
+
+
+def semana_ref(db, fecha):
+    """Documento de la semana de una fecha YYYY-MM-DD"""
+    return db.collection(COLECCION_SEMANAS).document(lunes_de(fecha))
+
+
+def registrar_cita_en_semana(db, cita_id, cita_data, escritor=None):
+    """Agrega o actualiza una cita en el documento de su semana"""
+    # Una cita oculta no ocupa el calendario; sacarla es de quitar_cita_de_semana
+    if cita_data.get('estado') in ESTADOS_OCULTOS:
+        return
+
+    referencias = resolver_referencias(db, sin_nombres([cita_data]), CAMPOS_CITA)
+    _escribir(db, lunes_de(cita_data['fecha']), {
+        'lunes': lunes_de(cita_data['fecha']),
+        'citas': {clave_cita(cita_data): entrada_calendario(cita_id, cita_data, referencias)},
+        'fecha_modificacion': datetime.now().isoformat()
+    }, escritor)
+
+
+def registrar_citas_en_semanas(db, citas, referencias, escritor):
+    """
+    Agrega varias citas nuevas [(cita_id, cita_data), ...] con un set por semana
+    y un solo incremento de versiones
+    """
+    semanas = {}
+    for cita_id, cita_data in citas:
+        semana = semanas.setdefault(lunes_de(cita_data['fecha']), {})
+        semana[clave_cita(cita_data)] = entrada_calendario(cita_id, cita_data, referencias)
+
+    for lunes, entradas in semanas.items():
+        escritor.set(db.collection(COLECCION_SEMANAS).document(lunes), {
+            'lunes': lunes,
+            'citas': entradas,
+            'fecha_modificacion': datetime.now().isoformat()
+        }, merge=True)
+
+    incrementar(db, [clave_semana(lunes) for lunes in semanas], escritor)
+
+
+def quitar_cita_de_semana(db, cita_id, cita_data, semana_doc, escritor=None):
+    """
+    Libera el bloque de una cita en el documento de su semana (semana_doc, leído en la
+    misma transacción). Solo se quita si la entrada es de esta cita: el bloque puede
+    estar tomado por otra cita agendada después de liberarlo.
+    """
+    lunes = lunes_de(cita_data['fecha'])
+    entrada = (semana_doc.to_dict() or {}).get('citas', {}).get(clave_cita(cita_data)) if semana_doc.exists else None
+    if not entrada or entrada.get('id') != cita_id:
+        # La semana no cambia, pero la cita sí
+        incrementar(db, [clave_semana(lunes)], escritor)
+        return
+
+    _escribir(db, lunes, {
+        'lunes': lunes,
+        'citas': {clave_cita(cita_data): firestore().DELETE_FIELD},
+        'fecha_modificacion': datetime.now().isoformat()
+    }, escritor)
+
+
+def fin_de_semana(lunes):
+    """Domingo (YYYY-MM-DD) de la semana que empieza en lunes"""
+    return (datetime.strptime(lunes, '%Y-%m-%d') + timedelta(days=6)).strftime('%Y-%m-%d')
+
+
+def citas_visibles(docs):
+    """Datos (con 'id') de los documentos de citas que ocupan el calendario"""
+    citas_semana = []
+    for doc in docs:
+        cita_data = doc.to_dict()
+        cita_data['id'] = doc.id
+
+        # Excluir citas pendientes y reprogramadas
+        if cita_data.get('estado') in ESTADOS_OCULTOS:
+            continue
+
+        citas_semana.append(cita_data)
+    return citas_semana
+
+
+def mapa_citas(citas_semana, referencias):
+    """
+    Mapa {fecha_hora: entrada} de una lista de citas (guardadas u ocurrencias), con las
+    referencias ya resueltas para las citas sin nombres (ver referencias.sin_nombres)
+    """
+    citas_dict = {}
+    for cita_data in citas_semana:
+        try:
+            citas_dict[clave_cita(cita_data)] = entrada_calendario(cita_data['id'], cita_data, referencias)
+        except Exception as e:
+            print(f"Error procesando cita {cita_data['id']}: {e}")
+            continue
+
+    return citas_dict
+
+
+def documento_semana(lunes, citas_dict):
+    """Documento completo de una semana materializada"""
+    return {
+        'lunes': lunes,
+        'citas': citas_dict,
+        'completa': True,
+        'fecha_modificacion': datetime.now().isoformat()
+    }
+
+
+def con_series(citas, citas_series):
+    """Agrega las ocurrencias de series: una cita guardada en el mismo bloque tiene prioridad"""
+    for clave, entrada in citas_series.items():
+        citas.setdefault(clave, entrada)
+    return citas
+
+
+def renombrar_en_semana(db, lunes, cita_ids, campo, nombre):
+    """
+    Cambia un nombre (campo de la entrada: paciente, servicio o profesional) solo en las
+    entradas de cita_ids del documento de la semana, en una transacción que lo lee: las
+    demás entradas no se tocan, así una cita agendada o liberada entre medio no se pierde.
+    """
+    ref = db.collection(COLECCION_SEMANAS).document(lunes)
+
+    def _renombrar(transaction):
+        semana_doc = ref.get(transaction=transaction)
+        citas = (semana_doc.to_dict() or {}).get('citas', {}) if semana_doc.exists else {}
+        cambios = {clave: {campo: nombre} for clave, entrada in citas.items() if entrada.get('id') in cita_ids}
+        if not cambios:
+            # La semana no cambia, pero sus citas sí
+            incrementar(db, [clave_semana(lunes)], transaction)
+            return
+        _escribir(db, lunes, {'citas': cambios, 'fecha_modificacion': datetime.now().isoformat()}, transaction)
+
+    ejecutar_transaccion(db, _renombrar)
+
+
+def construir_citas_semana(db, fecha_inicio, fecha_fin, transaction=None):
+    """Arma el mapa de citas de un rango consultando la colección citas"""
+    citas = db.collection('citas')\
+              .where('fecha', '>=', fecha_inicio)\
+              .where('fecha', '<=', fecha_fin)\
+              .stream(transaction=transaction)
+    citas_semana = citas_visibles(citas)
+
+    # Los nombres vienen en la cita; solo las citas antiguas sin ellos resuelven referencias
+    referencias = resolver_referencias(db, sin_nombres(citas_semana), CAMPOS_CITA)
+    return mapa_citas(citas_semana, referencias)
+
+
+def reconstruir_semana(db, lunes, actualizar_version=True):
+    """
+    Recalcula por completo el documento de una semana, en una transacción que lo lee junto
+    con las citas: toda escritura de citas escribe también ese documento, así una cita
+    agendada o liberada entre medio hace reintentar la reconstrucción en vez de perderse.
+    """
+    ref = db.collection(COLECCION_SEMANAS).document(lunes)
+
+    def _reconstruir(transaction):
+        ref.get(transaction=transaction)
+        citas_dict = construir_citas_semana(db, lunes, fin_de_semana(lunes), transaction)
+        transaction.set(ref, documento_semana(lunes, citas_dict))
+        if actualizar_version:
+            incrementar(db, [clave_semana(lunes)], transaction)
+        return citas_dict
+
+    return ejecutar_transaccion(db, _reconstruir)
+
+
+def citas_series_semana(db, lunes, series):
+    """Entradas de calendario de las ocurrencias de series de una semana"""
+    citas_series = ocurrencias(series, lunes, fin_de_semana(lunes))
+    referencias = resolver_referencias(db, sin_nombres(citas_series), CAMPOS_CITA)
+    return mapa_citas(citas_series, referencias)
+
+
+def obtener_semana(db, lunes):
+    """
+    Citas de una semana más las ocurrencias de series, con una sola lectura
+    (documento de la semana y versión de series); si la semana no está materializada se construye
+    """
+    semana_ref = db.collection(COLECCION_SEMANAS).document(lunes)
+    serie_version_ref = version_ref(db)
+    docs = {doc.reference.path: doc for doc in db.get_all([semana_ref, serie_version_ref])}
+    semana_doc = docs[semana_ref.path]
+
+    def leer_citas():
+        if semana_doc.exists:
+            semana = semana_doc.to_dict()
+            # Un documento creado solo por escrituras incrementales no tiene las citas anteriores
+            if semana.get('completa'):
+                return semana.get('citas', {})
+
+        # Materializar una semana no cambia sus datos: no se incrementa la versión
+        return reconstruir_semana(db, lunes, actualizar_version=False)
+
+    version = version_de(docs[serie_version_ref.path])
+    datos = en_paralelo(
+        citas=leer_citas,
+        series=lambda: citas_series_semana(db, lunes, obtener_series(db, version))
+    )
+
+    return con_series(datos['citas'], datos['series'])
+
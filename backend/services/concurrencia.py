@@ -0,0 +1,51 @@
+# Ejecución concurrente de lecturas independientes de Firestore.
+# El cliente de Firestore es seguro entre hilos, así que varias lecturas pueden
+# ir en paralelo y la latencia total se acerca a la de la lectura más lenta.
+import os
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+
+PREFIJO_HILOS = 'firestore'
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('FIRESTORE_HILOS', '8')),
+    thread_name_prefix=PREFIJO_HILOS
+)
+
+# Tiempo máximo de espera por un grupo de lecturas (sin límite si no se define)
+TIMEOUT_SEGUNDOS = float(os.getenv('FIRESTORE_TIMEOUT_SEGUNDOS', '0')) or None
+
+
+def _en_hilo_del_pool():
+    return threading.current_thread().name.startswith(PREFIJO_HILOS)
+
+
+def en_paralelo(**tareas):
+    """
+    Ejecuta funciones sin argumentos en paralelo.
+    Retorna {nombre: resultado}; si alguna falla se cancelan las pendientes y se lanza
+    la primera excepción. Las tareas ven el mismo contexto de Flask (request, session, g).
+    """
+    # Con una sola tarea, o si ya estamos en un hilo del pool (esperar ahí a otras
+    # tareas del mismo pool puede agotarlo), se ejecuta en el hilo actual
+    if len(tareas) <= 1 or _en_hilo_del_pool():
+        return {nombre: tarea() for nombre, tarea in tareas.items()}
+
+    futuros = {
+        nombre: _executor.submit(contextvars.copy_context().run, tarea)
+        for nombre, tarea in tareas.items()
+    }
+    terminados, pendientes = wait(futuros.values(), timeout=TIMEOUT_SEGUNDOS, return_when=FIRST_EXCEPTION)
+
+    fallido = next((futuro for futuro in terminados if futuro.exception() is not None), None)
+    if fallido is not None or pendientes:
+        for futuro in pendientes:
+            futuro.cancel()
+        if fallido is not None:
+            raise fallido.exception()
+        raise TimeoutError(f"Lecturas sin terminar después de {TIMEOUT_SEGUNDOS} segundos: "
+                           f"{', '.join(nombre for nombre, futuro in futuros.items() if futuro in pendientes)}")
+
+    return {nombre: futuro.result() for nombre, futuro in futuros.items()}
+
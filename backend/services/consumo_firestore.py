@@ -0,0 +1,177 @@
+# Consumo de Firestore por request: consultas, lecturas, documentos devueltos, escrituras
+# y tiempo acumulado en RPC. get_db() entrega el cliente envuelto en ObjetoMedido, que
+# registra cada llamada en el consumo del request actual (una ContextVar, que también ven
+# los hilos de en_paralelo). app.py lo expone en el header Server-Timing y registra en el
+# log los requests que pasan FIRESTORE_LOG_UMBRAL_MS. Cada RPC también se suma a las
+# métricas de la instancia (/metrics), haya o no un request en curso.
+import os
+import time
+import threading
+from contextvars import ContextVar
+from backend.services.metricas import duracion_firestore, documentos_firestore
+
+LOG_UMBRAL_MS = float(os.getenv('FIRESTORE_LOG_UMBRAL_MS', '500'))
+
+# Métodos que devuelven documentos (una consulta, o lecturas directas por referencia)
+METODOS_LECTURA = {'get', 'stream', 'get_all'}
+
+# Métodos que escriben; en un batch o transacción solo se encolan hasta commit()
+METODOS_ESCRITURA = {'set', 'update', 'delete', 'create', 'add'}
+
+# Clases del cliente que se envuelven (referencias, consultas, batches, transacciones)
+MODULOS_CLIENTE = ('google.cloud.firestore', 'backend.config.firestore_memoria')
+
+_consumo = ContextVar('consumo_firestore', default=None)
+
+
+class ConsumoFirestore:
+    """Contadores de Firestore de un request. El tiempo es la suma de los RPC (los paralelos se suman)"""
+
+    def __init__(self):
+        self.consultas = 0
+        self.lecturas = 0
+        self.documentos = 0
+        self.escrituras = 0
+        self.segundos = 0.0
+        self._lock = threading.Lock()
+
+    def registrar(self, consultas=0, lecturas=0, documentos=0, escrituras=0, segundos=0.0):
+        with self._lock:
+            self.consultas += consultas
+            self.lecturas += lecturas
+            self.documentos += documentos
+            self.escrituras += escrituras
+            self.segundos += segundos
+
+    @property
+    def milisegundos(self):
+        return round(self.segundos * 1000, 1)
+
+    def resumen(self):
+        return (f"{self.consultas} consultas, {self.lecturas} lecturas, {self.documentos} docs, "
+                f"{self.escrituras} escrituras, {self.milisegundos}ms firestore")
+
+    def server_timing(self):
+        """Valor del header Server-Timing"""
+        return f'firestore;dur={self.milisegundos};desc="{self.resumen()}"'
+
+
+class _SinConsumo:
+    """Consumo fuera de un request (comandos, tareas de fondo): no se acumula"""
+
+    def registrar(self, **_):
+        pass
+
+
+_SIN_CONSUMO = _SinConsumo()
+
+
+def iniciar_consumo():
+    """Empieza a contar el consumo del request actual"""
+    consumo = ConsumoFirestore()
+    _consumo.set(consumo)
+    return consumo
+
+
+def consumo_actual():
+    return _consumo.get()
+
+
+def sin_medir(valor):
+    """Objeto original del cliente (también dentro de listas), para pasarlo a la API de Firestore"""
+    if isinstance(valor, ObjetoMedido):
+        return object.__getattribute__(valor, '_objeto')
+    if isinstance(valor, (list, tuple)):
+        return type(valor)(sin_medir(item) for item in valor)
+    return valor
+
+
+def _envolver(valor):
+    modulo = type(valor).__module__
+    if modulo.startswith(MODULOS_CLIENTE) and not hasattr(valor, 'exists'):
+        return ObjetoMedido(valor)
+    return valor
+
+
+def _contar_documentos(documentos, consumo, operacion, consultas, lecturas, segundos):
+    """Recorre un stream/get_all midiendo solo el tiempo de espera de cada documento"""
+    iterador = iter(documentos)
+    cantidad = 0
+    try:
+        while True:
+            inicio = time.perf_counter()
+            try:
+                doc = next(iterador)
+            except StopIteration:
+                return
+            finally:
+                segundos += time.perf_counter() - inicio
+            cantidad += int(getattr(doc, 'exists', True))
+            yield doc
+    finally:
+        consumo.registrar(consultas=consultas, lecturas=lecturas, documentos=cantidad, segundos=segundos)
+        duracion_firestore.observar(segundos, operacion)
+        documentos_firestore.incrementar(operacion, valor=cantidad)
+
+
+class ObjetoMedido:
+    """Envuelve un objeto del cliente de Firestore y registra sus RPC en el consumo del request"""
+
+    __slots__ = ('_objeto',)
+
+    def __init__(self, objeto):
+        object.__setattr__(self, '_objeto', objeto)
+
+    def __getattr__(self, nombre):
+        atributo = getattr(self._objeto, nombre)
+        if not callable(atributo):
+            return _envolver(atributo)
+
+        def llamar(*args, **kwargs):
+            return self._llamar(nombre, atributo, args, kwargs)
+        return llamar
+
+    def __eq__(self, otro):
+        return self._objeto == sin_medir(otro)
+
+    def __hash__(self):
+        return hash(self._objeto)
+
+    def _llamar(self, nombre, metodo, args, kwargs):
+        args = [sin_medir(arg) for arg in args]
+        kwargs = {clave: sin_medir(valor) for clave, valor in kwargs.items()}
+        if nombre not in METODOS_LECTURA and nombre not in METODOS_ESCRITURA and nombre != 'commit':
+            return _envolver(metodo(*args, **kwargs))
+        consumo = _consumo.get() or _SIN_CONSUMO
+
+        # Un batch o transacción solo encola la escritura: el RPC es el commit
+        encolada = hasattr(self._objeto, 'commit') and nombre in METODOS_ESCRITURA
+        inicio = time.perf_counter()
+        resultado = metodo(*args, **kwargs)
+        segundos = 0.0 if encolada else time.perf_counter() - inicio
+
+        if nombre in METODOS_ESCRITURA or nombre == 'commit':
+            consumo.registrar(escrituras=int(nombre != 'commit'), segundos=segundos)
+            if not encolada:
+                duracion_firestore.observar(segundos, nombre)
+            return _envolver(resultado)
+        if hasattr(resultado, 'exists'):
+            # get() de una referencia
+            consumo.registrar(lecturas=1, documentos=int(resultado.exists), segundos=segundos)
+            duracion_firestore.observar(segundos, nombre)
+            documentos_firestore.incrementar(nombre, valor=int(resultado.exists))
+            return resultado
+        if isinstance(resultado, list) and resultado and isinstance(resultado[0], list):
+            # get() de una agregación (count)
+            consumo.registrar(consultas=1, segundos=segundos)
+            duracion_firestore.observar(segundos, 'count')
+            return resultado
+
+        es_consulta = nombre != 'get_all'
+        documentos = _contar_documentos(resultado, consumo, nombre, int(es_consulta), int(not es_consulta), segundos)
+        return list(documentos) if isinstance(resultado, list) else documentos
+
+
+def medir_cliente(db):
+    """Cliente de Firestore que registra su consumo por request"""
+    return ObjetoMedido(db) if db is not None else None
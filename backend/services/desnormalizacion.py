@@ -0,0 +1,119 @@
+# Propagación de los nombres desnormalizados de las citas (referencias.NOMBRES_CITA).
+# Al cambiar el nombre de un paciente, servicio o profesional se actualizan, en el mismo
+# request, las citas desde la semana actual, las series activas que lo copian a sus
+# ocurrencias y sus entradas en las semanas materializadas del calendario. Las citas pasadas conservan
+# el nombre que tenían al crearse.
+# El cambio de nombre se guarda junto con un registro en propagaciones_pendientes que se
+# borra al terminar; si la propagación falla (o la instancia se detiene) queda ahí y
+# "flask propagar-nombres" la reintenta.
+from datetime import datetime
+from backend.services.referencias import NOMBRES_CITA
+from backend.services.calendario import ESTADOS_OCULTOS, CAMPOS_ENTRADA, lunes_de, renombrar_en_semana
+from backend.services.series import COLECCION_SERIES, VERSION_SERIES
+from backend.services.versiones import incrementar, ejecutar_transaccion, clave_semana
+
+COLECCION_PENDIENTES = 'propagaciones_pendientes'
+
+# Firestore admite hasta 500 escrituras por batch
+LOTE_ESCRITURAS = 500
+
+
+def _actualizar_en_lotes(db, refs, cambios):
+    """Aplica los mismos cambios a varios documentos, en batches de hasta LOTE_ESCRITURAS"""
+    for inicio in range(0, len(refs), LOTE_ESCRITURAS):
+        batch = db.batch()
+        for ref in refs[inicio:inicio + LOTE_ESCRITURAS]:
+            batch.update(ref, cambios)
+        batch.commit()
+
+
+def propagar_nombre(db, campo_id, valor, nombre, desde=None):
+    """
+    Guarda el nombre nuevo en las citas (desde una fecha) y series activas con campo_id == valor,
+    y en las entradas de esas citas en las semanas del calendario. Retorna la cantidad de citas actualizadas.
+    """
+    _, _, destino = NOMBRES_CITA[campo_id]
+    desde = desde or lunes_de(datetime.now().strftime('%Y-%m-%d'))
+
+    citas = db.collection('citas')\
+              .where(campo_id, '==', valor)\
+              .where('fecha', '>=', desde)\
+              .stream()
+    refs = []
+    semanas = set()
+    # {lunes: IDs de las citas que están en el documento de la semana}
+    semanas_calendario = {}
+    for doc in citas:
+        cita_data = doc.to_dict()
+        if cita_data.get(destino) == nombre:
+            continue
+        refs.append(doc.reference)
+        semanas.add(lunes_de(cita_data['fecha']))
+        if cita_data.get('estado') not in ESTADOS_OCULTOS:
+            semanas_calendario.setdefault(lunes_de(cita_data['fecha']), set()).add(doc.id)
+    _actualizar_en_lotes(db, refs, {destino: nombre})
+
+    series = db.collection(COLECCION_SERIES)\
+               .where(campo_id, '==', valor)\
+               .where('estado', '==', 'activa')\
+               .stream()
+    refs_series = [doc.reference for doc in series if doc.to_dict().get(destino) != nombre]
+    _actualizar_en_lotes(db, refs_series, {destino: nombre})
+
+    # Versiones después de los datos: un ETag leído entre medio solo se renueva una vez más.
+    # Las series anteriores sin nombres los toman al leer, así que su versión cambia siempre
+    claves = [clave_semana(lunes) for lunes in sorted(semanas - set(semanas_calendario))] + [VERSION_SERIES]
+    for inicio in range(0, len(claves), LOTE_ESCRITURAS):
+        incrementar(db, claves[inicio:inicio + LOTE_ESCRITURAS])
+
+    # El documento de la semana guarda los nombres ya resueltos (renombrar_en_semana incrementa su versión)
+    for lunes, cita_ids in sorted(semanas_calendario.items()):
+        renombrar_en_semana(db, lunes, cita_ids, CAMPOS_ENTRADA[campo_id], nombre)
+
+    return len(refs)
+
+
+def _pendiente_ref(db, campo_id, valor):
+    return db.collection(COLECCION_PENDIENTES).document(f"{campo_id}_{valor}")
+
+
+def registrar_propagacion(db, campo_id, valor, nombre, escritor):
+    """Deja pendiente la propagación, en el mismo batch que cambia el nombre"""
+    escritor.set(_pendiente_ref(db, campo_id, valor), {
+        'campo_id': campo_id,
+        'valor': valor,
+        'nombre': nombre,
+        'fecha_creacion': datetime.now().isoformat()
+    })
+
+
+def completar_propagacion(db, campo_id, valor, nombre):
+    """Propaga el nombre y borra su registro pendiente. Retorna False si falla (queda pendiente)"""
+    try:
+        propagar_nombre(db, campo_id, valor, nombre)
+    except Exception as e:
+        print(f"Error propagando {campo_id}={valor}, queda pendiente: {e}")
+        return False
+
+    pendiente_ref = _pendiente_ref(db, campo_id, valor)
+
+    def _borrar(transaction):
+        # Un cambio de nombre posterior reemplaza el registro: ese sigue pendiente
+        pendiente_doc = pendiente_ref.get(transaction=transaction)
+        if pendiente_doc.exists and pendiente_doc.to_dict().get('nombre') == nombre:
+            transaction.delete(pendiente_ref)
+
+    ejecutar_transaccion(db, _borrar)
+    return True
+
+
+def completar_pendientes(db):
+    """Reintenta las propagaciones pendientes. Retorna (completadas, fallidas)"""
+    completadas = fallidas = 0
+    for doc in db.collection(COLECCION_PENDIENTES).stream():
+        pendiente = doc.to_dict()
+        if completar_propagacion(db, pendiente['campo_id'], pendiente['valor'], pendiente['nombre']):
+            completadas += 1
+        else:
+            fallidas += 1
+    return completadas, fallidas
@@ -0,0 +1,107 @@
+# Configuración de horarios del centro, mantenida en memoria.
+# Los bloques horarios se calculan una sola vez por versión de la configuración,
+# así generar_horarios() no hace lecturas ni parseo en cada request.
+import os
+import time
+import threading
+from datetime import datetime
+from backend.config.firebase_config import firebase_config
+
+HORARIOS_TTL_SEGUNDOS = int(os.getenv('HORARIOS_TTL_SEGUNDOS', '300'))
+
+CONFIGURACION_POR_DEFECTO = {"hora_inicio": "09:00", "hora_termino": "18:00"}
+
+
+def calcular_bloques(config):
+    """Calcula los bloques de una hora entre hora_inicio y hora_termino"""
+    hora_inicio = int(config['hora_inicio'].split(':')[0])
+    hora_termino = int(config['hora_termino'].split(':')[0])
+    return tuple(f"{hora:02d}:00" for hora in range(hora_inicio, hora_termino + 1))
+
+
+class ConfiguracionHorarios:
+    """Configuración del centro en memoria, con estampa de versión"""
+
+    def __init__(self, ttl=HORARIOS_TTL_SEGUNDOS):
+        self.ttl = ttl
+        self.configuracion = dict(CONFIGURACION_POR_DEFECTO)
+        self.version = None
+        self.horarios = calcular_bloques(CONFIGURACION_POR_DEFECTO)
+        self._cargado_en = None
+        self._lock = threading.Lock()
+
+    def _vigente(self):
+        return self._cargado_en is not None and time.monotonic() - self._cargado_en < self.ttl
+
+    def actualizar(self, config):
+        """Reemplaza la configuración en memoria y recalcula los bloques si cambió la versión"""
+        with self._lock:
+            version = config.get('version')
+            if version is None or version != self.version or self._cargado_en is None:
+                self.horarios = calcular_bloques(config)
+                self.configuracion = dict(config)
+                self.version = version
+            self._cargado_en = time.monotonic()
+
+    def cargar(self, db=None):
+        """Lee la configuración desde Firestore"""
+        db = db or firebase_config.get_db()
+        config_doc = db.collection('horarios').document('configuracion_centro').get()
+
+        if config_doc.exists:
+            self.actualizar(config_doc.to_dict())
+        else:
+            self.actualizar(dict(CONFIGURACION_POR_DEFECTO))
+        return config_doc.exists
+
+    def refrescar_si_vencida(self, db=None):
+        if self._vigente():
+            return
+        try:
+            self.cargar(db)
+        except Exception as e:
+            # Mantener la última configuración conocida
+            print(f"Error obteniendo configuración: {e}")
+            with self._lock:
+                self._cargado_en = time.monotonic()
+
+    def obtener_horarios(self, db=None):
+        """Bloques horarios del centro (lista precalculada)"""
+        self.refrescar_si_vencida(db)
+        return list(self.horarios)
+
+    def obtener_configuracion(self, db=None):
+        """Configuración vigente (hora_inicio, hora_termino, ...)"""
+        self.refrescar_si_vencida(db)
+        return dict(self.configuracion)
+
+
+# Instancia global
+configuracion_horarios = ConfiguracionHorarios()
+
+
+def nueva_version():
+    """Estampa de versión para guardar junto a la configuración"""
+    return int(time.time() * 1000)
+
+
+def guardar_configuracion(db, hora_inicio, hora_termino):
+    """Guarda la configuración en Firestore y la aplica en memoria"""
+    config = {
+        'hora_inicio': hora_inicio,
+        'hora_termino': hora_termino,
+        'activo': True,
+        'fecha_modificacion': datetime.now().isoformat(),
+        'version': nueva_version()
+    }
+    calcular_bloques(config)  # Validar antes de guardar
+
+    # Usar set() con merge=True para crear o actualizar
+    db.collection('horarios').document('configuracion_centro').set(config, merge=True)
+    configuracion_horarios.actualizar(config)
+    return config
+
+
+def generar_horarios():
+    """Genera horarios basados en configuración del centro"""
+    return configuracion_horarios.obtener_horarios()
@@ -0,0 +1,190 @@
+# Importación masiva de citas (JSON o CSV).
+# Valida todas las filas, revisa conflictos contra una sola consulta de rango sobre
+# ocupacion_horarios y escribe en batches de hasta 500 escrituras.
+import io
+import csv
+import json
+from datetime import datetime
+from backend.config.dependencias import excepciones_google
+from backend.services.horarios import generar_horarios
+from backend.services.referencias import resolver_referencias, agregar_nombres, CAMPOS_CITA
+from backend.services.calendario import lunes_de, registrar_citas_en_semanas
+from backend.services.series import obtener_series, serie_en_bloque
+from backend.services.ocupacion import (
+    COLECCION_OCUPACION, clave_bloque, ocupacion_ref, datos_ocupacion, crear_cita, HorarioOcupadoError
+)
+
+MAX_FILAS = 5000
+LIMITE_ESCRITURAS_BATCH = 500
+
+CAMPOS_REQUERIDOS = ['fecha', 'hora', 'paciente_id', 'servicio_id', 'profesional_id']
+COLUMNAS_CSV = CAMPOS_REQUERIDOS + ['observaciones']
+
+# Colección -> (campo de la cita, mensaje si no existe)
+REFERENCIAS_REQUERIDAS = {
+    'pacientes': ('paciente_id', 'Paciente no encontrado'),
+    'servicios': ('servicio_id', 'Servicio no encontrado'),
+    'usuarios_sistema': ('profesional_id', 'Profesional no encontrado')
+}
+
+
+def leer_filas_csv(contenido):
+    """Filas de un CSV con encabezado fecha,hora,paciente_id,servicio_id,profesional_id[,observaciones]"""
+    lector = csv.DictReader(io.StringIO(contenido))
+    faltantes = [campo for campo in CAMPOS_REQUERIDOS if campo not in (lector.fieldnames or [])]
+    if faltantes:
+        raise ValueError(f"Columnas faltantes en el CSV: {', '.join(faltantes)}")
+    return [dict(fila) for fila in lector]
+
+
+def leer_filas_json(datos):
+    """Acepta una lista de citas o {"citas": [...]}"""
+    if isinstance(datos, dict):
+        datos = datos.get('citas')
+    if not isinstance(datos, list):
+        raise ValueError('Se esperaba una lista de citas')
+    return datos
+
+
+def leer_filas_archivo(archivo):
+    """Lee las filas de un archivo subido (.csv o .json)"""
+    contenido = archivo.read().decode('utf-8-sig')
+    if archivo.filename.lower().endswith('.json'):
+        return leer_filas_json(json.loads(contenido))
+    return leer_filas_csv(contenido)
+
+
+def validar_fila(fila, horarios):
+    """Retorna (cita_data, None) o (None, mensaje de error)"""
+    if not isinstance(fila, dict):
+        return None, 'Fila inválida'
+
+    valores = {campo: str(fila.get(campo) or '').strip() for campo in COLUMNAS_CSV}
+    faltantes = [campo for campo in CAMPOS_REQUERIDOS if not valores[campo]]
+    if faltantes:
+        return None, f"Campos requeridos faltantes: {', '.join(faltantes)}"
+
+    try:
+        datetime.strptime(valores['fecha'], '%Y-%m-%d')
+    except ValueError:
+        return None, 'Fecha inválida (formato YYYY-MM-DD)'
+
+    if valores['hora'] not in horarios:
+        return None, 'Hora fuera del horario del centro'
+
+    return valores, None
+
+
+def _lotes(citas):
+    """Agrupa las citas para que cada batch no supere LIMITE_ESCRITURAS_BATCH escrituras"""
+    lote = []
+    semanas = set()
+    for cita in citas:
+        semana = lunes_de(cita[1]['fecha'])
+        semanas_lote = semanas | {semana}
+        # 2 escrituras por cita (cita y ocupación) + documento y versión de cada semana
+        if lote and 2 * (len(lote) + 1) + 2 * len(semanas_lote) > LIMITE_ESCRITURAS_BATCH:
+            yield lote
+            lote = []
+            semanas_lote = {semana}
+        lote.append(cita)
+        semanas = semanas_lote
+    if lote:
+        yield lote
+
+
+def importar_citas(db, filas, usuario_id=None):
+    """
+    Crea citas en forma masiva. Retorna un reporte por fila:
+    {'resultados': [{'fila', 'estado', 'id' | 'error'}], 'creadas', 'errores'}
+    """
+    if len(filas) > MAX_FILAS:
+        raise ValueError(f"Máximo {MAX_FILAS} citas por importación")
+
+    horarios = set(generar_horarios())
+    resultados = [None] * len(filas)
+    validas = []
+    bloques_archivo = set()
+
+    # Validación de cada fila (sin I/O)
+    for indice, fila in enumerate(filas):
+        cita_data, error = validar_fila(fila, horarios)
+        if not error:
+            clave = clave_bloque(cita_data['fecha'], cita_data['hora'])
+            if clave in bloques_archivo:
+                error = 'Horario repetido en el archivo'
+            bloques_archivo.add(clave)
+        if error:
+            resultados[indice] = {'fila': indice + 1, 'estado': 'error', 'error': error}
+        else:
+            validas.append((indice, cita_data))
+
+    # Referencias: un get_all por colección, sin cache (los nombres quedan guardados en las citas)
+    referencias = resolver_referencias(db, [cita_data for _, cita_data in validas], CAMPOS_CITA, usar_cache=False)
+    pendientes = []
+    for indice, cita_data in validas:
+        error = next((mensaje for coleccion, (campo, mensaje) in REFERENCIAS_REQUERIDAS.items()
+                      if cita_data[campo] not in referencias[coleccion]), None)
+        if error:
+            resultados[indice] = {'fila': indice + 1, 'estado': 'error', 'error': error}
+        else:
+            pendientes.append((indice, cita_data))
+
+    # Conflictos: una sola consulta de rango sobre los bloques ocupados, más las series
+    if pendientes:
+        fechas = [cita_data['fecha'] for _, cita_data in pendientes]
+        ocupados = {doc.id for doc in db.collection(COLECCION_OCUPACION)
+                                         .where('fecha', '>=', min(fechas))
+                                         .where('fecha', '<=', max(fechas))
+                                         .stream()}
+        series = obtener_series(db)
+        libres = []
+        for indice, cita_data in pendientes:
+            if (clave_bloque(cita_data['fecha'], cita_data['hora']) in ocupados
+                    or serie_en_bloque(series, cita_data['fecha'], cita_data['hora'])):
+                resultados[indice] = {'fila': indice + 1, 'estado': 'error', 'error': 'Horario ocupado'}
+            else:
+                libres.append((indice, cita_data))
+        pendientes = libres
+
+    fecha_creacion = datetime.now().isoformat()
+    citas = []
+    for indice, cita_data in pendientes:
+        cita_data.update({'estado': 'programada', 'fecha_creacion': fecha_creacion})
+        agregar_nombres(cita_data, referencias)
+        if usuario_id:
+            cita_data['creado_por'] = usuario_id
+        citas.append((indice, cita_data, db.collection('citas').document()))
+
+    # Escritura en batches; create() sobre la ocupación hace fallar el batch si otro
+    # request tomó un bloque entre la consulta y el commit
+    for lote in _lotes(citas):
+        _escribir_lote(db, lote, referencias, resultados)
+
+    creadas = sum(1 for resultado in resultados if resultado['estado'] == 'creada')
+    return {'resultados': resultados, 'creadas': creadas, 'errores': len(filas) - creadas}
+
+
+def _escribir_lote(db, lote, referencias, resultados):
+    """Escribe un lote en un solo batch; si falla por un bloque tomado, cae a crear_cita por fila"""
+    batch = db.batch()
+    for _, cita_data, cita_ref in lote:
+        batch.set(cita_ref, cita_data)
+        batch.create(ocupacion_ref(db, cita_data['fecha'], cita_data['hora']), datos_ocupacion(cita_ref.id, cita_data))
+    registrar_citas_en_semanas(db, [(cita_ref.id, cita_data) for _, cita_data, cita_ref in lote], referencias, batch)
+
+    try:
+        batch.commit()
+        for indice, _, cita_ref in lote:
+            resultados[indice] = {'fila': indice + 1, 'estado': 'creada', 'id': cita_ref.id}
+        return
+    except (excepciones_google().AlreadyExists, excepciones_google().Conflict):
+        pass
+
+    # Algún bloque se ocupó mientras tanto: crear una por una para saber cuál
+    for indice, cita_data, _ in lote:
+        try:
+            cita_ref = crear_cita(db, cita_data)
+            resultados[indice] = {'fila': indice + 1, 'estado': 'creada', 'id': cita_ref.id}
+        except HorarioOcupadoError:
+            resultados[indice] = {'fila': indice + 1, 'estado': 'error', 'error': 'Horario ocupado'}
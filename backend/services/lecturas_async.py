@@ -0,0 +1,167 @@
+# Variantes asíncronas (AsyncClient) de las lecturas más frecuentes: semana del
+# calendario, disponibilidad y listados de la API. Usan el mismo cache y las mismas
+# colecciones que las versiones síncronas; las lecturas independientes van con
+# asyncio.gather. Deben correr en el loop de backend.services.asincrono.
+import asyncio
+from backend.config.firebase_config import firebase_config
+from backend.services.cache import (
+    cache_referencias, COLECCIONES_CACHEADAS, obtener_documentos_cacheados, guardar_documento
+)
+from backend.services.referencias import sin_nombres, CAMPOS_CITA
+from backend.services.versiones import COLECCION_VERSIONES
+from backend.services.paginacion import ordenar, decodificar_cursor, cursor_de, calculados_despues, mezclar
+from backend.services.series import COLECCION_SERIES, VERSION_SERIES, version_de, ocurrencias, horas_de_series
+from backend.services.calendario import (
+    COLECCION_SEMANAS, fin_de_semana, citas_visibles, mapa_citas, con_series
+)
+from backend.services.ocupacion import COLECCION_OCUPACION, clave_bloque
+
+
+def cliente():
+    return firebase_config.get_db_async()
+
+
+async def _get_all(db, refs):
+    """{path: snapshot} de varias referencias en una sola llamada"""
+    return {doc.reference.path: doc async for doc in db.get_all(refs)}
+
+
+async def obtener_documentos_async(db, coleccion, ids):
+    """Variante asíncrona de referencias.obtener_documentos"""
+    ids_unicos = {doc_id for doc_id in ids if doc_id}
+    if not ids_unicos:
+        return {}
+
+    documentos = {}
+    cacheable = coleccion in COLECCIONES_CACHEADAS
+    if cacheable:
+        documentos, ids_unicos = obtener_documentos_cacheados(coleccion, ids_unicos)
+        if not ids_unicos:
+            return documentos
+
+    refs = [db.collection(coleccion).document(doc_id) for doc_id in ids_unicos]
+    for doc in (await _get_all(db, refs)).values():
+        if doc.exists:
+            documentos[doc.id] = doc.to_dict()
+            if cacheable:
+                guardar_documento(coleccion, doc.id, documentos[doc.id])
+
+    return documentos
+
+
+async def resolver_referencias_async(db, registros, campos):
+    """Variante asíncrona de referencias.resolver_referencias (colecciones en paralelo)"""
+    ids_por_coleccion = {}
+    for campo, coleccion in campos.items():
+        ids = ids_por_coleccion.setdefault(coleccion, set())
+        for registro in registros:
+            if registro.get(campo):
+                ids.add(registro[campo])
+
+    colecciones = list(ids_por_coleccion)
+    resultados = await asyncio.gather(*[
+        obtener_documentos_async(db, coleccion, ids_por_coleccion[coleccion]) for coleccion in colecciones
+    ])
+    return dict(zip(colecciones, resultados))
+
+
+async def obtener_versiones_async(db, claves):
+    """Variante asíncrona de versiones.obtener_versiones"""
+    refs = [db.collection(COLECCION_VERSIONES).document(clave) for clave in claves]
+    versiones = {clave: 0 for clave in claves}
+    for doc in (await _get_all(db, refs)).values():
+        if doc.exists:
+            versiones[doc.id] = doc.to_dict().get('version', 0)
+    return versiones
+
+
+async def obtener_coleccion_async(db, coleccion, filtro=None):
+    """Variante asíncrona de cache.obtener_coleccion (mismas claves de cache)"""
+    clave = ('lista', coleccion, filtro)
+    encontrado, documentos = cache_referencias.obtener(clave)
+
+    if not encontrado:
+        query = db.collection(coleccion)
+        if filtro:
+            query = query.where(*filtro)
+
+        documentos = []
+        async for doc in query.stream():
+            datos = doc.to_dict()
+            datos['id'] = doc.id
+            documentos.append(datos)
+            cache_referencias.guardar(('doc', coleccion, doc.id), datos)
+
+        cache_referencias.guardar(clave, documentos)
+
+    return [dict(datos) for datos in documentos]
+
+
+async def obtener_series_async(db, version):
+    """Variante asíncrona de series.obtener_series (misma clave de cache por versión)"""
+    clave = ('lista', COLECCION_SERIES, version)
+    encontrado, series = cache_referencias.obtener(clave)
+    if not encontrado:
+        series = []
+        async for doc in db.collection(COLECCION_SERIES).where('estado', '==', 'activa').stream():
+            serie = doc.to_dict()
+            serie['id'] = doc.id
+            series.append(serie)
+        cache_referencias.guardar(clave, series)
+    return series
+
+
+async def pagina_async(query, orden, limite, cursor=None, calculados=()):
+    """Página de una consulta (con documentos calculados intercalados, como PaginaEnStream). Retorna (documentos, next_cursor)"""
+    query = ordenar(query, orden)
+    if cursor:
+        query = query.start_after(decodificar_cursor(cursor))
+
+    docs = [doc async for doc in query.limit(limite + 1).stream()]
+    docs = list(mezclar(docs, calculados_despues(calculados, orden, cursor), orden))
+    next_cursor = cursor_de(docs[limite - 1], orden) if len(docs) > limite else None
+    return docs[:limite], next_cursor
+
+
+async def _citas_guardadas_semana(db, lunes, semana_doc):
+    """Citas del documento de la semana, o armadas desde la colección citas si no está completo"""
+    if semana_doc.exists and semana_doc.to_dict().get('completa'):
+        return semana_doc.to_dict().get('citas', {})
+
+    query = db.collection('citas').where('fecha', '>=', lunes).where('fecha', '<=', fin_de_semana(lunes))
+    citas_semana = citas_visibles([doc async for doc in query.stream()])
+    referencias = await resolver_referencias_async(db, sin_nombres(citas_semana), CAMPOS_CITA)
+    # No se materializa aquí: reconstruir_semana lo hace en una transacción, para no
+    # pisar una cita agendada o liberada entre la consulta y la escritura
+    return mapa_citas(citas_semana, referencias)
+
+
+async def _citas_series_semana(db, lunes, version):
+    citas_series = ocurrencias(await obtener_series_async(db, version), lunes, fin_de_semana(lunes))
+    referencias = await resolver_referencias_async(db, sin_nombres(citas_series), CAMPOS_CITA)
+    return mapa_citas(citas_series, referencias)
+
+
+async def obtener_semana_async(db, lunes):
+    """Variante asíncrona de calendario.obtener_semana"""
+    semana_ref = db.collection(COLECCION_SEMANAS).document(lunes)
+    version_ref = db.collection(COLECCION_VERSIONES).document(VERSION_SERIES)
+    docs = await _get_all(db, [semana_ref, version_ref])
+
+    citas, citas_series = await asyncio.gather(
+        _citas_guardadas_semana(db, lunes, docs[semana_ref.path]),
+        _citas_series_semana(db, lunes, version_de(docs[version_ref.path]))
+    )
+    return con_series(citas, citas_series)
+
+
+async def horarios_ocupados_async(db, fecha, horarios):
+    """Variante asíncrona de ocupacion.horarios_ocupados"""
+    refs = [db.collection(COLECCION_OCUPACION).document(clave_bloque(fecha, hora)) for hora in horarios]
+    version_ref = db.collection(COLECCION_VERSIONES).document(VERSION_SERIES)
+    docs = await _get_all(db, refs + [version_ref])
+
+    series = await obtener_series_async(db, version_de(docs.pop(version_ref.path)))
+    ocupados = {doc.to_dict()['hora'] for doc in docs.values() if doc.exists}
+    return ocupados | (horas_de_series(series, fecha) & set(horarios))
+
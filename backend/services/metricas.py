@@ -0,0 +1,216 @@
+# Registro de métricas (contadores e histogramas de buckets fijos) en formato de texto de
+# Prometheus, expuesto en /metrics. Para no agregar contención entre los hilos de
+# gunicorn cada hilo suma en sus propios contadores, sin lock; los totales se juntan
+# solo al exportar. Las métricas que ya llevan otros módulos (cache, arranque) se leen
+# al exportar con recolectores en vez de duplicarse.
+import math
+import threading
+
+# Buckets por defecto (segundos), de 5 ms a 10 s
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+MAX_HILOS_SIN_COMPACTAR = 256
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquetas(nombres, valores, extra=()):
+    pares = list(zip(nombres, valores)) + list(extra)
+    if not pares:
+        return ''
+    texto = ','.join(f'{nombre}="{_escapar(valor)}"' for nombre, valor in pares)
+    return '{' + texto + '}'
+
+
+def _numero(valor):
+    if valor == math.inf:
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, registro, nombre, ayuda, etiquetas=()):
+        self._registro = registro
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+
+    def _valores(self, hilo):
+        """Valores de esta métrica en los contadores del hilo actual"""
+        return hilo.setdefault(self.nombre, {})
+
+
+class Contador(_Metrica):
+    """Contador que solo aumenta"""
+    tipo = 'counter'
+
+    def incrementar(self, *etiquetas, valor=1):
+        valores = self._valores(self._registro.locales())
+        valores[etiquetas] = valores.get(etiquetas, 0) + valor
+
+    def exportar(self, totales):
+        for etiquetas, valor in sorted(totales.items()):
+            yield f"{self.nombre}{_etiquetas(self.etiquetas, etiquetas)} {_numero(valor)}"
+
+    @staticmethod
+    def sumar(total, valor):
+        return (total or 0) + valor
+
+
+class Histograma(_Metrica):
+    """Histograma de buckets fijos: cuenta por bucket más suma y cantidad de observaciones"""
+    tipo = 'histogram'
+
+    def __init__(self, registro, nombre, ayuda, etiquetas=(), buckets=BUCKETS_SEGUNDOS):
+        super().__init__(registro, nombre, ayuda, etiquetas)
+        self.buckets = tuple(sorted(buckets))
+
+    def observar(self, valor, *etiquetas):
+        valores = self._valores(self._registro.locales())
+        serie = valores.get(etiquetas)
+        if serie is None:
+            # Un conteo por bucket (sin acumular), el bucket +Inf, la suma
+            serie = valores[etiquetas] = [0] * (len(self.buckets) + 2)
+        indice = next((i for i, limite in enumerate(self.buckets) if valor <= limite), len(self.buckets))
+        serie[indice] += 1
+        serie[-1] += valor
+
+    def exportar(self, totales):
+        for etiquetas, serie in sorted(totales.items()):
+            acumulado = 0
+            for limite, cantidad in zip(self.buckets + (math.inf,), serie):
+                acumulado += cantidad
+                yield (f"{self.nombre}_bucket{_etiquetas(self.etiquetas, etiquetas, [('le', _numero(limite))])} "
+                       f"{acumulado}")
+            yield f"{self.nombre}_sum{_etiquetas(self.etiquetas, etiquetas)} {_numero(serie[-1])}"
+            yield f"{self.nombre}_count{_etiquetas(self.etiquetas, etiquetas)} {acumulado}"
+
+    @staticmethod
+    def sumar(total, serie):
+        if total is None:
+            return list(serie)
+        return [a + b for a, b in zip(total, serie)]
+
+
+class RegistroMetricas:
+    """
+    Métricas de la instancia. Cada hilo escribe en su propio dict; al exportar se suman
+    todos y los de hilos terminados se pasan a los totales base.
+    """
+
+    def __init__(self):
+        self._metricas = {}
+        self._recolectores = []
+        self._local = threading.local()
+        self._hilos = []
+        self._base = {}
+        self._lock = threading.Lock()
+
+    def locales(self):
+        """Contadores del hilo actual (se crean en su primer uso)"""
+        datos = getattr(self._local, 'datos', None)
+        if datos is None:
+            datos = self._local.datos = {}
+            with self._lock:
+                # Con un hilo por request (servidor de desarrollo) la lista crece entre exportaciones
+                if len(self._hilos) >= MAX_HILOS_SIN_COMPACTAR:
+                    self._compactar()
+                self._hilos.append((threading.current_thread(), datos))
+        return datos
+
+    def _registrar(self, metrica):
+        with self._lock:
+            return self._metricas.setdefault(metrica.nombre, metrica)
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        return self._registrar(Contador(self, nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_SEGUNDOS):
+        return self._registrar(Histograma(self, nombre, ayuda, etiquetas, buckets))
+
+    def agregar_recolector(self, recolector):
+        """recolector() retorna [(nombre, tipo, ayuda, [(etiquetas_dict, valor), ...])] al exportar"""
+        self._recolectores.append(recolector)
+
+    def _copiar(self, datos):
+        # Otro hilo puede estar agregando series mientras se copia
+        while True:
+            try:
+                return {nombre: dict((etiquetas, list(valor) if isinstance(valor, list) else valor)
+                                     for etiquetas, valor in list(series.items()))
+                        for nombre, series in list(datos.items())}
+            except RuntimeError:
+                continue
+
+    def _sumar(self, totales, datos):
+        for nombre, series in datos.items():
+            metrica = self._metricas[nombre]
+            destino = totales.setdefault(nombre, {})
+            for etiquetas, valor in series.items():
+                destino[etiquetas] = metrica.sumar(destino.get(etiquetas), valor)
+
+    def _compactar(self):
+        """Pasa los contadores de hilos terminados a los totales base (con el lock tomado)"""
+        vivos = []
+        for hilo, datos in self._hilos:
+            if hilo.is_alive():
+                vivos.append((hilo, datos))
+            else:
+                self._sumar(self._base, datos)
+        self._hilos = vivos
+
+    def totales(self):
+        """{nombre: {etiquetas: valor}} sumando todos los hilos"""
+        with self._lock:
+            self._compactar()
+            totales = {}
+            self._sumar(totales, self._base)
+            for _, datos in self._hilos:
+                self._sumar(totales, self._copiar(datos))
+            return totales
+
+    def exponer(self):
+        """Texto en formato de exposición de Prometheus"""
+        totales = self.totales()
+        lineas = []
+        for nombre, metrica in sorted(self._metricas.items()):
+            lineas.append(f"# HELP {nombre} {metrica.ayuda}")
+            lineas.append(f"# TYPE {nombre} {metrica.tipo}")
+            lineas.extend(metrica.exportar(totales.get(nombre, {})))
+
+        for recolector in self._recolectores:
+            try:
+                familias = recolector()
+            except Exception as e:
+                print(f"Error en recolector de métricas: {e}")
+                continue
+            for nombre, tipo, ayuda, muestras in familias:
+                lineas.append(f"# HELP {nombre} {ayuda}")
+                lineas.append(f"# TYPE {nombre} {tipo}")
+                for etiquetas, valor in muestras:
+                    lineas.append(f"{nombre}{_etiquetas(etiquetas.keys(), etiquetas.values())} {_numero(valor)}")
+        return '\n'.join(lineas) + '\n'
+
+
+# Instancia global y métricas compartidas por los módulos
+metricas = RegistroMetricas()
+
+solicitudes_http = metricas.contador(
+    'solicitudes_http_total', 'Requests atendidos por endpoint, método y estado', ('endpoint', 'metodo', 'estado')
+)
+duracion_http = metricas.histograma(
+    'solicitud_http_duracion_segundos', 'Duración de los requests por endpoint', ('endpoint', 'metodo')
+)
+duracion_firestore = metricas.histograma(
+    'firestore_rpc_duracion_segundos', 'Duración de las llamadas a Firestore por operación', ('operacion',)
+)
+documentos_firestore = metricas.contador(
+    'firestore_documentos_total', 'Documentos devueltos por Firestore por operación', ('operacion',)
+)
+duracion_auth = metricas.histograma(
+    'auth_rest_duracion_segundos', 'Duración de las llamadas a Firebase Auth (con reintentos)', ('operacion', 'error')
+)
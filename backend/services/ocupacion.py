@@ -0,0 +1,266 @@
+# Índice de ocupación de bloques: un documento ocupacion_horarios/{fecha}_{hora} por
+# cada bloque tomado. El centro tiene un solo box, así que la clave es fecha y hora.
+# Tomar y liberar un bloque se hace en la misma transacción que crea o cierra la cita.
+# Los bloques de las series recurrentes no tienen documento: se revisan contra las series
+# activas, leyendo su versión en la misma transacción.
+from datetime import datetime
+from backend.services.calendario import (
+    registrar_cita_en_semana, quitar_cita_de_semana, registrar_citas_en_semanas, semana_ref
+)
+from backend.services.referencias import resolver_referencias, agregar_nombres, completar_nombres, CAMPOS_CITA
+from backend.services.versiones import incrementar, ejecutar_transaccion, clave_semana, lunes_de
+from backend.services.series import (
+    COLECCION_SERIES, VERSION_SERIES, version_ref, version_de, obtener_series, fechas_ocurrencias,
+    validar_serie, datos_ocurrencia, serie_en_bloque, horas_de_series, leer_id_ocurrencia, liberar_ocurrencia
+)
+
+COLECCION_OCUPACION = 'ocupacion_horarios'
+
+# Ocurrencias por batch al materializar series (2 escrituras por cita más las semanas)
+LOTE_MATERIALIZAR = 100
+
+
+class HorarioOcupadoError(Exception):
+    """El bloque ya está tomado por otra cita"""
+
+    def __init__(self, fecha, hora):
+        super().__init__(f"Ya existe una cita el {fecha} a las {hora}")
+        self.fecha = fecha
+        self.hora = hora
+
+
+class CitaNoDisponibleError(Exception):
+    """La cita no existe o no está pendiente de reprogramación"""
+
+
+def clave_bloque(fecha, hora):
+    return f"{fecha}_{hora}"
+
+
+def ocupacion_ref(db, fecha, hora):
+    return db.collection(COLECCION_OCUPACION).document(clave_bloque(fecha, hora))
+
+
+def datos_ocupacion(cita_id, cita_data):
+    return {
+        'fecha': cita_data['fecha'],
+        'hora': cita_data['hora'],
+        'cita_id': cita_id,
+        'fecha_creacion': datetime.now().isoformat()
+    }
+
+
+def _leer_bloques(lector, db, refs):
+    """Lee bloques de ocupación y la versión de series en un solo get_all. Retorna ({path: doc}, series)"""
+    serie_version_ref = version_ref(db)
+    docs = {doc.reference.path: doc for doc in lector.get_all(refs + [serie_version_ref])}
+    series = obtener_series(db, version_de(docs.pop(serie_version_ref.path)))
+    return docs, series
+
+
+def horario_ocupado(db, fecha, hora):
+    """Verifica si un bloque está tomado por una cita o una serie"""
+    return hora in horarios_ocupados(db, fecha, [hora])
+
+
+def horarios_ocupados(db, fecha, horarios):
+    """Bloques tomados de una fecha (citas y series), con un solo get_all"""
+    refs = [ocupacion_ref(db, fecha, hora) for hora in horarios]
+    docs, series = _leer_bloques(db, db, refs)
+    ocupados = {doc.to_dict()['hora'] for doc in docs.values() if doc.exists}
+    return ocupados | (horas_de_series(series, fecha) & set(horarios))
+
+
+def crear_cita(db, cita_data):
+    """
+    Crea una cita tomando su bloque en una sola transacción. Lanza HorarioOcupadoError.
+    La cita guarda los nombres de paciente, servicio y profesional (se agregan a cita_data).
+    """
+    completar_nombres(db, cita_data)
+    cita_ref = db.collection('citas').document()
+    bloque_ref = ocupacion_ref(db, cita_data['fecha'], cita_data['hora'])
+
+    def _crear(transaction):
+        docs, series = _leer_bloques(transaction, db, [bloque_ref])
+        if docs[bloque_ref.path].exists or serie_en_bloque(series, cita_data['fecha'], cita_data['hora']):
+            raise HorarioOcupadoError(cita_data['fecha'], cita_data['hora'])
+
+        transaction.set(cita_ref, cita_data)
+        transaction.set(bloque_ref, datos_ocupacion(cita_ref.id, cita_data))
+        registrar_cita_en_semana(db, cita_ref.id, cita_data, transaction)
+
+    ejecutar_transaccion(db, _crear)
+    return cita_ref
+
+
+def reprogramar_cita(db, cita_id, nueva_fecha, nueva_hora, armar_nueva_cita, cambios_original):
+    """
+    Crea la nueva cita y cierra la original en una sola transacción.
+    armar_nueva_cita(datos_original) retorna los datos de la nueva cita.
+    Lanza CitaNoDisponibleError o HorarioOcupadoError.
+    """
+    cita_ref = db.collection('citas').document(cita_id)
+    nueva_ref = db.collection('citas').document()
+    bloque_ref = ocupacion_ref(db, nueva_fecha, nueva_hora)
+
+    def _reprogramar(transaction):
+        # Cita original, bloque nuevo y versión de series en una sola lectura
+        docs, series = _leer_bloques(transaction, db, [cita_ref, bloque_ref])
+        cita_doc = docs[cita_ref.path]
+
+        if not cita_doc.exists or cita_doc.to_dict().get('estado') != 'pendiente_reprogramacion':
+            raise CitaNoDisponibleError('Esta cita no está pendiente de reprogramación')
+        if docs[bloque_ref.path].exists or serie_en_bloque(series, nueva_fecha, nueva_hora):
+            raise HorarioOcupadoError(nueva_fecha, nueva_hora)
+
+        nueva_cita_data = completar_nombres(db, armar_nueva_cita(cita_doc.to_dict()))
+        transaction.set(nueva_ref, nueva_cita_data)
+        transaction.set(bloque_ref, datos_ocupacion(nueva_ref.id, nueva_cita_data))
+        registrar_cita_en_semana(db, nueva_ref.id, nueva_cita_data, transaction)
+        transaction.update(cita_ref, cambios_original)
+        # La original no está en el calendario, pero sí en las consultas de citas de su semana
+        incrementar(db, [clave_semana(lunes_de(cita_doc.to_dict()['fecha']))], transaction)
+
+    ejecutar_transaccion(db, _reprogramar)
+    return nueva_ref
+
+
+def liberar_cita(db, cita_id, cambios=None, eliminar=False):
+    """
+    Marca (cambios) o elimina una cita liberando su bloque en la misma transacción.
+    Retorna los datos de la cita, o None si no existe.
+    """
+    # Ocurrencia de una serie: queda como excepción de la serie
+    ocurrencia = leer_id_ocurrencia(cita_id)
+    if ocurrencia:
+        return liberar_ocurrencia(db, *ocurrencia, cambios=cambios, eliminar=eliminar)
+
+    cita_ref = db.collection('citas').document(cita_id)
+
+    def _liberar(transaction):
+        cita_doc = cita_ref.get(transaction=transaction)
+        if not cita_doc.exists:
+            return None
+
+        cita_data = cita_doc.to_dict()
+        bloque_ref = ocupacion_ref(db, cita_data['fecha'], cita_data['hora'])
+        cita_semana_ref = semana_ref(db, cita_data['fecha'])
+        docs = {doc.reference.path: doc for doc in transaction.get_all([bloque_ref, cita_semana_ref])}
+        bloque_doc = docs[bloque_ref.path]
+
+        if eliminar:
+            transaction.delete(cita_ref)
+        else:
+            transaction.update(cita_ref, cambios)
+
+        # Solo liberar el bloque si pertenece a esta cita
+        if bloque_doc.exists and bloque_doc.to_dict().get('cita_id') == cita_id:
+            transaction.delete(bloque_ref)
+        quitar_cita_de_semana(db, cita_id, cita_data, docs[cita_semana_ref.path], transaction)
+
+        return cita_data
+
+    return ejecutar_transaccion(db, _liberar)
+
+
+def reconstruir_ocupacion(db, fecha_inicio, fecha_fin):
+    """Recalcula los documentos de ocupación de un rango a partir de las citas programadas"""
+    ocupacion = {}
+    citas = db.collection('citas')\
+              .where('fecha', '>=', fecha_inicio)\
+              .where('fecha', '<=', fecha_fin)\
+              .stream()
+    for doc in citas:
+        cita_data = doc.to_dict()
+        if cita_data.get('estado') == 'programada':
+            ocupacion[clave_bloque(cita_data['fecha'], cita_data['hora'])] = (doc.id, cita_data)
+
+    # Quitar bloques que ya no corresponden a una cita programada
+    existentes = db.collection(COLECCION_OCUPACION)\
+                   .where('fecha', '>=', fecha_inicio)\
+                   .where('fecha', '<=', fecha_fin)\
+                   .stream()
+    operaciones = [('delete', doc.reference, None) for doc in existentes if doc.id not in ocupacion]
+
+    for clave, (cita_id, cita_data) in ocupacion.items():
+        operaciones.append(('set', db.collection(COLECCION_OCUPACION).document(clave), datos_ocupacion(cita_id, cita_data)))
+
+    # Firestore admite hasta 500 escrituras por batch
+    for inicio in range(0, len(operaciones), 500):
+        batch = db.batch()
+        for tipo, ref, datos in operaciones[inicio:inicio + 500]:
+            if tipo == 'delete':
+                batch.delete(ref)
+            else:
+                batch.set(ref, datos)
+        batch.commit()
+
+    return len(ocupacion)
+
+
+def crear_serie(db, serie_data):
+    """
+    Crea una serie si ninguna de sus ocurrencias choca con una cita u otra serie,
+    en una sola transacción. Lanza HorarioOcupadoError con el primer bloque tomado
+    y ValueError si la regla no es válida (ver series.validar_serie).
+    """
+    serie_data['cada_semanas'] = validar_serie(serie_data['fecha_inicio'], serie_data['fecha_fin'],
+                                               serie_data.get('cada_semanas', 1))
+    completar_nombres(db, serie_data)
+    serie_ref = db.collection(COLECCION_SERIES).document()
+    fechas = fechas_ocurrencias(serie_data, serie_data['fecha_inicio'], serie_data['fecha_fin'])
+    hora = serie_data['hora']
+    refs = [ocupacion_ref(db, fecha, hora) for fecha in fechas]
+
+    def _crear(transaction):
+        docs, series = _leer_bloques(transaction, db, refs)
+        for fecha, ref in zip(fechas, refs):
+            if docs[ref.path].exists or serie_en_bloque(series, fecha, hora):
+                raise HorarioOcupadoError(fecha, hora)
+
+        transaction.set(serie_ref, serie_data)
+        incrementar(db, [VERSION_SERIES], transaction)
+
+    ejecutar_transaccion(db, _crear)
+    return serie_ref
+
+
+def materializar_series(db, hasta):
+    """
+    Guarda como citas las ocurrencias de las series hasta una fecha (incluida), con su
+    bloque de ocupación, y avanza materializada_hasta. Retorna la cantidad de citas creadas.
+    """
+    total = 0
+    for serie in obtener_series(db):
+        fechas = fechas_ocurrencias(serie, serie['fecha_inicio'], hasta)
+        serie_ref = db.collection(COLECCION_SERIES).document(serie['id'])
+        referencias = resolver_referencias(db, [serie], CAMPOS_CITA, usar_cache=False)
+
+        for inicio in range(0, len(fechas), LOTE_MATERIALIZAR):
+            lote = fechas[inicio:inicio + LOTE_MATERIALIZAR]
+            batch = db.batch()
+            citas = []
+            for fecha in lote:
+                cita_data = agregar_nombres(datos_ocurrencia(serie, fecha), referencias)
+                cita_ref = db.collection('citas').document()
+                batch.set(cita_ref, cita_data)
+                batch.set(ocupacion_ref(db, fecha, serie['hora']), datos_ocupacion(cita_ref.id, cita_data))
+                citas.append((cita_ref.id, cita_data))
+            registrar_citas_en_semanas(db, citas, referencias, batch)
+
+            cambios = {'materializada_hasta': lote[-1]}
+            if not fechas_ocurrencias(dict(serie, **cambios), lote[-1], serie['fecha_fin']):
+                cambios['estado'] = 'terminada'
+            batch.update(serie_ref, cambios)
+            incrementar(db, [VERSION_SERIES], batch)
+            batch.commit()
+            total += len(lote)
+
+        # Series vencidas sin ocurrencias pendientes
+        if not fechas and serie['fecha_fin'] <= hasta:
+            batch = db.batch()
+            batch.update(serie_ref, {'estado': 'terminada'})
+            incrementar(db, [VERSION_SERIES], batch)
+            batch.commit()
+
+    return total
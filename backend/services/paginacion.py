@@ -0,0 +1,127 @@
+# Paginación por cursor sobre consultas de Firestore.
+# El cursor es opaco para el cliente: guarda los valores de orden del último
+# documento de la página (y su ID) y se aplica con start_after.
+import json
+import heapq
+import base64
+from backend.config.dependencias import field_path
+
+LIMITE_POR_DEFECTO = 50
+LIMITE_MAXIMO = 500
+
+
+def codificar_cursor(valores):
+    """Convierte los valores de orden en un cursor opaco"""
+    datos = json.dumps(valores, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(datos).decode('ascii')
+
+
+def decodificar_cursor(cursor):
+    """Recupera los valores de orden de un cursor. Lanza ValueError si es inválido"""
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError('Cursor inválido')
+    if not isinstance(valores, dict):
+        raise ValueError('Cursor inválido')
+    return valores
+
+
+def leer_limite(valor, defecto=LIMITE_POR_DEFECTO, maximo=LIMITE_MAXIMO):
+    """Valida el parámetro limit. Lanza ValueError si no es un entero positivo"""
+    if valor in (None, ''):
+        return defecto
+    try:
+        limite = int(valor)
+    except (TypeError, ValueError):
+        raise ValueError('limit debe ser un número entero')
+    if limite < 1:
+        raise ValueError('limit debe ser mayor que 0')
+    return min(limite, maximo)
+
+
+def ordenar(query, orden):
+    """Aplica el orden [(campo, dirección), ...] más el ID del documento como desempate"""
+    for campo, direccion in orden:
+        query = query.order_by(campo, direction=direccion)
+    return query.order_by(field_path().document_id(), direction=orden[-1][1])
+
+
+class DocumentoCalculado:
+    """Registro que no está guardado (p. ej. una ocurrencia de serie) con la interfaz de un documento leído"""
+
+    exists = True
+
+    def __init__(self, datos):
+        self.id = datos['id']
+        self._datos = {campo: valor for campo, valor in datos.items() if campo != 'id'}
+
+    def to_dict(self):
+        return dict(self._datos)
+
+
+def clave_orden(doc, orden):
+    """Valores de orden de un documento, con su ID como desempate"""
+    datos = doc.to_dict()
+    return tuple(datos.get(campo) for campo, _ in orden) + (doc.id,)
+
+
+def calculados_despues(calculados, orden, cursor=None):
+    """
+    Documentos calculados en el orden de la consulta y posteriores al cursor.
+    Todas las direcciones de orden deben ser iguales (la del último campo)
+    """
+    descendente = orden[-1][1] == 'DESCENDING'
+    calculados = sorted(calculados, key=lambda doc: clave_orden(doc, orden), reverse=descendente)
+    if cursor:
+        valores = decodificar_cursor(cursor)
+        desde = tuple(valores.get(campo) for campo, _ in orden) + (valores.get(field_path().document_id()),)
+        calculados = [doc for doc in calculados
+                      if (clave_orden(doc, orden) < desde if descendente else clave_orden(doc, orden) > desde)]
+    return calculados
+
+
+def mezclar(docs, calculados, orden):
+    """Documentos de la consulta y calculados (ambos ya ordenados) en un solo recorrido ordenado"""
+    if not calculados:
+        return iter(docs)
+    return heapq.merge(docs, calculados, key=lambda doc: clave_orden(doc, orden),
+                       reverse=orden[-1][1] == 'DESCENDING')
+
+
+class PaginaEnStream:
+    """
+    Página de una consulta que se recorre a medida que llegan los documentos de stream().
+    calculados son documentos que no están en Firestore y se intercalan en el mismo orden
+    (ver DocumentoCalculado). next_cursor queda disponible después de recorrerla
+    (None en la última página).
+    """
+
+    def __init__(self, query, orden, limite, cursor=None, calculados=()):
+        query = ordenar(query, orden)
+        if cursor:
+            query = query.start_after(decodificar_cursor(cursor))
+
+        # Se pide un documento extra para saber si hay otra página
+        self._query = query.limit(limite + 1)
+        self._calculados = calculados_despues(calculados, orden, cursor)
+        self.orden = orden
+        self.limite = limite
+        self.next_cursor = None
+
+    def __iter__(self):
+        ultimo = None
+        for indice, doc in enumerate(mezclar(self._query.stream(), self._calculados, self.orden)):
+            if indice == self.limite:
+                self.next_cursor = cursor_de(ultimo, self.orden)
+                break
+            ultimo = doc
+            yield doc
+
+
+def cursor_de(doc, orden):
+    """Cursor que apunta después de un documento"""
+    datos = doc.to_dict()
+    valores = {campo: datos.get(campo) for campo, _ in orden}
+    valores[field_path().document_id()] = doc.id
+    return codificar_cursor(valores)
@@ -0,0 +1,117 @@
+# Resolución en lote de referencias entre colecciones (paciente, servicio, profesional...)
+# Junta los IDs distintos por colección y los trae con un solo get_all por colección,
+# evitando una lectura de Firestore por cada fila.
+from backend.services.cache import (
+    COLECCIONES_CACHEADAS, obtener_documentos_cacheados, guardar_documento
+)
+
+
+def obtener_documentos(db, coleccion, ids, usar_cache=True):
+    """
+    Obtiene varios documentos de una colección en una sola llamada. Retorna {id: datos}.
+    Con usar_cache=False se leen de Firestore (y se actualiza el cache).
+    """
+    ids_unicos = {doc_id for doc_id in ids if doc_id}
+    if not ids_unicos:
+        return {}
+
+    documentos = {}
+    cacheable = coleccion in COLECCIONES_CACHEADAS
+    if cacheable and usar_cache:
+        documentos, ids_unicos = obtener_documentos_cacheados(coleccion, ids_unicos)
+        if not ids_unicos:
+            return documentos
+
+    refs = [db.collection(coleccion).document(doc_id) for doc_id in ids_unicos]
+
+    for doc in db.get_all(refs):
+        if doc.exists:
+            documentos[doc.id] = doc.to_dict()
+            if cacheable:
+                guardar_documento(coleccion, doc.id, documentos[doc.id])
+
+    return documentos
+
+
+def resolver_referencias(db, registros, campos, usar_cache=True):
+    """
+    Resuelve las referencias de una lista de registros.
+    campos: {'paciente_id': 'pacientes', ...} -> retorna {'pacientes': {id: datos}, ...}
+    """
+    ids_por_coleccion = {}
+    for campo, coleccion in campos.items():
+        ids = ids_por_coleccion.setdefault(coleccion, set())
+        for registro in registros:
+            if registro.get(campo):
+                ids.add(registro[campo])
+
+    return {
+        coleccion: obtener_documentos(db, coleccion, ids, usar_cache)
+        for coleccion, ids in ids_por_coleccion.items()
+    }
+
+
+def nombre_referencia(documentos, doc_id, campo, defecto):
+    """Obtiene un campo de un documento ya resuelto, con valor por defecto si no existe"""
+    datos = documentos.get(doc_id)
+    if not datos:
+        return defecto
+    return datos.get(campo, defecto)
+
+
+# Campos de referencia de una cita
+CAMPOS_CITA = {
+    'paciente_id': 'pacientes',
+    'servicio_id': 'servicios',
+    'profesional_id': 'usuarios_sistema'
+}
+
+
+# Nombres que la cita guarda al crearse: campo de referencia -> (colección, campo del nombre, campo en la cita).
+# Los lectores los toman de la cita; solo las citas anteriores a este cambio resuelven referencias
+NOMBRES_CITA = {
+    'paciente_id': ('pacientes', 'nombre_paciente', 'paciente_nombre'),
+    'servicio_id': ('servicios', 'nombre', 'servicio_nombre'),
+    'profesional_id': ('usuarios_sistema', 'nombre', 'profesional_nombre')
+}
+
+
+def sin_nombres(citas):
+    """Citas a las que les falta algún nombre desnormalizado"""
+    return [cita_data for cita_data in citas
+            if not all(cita_data.get(destino) for _, _, destino in NOMBRES_CITA.values())]
+
+
+def agregar_nombres(cita_data, referencias):
+    """Copia en la cita los nombres de paciente, servicio y profesional ya resueltos"""
+    for campo_id, (coleccion, campo, destino) in NOMBRES_CITA.items():
+        datos = referencias.get(coleccion, {}).get(cita_data.get(campo_id))
+        if datos and datos.get(campo):
+            cita_data[destino] = datos[campo]
+    return cita_data
+
+
+def completar_nombres(db, cita_data):
+    """
+    Agrega a una cita los nombres que le faltan, leídos de Firestore en un solo get_all.
+    No se usa el cache: un nombre cambiado en otra instancia quedaría guardado en la cita.
+    """
+    refs = [db.collection(coleccion).document(cita_data[campo_id])
+            for campo_id, (coleccion, _, destino) in NOMBRES_CITA.items()
+            if cita_data.get(campo_id) and not cita_data.get(destino)]
+    if not refs:
+        return cita_data
+
+    referencias = {}
+    for doc in db.get_all(refs):
+        if doc.exists:
+            referencias.setdefault(doc.reference.parent.id, {})[doc.id] = doc.to_dict()
+    return agregar_nombres(cita_data, referencias)
+
+
+def nombre_cita(cita_data, referencias, campo_id, defecto):
+    """Nombre guardado en la cita, o tomado de las referencias resueltas si la cita no lo tiene"""
+    coleccion, campo, destino = NOMBRES_CITA[campo_id]
+    if cita_data.get(destino):
+        return cita_data[destino]
+    return nombre_referencia(referencias.get(coleccion, {}), cita_data.get(campo_id), campo, defecto)
@@ -0,0 +1,51 @@
+# Rol del usuario: se resuelve una vez al iniciar sesión y viaja en la sesión firmada.
+# Cuando expira se vuelve a consultar en el mismo request (una consulta), así un cambio de
+# rol se aplica en cualquier instancia a más tardar en ROL_TTL_SEGUNDOS. Dentro de cada
+# request se memoriza en flask.g.
+import os
+import time
+from flask import session, g
+from backend.config.firebase_config import firebase_config
+
+# Segundos que el rol guardado en la sesión se considera vigente
+ROL_TTL_SEGUNDOS = int(os.getenv('ROL_TTL_SEGUNDOS', '900'))
+
+
+def consultar_rol(uid):
+    """
+    Consulta en Firestore el rol de un usuario por su UID de Firebase.
+    Los errores de Firestore se propagan: no se asume un rol que el usuario quizás no tiene.
+    """
+    db = firebase_config.get_db()
+    usuarios = db.collection('usuarios_sistema').where('uid', '==', uid).limit(1).stream()
+
+    for doc in usuarios:
+        return doc.to_dict().get('rol', 'profesional')  # Default profesional
+
+    return 'profesional'
+
+
+def guardar_rol_en_sesion(rol):
+    """Guarda el rol en la sesión con su fecha de expiración"""
+    session['user_role'] = rol
+    session['user_role_expira'] = time.time() + ROL_TTL_SEGUNDOS
+    g.user_role = rol
+
+
+def obtener_rol_usuario():
+    """Obtiene el rol del usuario actual"""
+    if 'user_id' not in session:
+        return None
+
+    if 'user_role' in g:
+        return g.user_role
+
+    rol = session.get('user_role')
+
+    # Sesión sin rol (iniciada antes de guardar el rol en la sesión) o rol vencido
+    if not rol or session.get('user_role_expira', 0) < time.time():
+        guardar_rol_en_sesion(consultar_rol(session['user_id']))
+        return g.user_role
+
+    g.user_role = rol
+    return rol
@@ -0,0 +1,208 @@
+# Series de citas recurrentes: un documento series_citas/{id} por serie, con la regla
+# (día de la semana de fecha_inicio y hora, cada N semanas), la fecha de término y las
+# excepciones. Las ocurrencias no se guardan: se expanden al vuelo para el rango pedido
+# (calendario y /api/citas).
+# Solo se persisten las excepciones (como citas normales con serie_id) y las ocurrencias
+# ya pasadas, que se materializan con el comando materializar-series.
+from datetime import datetime, timedelta
+from backend.config.dependencias import firestore
+from backend.services.cache import cache_referencias
+from backend.services.versiones import COLECCION_VERSIONES, incrementar, ejecutar_transaccion, clave_semana, lunes_de
+
+COLECCION_SERIES = 'series_citas'
+
+# Clave de versiones_datos que cambia con cada escritura de series
+VERSION_SERIES = 'series'
+
+# Frecuencias que ofrece el formulario (cada N semanas)
+FRECUENCIAS_SEMANAS = [1, 2, 4]
+
+# Duración máxima de una serie: crear_serie lee todos sus bloques en una sola transacción
+MAX_SEMANAS_SERIE = 52
+
+# Campos que la serie copia en cada ocurrencia
+CAMPOS_OCURRENCIA = ['hora', 'paciente_id', 'servicio_id', 'profesional_id', 'observaciones',
+                     'paciente_nombre', 'servicio_nombre', 'profesional_nombre']
+
+
+def _fecha(valor):
+    return datetime.strptime(valor, '%Y-%m-%d').date()
+
+
+def id_ocurrencia(serie_id, fecha):
+    """ID virtual de una ocurrencia (serie:<id>:<fecha>), usado por el calendario y las rutas de citas"""
+    return f"serie:{serie_id}:{fecha}"
+
+
+def leer_id_ocurrencia(cita_id):
+    """Retorna (serie_id, fecha) si cita_id es el ID de una ocurrencia, o None"""
+    partes = cita_id.split(':')
+    if len(partes) != 3 or partes[0] != 'serie':
+        return None
+    return partes[1], partes[2]
+
+
+def validar_serie(fecha_inicio, fecha_fin, cada_semanas):
+    """
+    Valida la regla de una serie nueva. Retorna cada_semanas como entero;
+    lanza ValueError si la frecuencia no es una de FRECUENCIAS_SEMANAS o la serie es muy larga
+    """
+    try:
+        cada_semanas = int(cada_semanas)
+    except (TypeError, ValueError):
+        cada_semanas = None
+    if cada_semanas not in FRECUENCIAS_SEMANAS:
+        raise ValueError('Frecuencia inválida: cada 1, 2 o 4 semanas')
+    try:
+        inicio, fin = _fecha(fecha_inicio), _fecha(fecha_fin)
+    except (TypeError, ValueError):
+        raise ValueError('Fecha inválida (formato YYYY-MM-DD)')
+    if fin > inicio + timedelta(weeks=MAX_SEMANAS_SERIE):
+        raise ValueError(f'Una serie puede durar como máximo {MAX_SEMANAS_SERIE} semanas')
+    return cada_semanas
+
+
+def version_ref(db):
+    return db.collection(COLECCION_VERSIONES).document(VERSION_SERIES)
+
+
+def version_de(doc):
+    """Versión de series a partir del documento leído"""
+    return doc.to_dict().get('version', 0) if doc.exists else 0
+
+
+def obtener_series(db, version=None):
+    """
+    Series activas. El cache se indexa por la versión de series, así los cambios hechos
+    en otra instancia se ven de inmediato; sin version se lee (un documento pequeño).
+    """
+    if version is None:
+        version = version_de(version_ref(db).get())
+
+    clave = ('lista', COLECCION_SERIES, version)
+    encontrado, series = cache_referencias.obtener(clave)
+    if not encontrado:
+        series = []
+        for doc in db.collection(COLECCION_SERIES).where('estado', '==', 'activa').stream():
+            serie = doc.to_dict()
+            serie['id'] = doc.id
+            series.append(serie)
+        cache_referencias.guardar(clave, series)
+    return series
+
+
+def fechas_ocurrencias(serie, desde, hasta):
+    """Fechas (YYYY-MM-DD) en que ocurre la serie dentro de [desde, hasta]"""
+    inicio = _fecha(serie['fecha_inicio'])
+    fin = min(_fecha(hasta), _fecha(serie['fecha_fin']))
+    desde = _fecha(desde)
+    if serie.get('materializada_hasta'):
+        desde = max(desde, _fecha(serie['materializada_hasta']) + timedelta(days=1))
+
+    paso = 7 * serie.get('cada_semanas', 1)
+    if paso <= 0:
+        raise ValueError('cada_semanas debe ser mayor que 0')
+    fecha = inicio
+    if desde > inicio:
+        # Primera ocurrencia que no es anterior a desde
+        fecha = inicio + timedelta(days=-(-(desde - inicio).days // paso) * paso)
+
+    excepciones = set(serie.get('excepciones', []))
+    fechas = []
+    while fecha <= fin:
+        fecha_str = fecha.strftime('%Y-%m-%d')
+        if fecha_str not in excepciones:
+            fechas.append(fecha_str)
+        fecha += timedelta(days=paso)
+    return fechas
+
+
+def ocurre_en(serie, fecha):
+    return fechas_ocurrencias(serie, fecha, fecha) == [fecha]
+
+
+def datos_ocurrencia(serie, fecha):
+    """Datos de cita de una ocurrencia"""
+    cita_data = {campo: serie.get(campo, '') for campo in CAMPOS_OCURRENCIA}
+    cita_data.update({
+        'fecha': fecha,
+        'estado': 'programada',
+        'serie_id': serie['id'],
+        'fecha_creacion': serie.get('fecha_creacion')
+    })
+    if serie.get('creado_por'):
+        cita_data['creado_por'] = serie['creado_por']
+    return cita_data
+
+
+def ocurrencias(series, desde, hasta):
+    """Citas virtuales (con 'id') de todas las series dentro de un rango"""
+    citas = []
+    for serie in series:
+        for fecha in fechas_ocurrencias(serie, desde, hasta):
+            cita_data = datos_ocurrencia(serie, fecha)
+            cita_data['id'] = id_ocurrencia(serie['id'], fecha)
+            citas.append(cita_data)
+    return citas
+
+
+def serie_en_bloque(series, fecha, hora):
+    """Serie que ocupa un bloque, o None"""
+    return next((serie for serie in series if serie['hora'] == hora and ocurre_en(serie, fecha)), None)
+
+
+def horas_de_series(series, fecha):
+    """Horas tomadas por series en una fecha"""
+    return {serie['hora'] for serie in series if ocurre_en(serie, fecha)}
+
+
+def liberar_ocurrencia(db, serie_id, fecha, cambios=None, eliminar=False):
+    """
+    Saca una ocurrencia de la serie (excepción). Si no se elimina, la ocurrencia se
+    guarda como cita con los cambios (por ejemplo pendiente_reprogramacion).
+    Retorna los datos de la cita, o None si la ocurrencia no existe.
+    """
+    serie_ref = db.collection(COLECCION_SERIES).document(serie_id)
+    cita_ref = db.collection('citas').document()
+
+    def _liberar(transaction):
+        serie_doc = serie_ref.get(transaction=transaction)
+        if not serie_doc.exists:
+            return None
+
+        serie = serie_doc.to_dict()
+        serie['id'] = serie_id
+        if serie.get('estado') != 'activa' or not ocurre_en(serie, fecha):
+            return None
+
+        cita_data = datos_ocurrencia(serie, fecha)
+        transaction.update(serie_ref, {'excepciones': firestore().ArrayUnion([fecha])})
+        claves = [VERSION_SERIES]
+        if not eliminar:
+            cita_data.update(cambios or {})
+            transaction.set(cita_ref, cita_data)
+            claves.append(clave_semana(lunes_de(fecha)))
+        incrementar(db, claves, transaction)
+        return cita_data
+
+    return ejecutar_transaccion(db, _liberar)
+
+
+def terminar_serie(db, serie_id, desde):
+    """Termina una serie a partir de una fecha (esa ocurrencia y las siguientes dejan de existir)"""
+    serie_ref = db.collection(COLECCION_SERIES).document(serie_id)
+    serie_doc = serie_ref.get()
+    if not serie_doc.exists:
+        return False
+
+    serie = serie_doc.to_dict()
+    fecha_fin = (_fecha(desde) - timedelta(days=1)).strftime('%Y-%m-%d')
+    cambios = {'fecha_fin': min(fecha_fin, serie['fecha_fin'])}
+    if cambios['fecha_fin'] < serie['fecha_inicio'] or cambios['fecha_fin'] <= (serie.get('materializada_hasta') or ''):
+        cambios['estado'] = 'terminada'
+
+    batch = db.batch()
+    batch.update(serie_ref, cambios)
+    incrementar(db, [VERSION_SERIES], batch)
+    batch.commit()
+    return True
@@ -0,0 +1,74 @@
+# Respuestas JSON en streaming para los listados de la API.
+# Los registros se serializan a medida que se recorren (por ejemplo desde stream() de
+# Firestore), sin armar la lista completa ni el JSON completo en memoria.
+# Formatos: JSON {"<clave>": [...], ...} por defecto, o NDJSON con Accept: application/x-ndjson
+from flask import Response, request, current_app, stream_with_context
+
+MIMETYPE_NDJSON = 'application/x-ndjson'
+
+# Tamaño aproximado de cada bloque enviado al socket
+TAMANO_BLOQUE = 16 * 1024
+
+_FIN = object()
+
+
+def prefiere_ndjson():
+    return MIMETYPE_NDJSON in request.headers.get('Accept', '')
+
+
+def _en_bloques(partes):
+    """Agrupa fragmentos pequeños en bloques de ~TAMANO_BLOQUE"""
+    buffer = []
+    tamano = 0
+    for parte in partes:
+        buffer.append(parte)
+        tamano += len(parte)
+        if tamano >= TAMANO_BLOQUE:
+            yield ''.join(buffer)
+            buffer = []
+            tamano = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def respuesta_lista(clave, registros, final=None):
+    """
+    Respuesta en streaming para una lista de dicts.
+    final: función que retorna campos adicionales (ej. next_cursor); se evalúa al terminar la lista.
+    En NDJSON cada registro va en una línea y la última línea lleva los campos finales y "status".
+    """
+    dumps = current_app.json.dumps
+    registros = iter(registros)
+
+    # Leer el primer registro antes de responder, así los errores de la consulta
+    # todavía pueden devolverse como un error normal
+    primero = next(registros, _FIN)
+
+    def todos():
+        if primero is not _FIN:
+            yield primero
+            yield from registros
+
+    def campos_finales():
+        campos = dict(final()) if final else {}
+        campos['status'] = 'success'
+        return campos
+
+    if prefiere_ndjson():
+        def generar():
+            for registro in todos():
+                yield dumps(registro) + '\n'
+            yield dumps(campos_finales()) + '\n'
+
+        mimetype = MIMETYPE_NDJSON
+    else:
+        def generar():
+            yield '{' + dumps(clave) + ':['
+            for indice, registro in enumerate(todos()):
+                yield (',' if indice else '') + dumps(registro)
+            # Campos finales en el mismo objeto: '],"next_cursor":...,"status":"success"}'
+            yield '],' + dumps(campos_finales())[1:]
+
+        mimetype = 'application/json'
+
+    return Response(stream_with_context(_en_bloques(generar())), mimetype=mimetype)
@@ -0,0 +1,137 @@
+# Versiones de datos para GET condicionales (ETag / If-None-Match).
+# Cada colección de referencia (pacientes, servicios) y cada semana de citas tiene un
+# contador en versiones_datos/{clave} que se incrementa en las mismas escrituras que
+# cambian sus datos. Las citas se versionan solo por semana: un contador global recibiría
+# todas las escrituras de citas (Firestore admite ~1 escritura/s por documento).
+# Comparar el ETag cuesta una lectura pequeña antes de cualquier consulta.
+import os
+import hashlib
+from datetime import datetime, timedelta
+from flask import request, session, make_response, Response
+from backend.config.dependencias import firestore
+from backend.services.consumo_firestore import sin_medir
+
+COLECCION_VERSIONES = 'versiones_datos'
+
+# Cambia con cada despliegue, así los ETag no sobreviven a cambios de templates
+VERSION_APLICACION = os.getenv('VERCEL_GIT_COMMIT_SHA', 'local')
+
+
+# Semanas como máximo que cubre el ETag de una consulta de citas por rango de fechas
+MAX_SEMANAS_ETAG = 12
+
+
+def lunes_de(fecha):
+    """Retorna el lunes (YYYY-MM-DD) de la semana de una fecha YYYY-MM-DD"""
+    dia = datetime.strptime(fecha, '%Y-%m-%d')
+    return (dia - timedelta(days=dia.weekday())).strftime('%Y-%m-%d')
+
+
+def clave_semana(lunes):
+    return f"semana_{lunes}"
+
+
+def claves_semanas(desde, hasta):
+    """
+    Claves de versión de las semanas entre dos fechas, o None si el rango no está acotado
+    o pasa de MAX_SEMANAS_ETAG (esa consulta se responde sin ETag)
+    """
+    if not desde or not hasta or hasta < desde:
+        return None
+    lunes = datetime.strptime(lunes_de(desde), '%Y-%m-%d')
+    ultimo = datetime.strptime(lunes_de(hasta), '%Y-%m-%d')
+    if (ultimo - lunes).days // 7 + 1 > MAX_SEMANAS_ETAG:
+        return None
+    return [clave_semana((lunes + timedelta(weeks=i)).strftime('%Y-%m-%d'))
+            for i in range((ultimo - lunes).days // 7 + 1)]
+
+
+def incrementar(db, claves, escritor=None):
+    """Incrementa las versiones indicadas, directo o dentro de un batch/transacción"""
+    propio = escritor is None
+    if propio:
+        escritor = db.batch()
+
+    for clave in claves:
+        escritor.set(db.collection(COLECCION_VERSIONES).document(clave), {
+            'version': firestore().Increment(1),
+            'fecha_modificacion': datetime.now().isoformat()
+        }, merge=True)
+
+    if propio:
+        escritor.commit()
+
+
+def ejecutar_transaccion(db, funcion):
+    """Ejecuta funcion(transaction) dentro de una transacción de Firestore (con reintentos)"""
+    transaction = db.transaction()
+    # La función recibe la transacción medida; la API de Firestore, la original
+    original = sin_medir(transaction)
+    if hasattr(original, 'ejecutar'):
+        # Cliente en memoria (backend.config.firestore_memoria)
+        return original.ejecutar(lambda _: funcion(transaction))
+    return firestore().transactional(lambda _: funcion(transaction))(original)
+
+
+def obtener_versiones(db, claves):
+    """Versiones actuales de varias claves, con un solo get_all"""
+    refs = [db.collection(COLECCION_VERSIONES).document(clave) for clave in claves]
+    versiones = {clave: 0 for clave in claves}
+    for doc in db.get_all(refs):
+        if doc.exists:
+            versiones[doc.id] = doc.to_dict().get('version', 0)
+    return versiones
+
+
+def etag_de(versiones, claves, extra=()):
+    """ETag a partir de versiones ya leídas y de otros valores que cambian la respuesta"""
+    partes = [VERSION_APLICACION]
+    partes += [f"{clave}={versiones[clave]}" for clave in sorted(claves)]
+    partes += [str(valor) for valor in extra]
+    return hashlib.sha1('|'.join(partes).encode('utf-8')).hexdigest()
+
+
+def cliente_actualizado(etag):
+    """El cliente ya tiene esta versión (con mensajes flash pendientes la página no es la misma)"""
+    return etag in request.if_none_match and not session.get('_flashes')
+
+
+def no_modificado(etag):
+    respuesta = Response(status=304)
+    respuesta.set_etag(etag)
+    return respuesta
+
+
+def con_etag(respuesta, etag):
+    """Agrega el ETag a una respuesta exitosa"""
+    respuesta = make_response(respuesta)
+    if respuesta.status_code == 200:
+        respuesta.set_etag(etag)
+        respuesta.headers['Cache-Control'] = 'private, no-cache'
+    return respuesta
+
+
+def respuesta_condicional(db, claves, generar, extra=(), con_versiones=False):
+    """
+    Responde 304 si el cliente ya tiene la versión actual; si no, llama a generar()
+    y agrega el ETag. Las versiones se leen antes que los datos, así un ETag nunca
+    queda asociado a datos más antiguos que su versión. Con claves=None se responde sin ETag.
+    Con con_versiones se llama generar(versiones) con las versiones ya leídas ({} si no se leyeron).
+    """
+    def _generar(versiones):
+        return generar(versiones) if con_versiones else generar()
+
+    if claves is None:
+        return _generar({})
+
+    try:
+        versiones = obtener_versiones(db, claves)
+        etag = etag_de(versiones, claves, extra)
+    except Exception as e:
+        print(f"Error calculando ETag: {e}")
+        return _generar({})
+
+    if cliente_actualizado(etag):
+        return no_modificado(etag)
+
+    return con_etag(_generar(versiones), etag)
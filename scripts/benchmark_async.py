@@ -0,0 +1,112 @@
+"""
+Compara el camino síncrono (hilos) con el asíncrono (AsyncClient) bajo carga concurrente.
+
+Uso:
+    python scripts/benchmark_async.py --fecha 2025-06-02 --concurrencia 20 --repeticiones 200
+
+Cada escenario ejecuta la misma lectura `repeticiones` veces con `concurrencia` lecturas
+simultáneas: el síncrono con un ThreadPoolExecutor y el asíncrono con asyncio.gather
+limitado por un semáforo, ambos contra la base configurada en el .env.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.config.firebase_config import firebase_config
+from backend.services.asincrono import ejecutar
+from backend.services.cache import cache_referencias
+from backend.services.calendario import lunes_de, obtener_semana
+from backend.services.horarios import configuracion_horarios
+from backend.services.ocupacion import horarios_ocupados
+from backend.services.paginacion import PaginaEnStream
+from backend.services.lecturas_async import (
+    cliente, obtener_semana_async, horarios_ocupados_async, pagina_async
+)
+from backend.routes.api import ORDEN_CITAS
+
+
+def resumen(nombre, latencias, duracion):
+    latencias = sorted(latencias)
+    p95 = latencias[max(0, int(len(latencias) * 0.95) - 1)]
+    print(f"{nombre:<28} {len(latencias) / duracion:8.1f} req/s   "
+          f"p50 {statistics.median(latencias) * 1000:7.1f} ms   p95 {p95 * 1000:7.1f} ms")
+
+
+def medir_sync(funcion, concurrencia, repeticiones):
+    def una():
+        inicio = time.perf_counter()
+        funcion()
+        return time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as executor:
+        latencias = list(executor.map(lambda _: una(), range(repeticiones)))
+    return latencias, time.perf_counter() - inicio
+
+
+async def _medir_async(funcion, concurrencia, repeticiones):
+    semaforo = asyncio.Semaphore(concurrencia)
+
+    async def una():
+        async with semaforo:
+            inicio = time.perf_counter()
+            await funcion()
+            return time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    latencias = await asyncio.gather(*[una() for _ in range(repeticiones)])
+    return latencias, time.perf_counter() - inicio
+
+
+def medir_async(funcion, concurrencia, repeticiones):
+    return ejecutar(_medir_async(funcion, concurrencia, repeticiones))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fecha', default=time.strftime('%Y-%m-%d'), help='Fecha de la semana y de la disponibilidad')
+    parser.add_argument('--concurrencia', type=int, default=20)
+    parser.add_argument('--repeticiones', type=int, default=200)
+    parser.add_argument('--con-cache', action='store_true', help='No limpiar el cache entre escenarios')
+    args = parser.parse_args()
+
+    db = firebase_config.get_db()
+    if db is None:
+        sys.exit('Firebase no está configurado (revisar .env)')
+
+    lunes = lunes_de(args.fecha)
+    horarios = configuracion_horarios.obtener_horarios(db)
+
+    async def pagina_citas():
+        return await pagina_async(cliente().collection('citas'), ORDEN_CITAS, 50)
+
+    escenarios = [
+        ('semana', lambda: obtener_semana(db, lunes), lambda: obtener_semana_async(cliente(), lunes)),
+        ('disponibilidad', lambda: horarios_ocupados(db, args.fecha, horarios),
+         lambda: horarios_ocupados_async(cliente(), args.fecha, horarios)),
+        ('citas (página de 50)', lambda: list(PaginaEnStream(db.collection('citas'), ORDEN_CITAS, 50)),
+         pagina_citas),
+    ]
+
+    print(f"concurrencia={args.concurrencia} repeticiones={args.repeticiones} semana={lunes}\n")
+    for nombre, sync, asincrona in escenarios:
+        # Calentar conexiones de ambos clientes
+        sync()
+        ejecutar(asincrona())
+
+        for etiqueta, medir, funcion in [('sync', medir_sync, sync), ('async', medir_async, asincrona)]:
+            if not args.con_cache:
+                cache_referencias.limpiar()
+            latencias, duracion = medir(funcion, args.concurrencia, args.repeticiones)
+            resumen(f"{nombre} [{etiqueta}]", latencias, duracion)
+        print()
+
+
+if __name__ == '__main__':
+    main()
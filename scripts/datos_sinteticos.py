@@ -0,0 +1,190 @@
+"""
+Datos sintéticos del centro para pruebas de carga y de presupuesto de consultas.
+
+Uso:
+    python scripts/datos_sinteticos.py --pacientes 5000 --citas 50000 --salida datos.json
+    FIRESTORE_BACKEND=memoria FIRESTORE_MEMORIA_DATOS=datos.json flask run
+
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python scripts/datos_sinteticos.py --poblar
+
+Genera pacientes, servicios, especialidades, usuarios (un administrador y profesionales),
+la configuración de horarios y citas en bloques libres del único box, repartidas en las
+semanas alrededor de hoy. También genera lo que la app mantiene junto a las citas: el
+índice ocupacion_horarios y los documentos de calendario_semanas ya materializados.
+Con --poblar escribe en la base configurada, sobrescribiendo la configuración de horarios
+y usuarios_sistema/admin: solo corre contra el emulador (FIRESTORE_EMULATOR_HOST) salvo que
+se indique --proyecto-de-prueba con el ID del proyecto del .env, para confirmar que no es producción.
+"""
+import os
+import sys
+import json
+import random
+import argparse
+from datetime import datetime, date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.busqueda import tokens_paciente
+from backend.services.calendario import COLECCION_SEMANAS, ESTADOS_OCULTOS, lunes_de, clave_cita, entrada_calendario
+from backend.services.horarios import CONFIGURACION_POR_DEFECTO, calcular_bloques
+from backend.services.ocupacion import COLECCION_OCUPACION, clave_bloque, datos_ocupacion
+from backend.services.referencias import agregar_nombres
+
+UID_ADMINISTRADOR = 'carga-admin'
+EMAIL_ADMINISTRADOR = 'admin@carga.local'
+
+# Ocupación de los bloques de lunes a viernes (deja horarios libres para agendar)
+OCUPACION = 0.8
+PROPORCION_PENDIENTES = 0.02
+
+NOMBRES = ['Sofía', 'Mateo', 'Valentina', 'Benjamín', 'Isidora', 'Agustín', 'Emilia', 'Vicente',
+           'Florencia', 'Tomás', 'Josefa', 'Joaquín', 'Martina', 'Lucas', 'Catalina', 'Gaspar']
+APELLIDOS = ['González', 'Muñoz', 'Rojas', 'Díaz', 'Pérez', 'Soto', 'Contreras', 'Silva',
+             'Martínez', 'Sepúlveda', 'Morales', 'Rodríguez', 'López', 'Fuentes', 'Hernández']
+ESPECIALIDADES = [('FLGA', 'Fonoaudiología Infantil'), ('TO', 'Terapia Ocupacional'), ('PSI', 'Psicología Infantil')]
+
+
+def _nombre(azar):
+    return f"{azar.choice(NOMBRES)} {azar.choice(APELLIDOS)} {azar.choice(APELLIDOS)}"
+
+
+def generar(pacientes=500, citas=5000, profesionales=6, servicios=8, semilla=1, hoy=None,
+            uid_administrador=UID_ADMINISTRADOR):
+    """Retorna {coleccion: {doc_id: datos}}"""
+    azar = random.Random(semilla)
+    hoy = hoy or date.today()
+    ahora = datetime.now().isoformat()
+    datos = {}
+
+    datos['horarios'] = {'configuracion_centro': dict(CONFIGURACION_POR_DEFECTO, version=1)}
+    datos['especialidades'] = {
+        f"esp-{codigo.lower()}": {'nombre': nombre, 'codigo': codigo, 'descripcion': '', 'estado': 'activa'}
+        for codigo, nombre in ESPECIALIDADES
+    }
+    especialidades = list(datos['especialidades'])
+
+    datos['usuarios_sistema'] = {'admin': {
+        'uid': uid_administrador, 'nombre': 'Administración', 'email': EMAIL_ADMINISTRADOR,
+        'rol': 'administrador', 'estado': 'activo'
+    }}
+    for i in range(profesionales):
+        datos['usuarios_sistema'][f"prof-{i}"] = {
+            'uid': f"carga-prof-{i}", 'nombre': _nombre(azar), 'email': f"prof{i}@carga.local",
+            'rol': 'profesional', 'estado': 'activo', 'especialidad_id': especialidades[i % len(especialidades)]
+        }
+
+    datos['servicios'] = {
+        f"serv-{i}": {
+            'nombre': f"Sesión {i + 1}", 'especialidad_id': especialidades[i % len(especialidades)],
+            'duracion': 45, 'precio': 25000, 'descripcion': '', 'estado': 'activo', 'fecha_creacion': ahora
+        } for i in range(servicios)
+    }
+
+    datos['pacientes'] = {}
+    for i in range(pacientes):
+        paciente = {
+            'nombre_paciente': _nombre(azar),
+            'fecha_nacimiento': (hoy - timedelta(days=azar.randint(2 * 365, 14 * 365))).strftime('%Y-%m-%d'),
+            'nombre_apoderado': _nombre(azar),
+            'telefono': f"+569{azar.randint(10000000, 99999999)}",
+            'email': '',
+            'estado': 'activo',
+            'fecha_registro': (datetime.now() - timedelta(days=azar.randint(0, 900))).isoformat()
+        }
+        paciente['tokens_busqueda'] = sorted(tokens_paciente(paciente))
+        datos['pacientes'][f"pac-{i}"] = paciente
+
+    # Bloques de lunes a viernes, centrados en la semana actual
+    bloques = calcular_bloques(CONFIGURACION_POR_DEFECTO)
+    semanas = max(1, -(-citas // int(5 * len(bloques) * OCUPACION)))
+    inicio = datetime.strptime(lunes_de(hoy.strftime('%Y-%m-%d')), '%Y-%m-%d') - timedelta(weeks=semanas // 2)
+    libres = [
+        ((inicio + timedelta(weeks=semana, days=dia)).strftime('%Y-%m-%d'), hora)
+        for semana in range(semanas) for dia in range(5) for hora in bloques
+    ]
+    ocupados = sorted(azar.sample(libres, min(citas, len(libres))))
+
+    ids_pacientes = list(datos['pacientes'])
+    ids_servicios = list(datos['servicios'])
+    ids_profesionales = [f"prof-{i}" for i in range(profesionales)]
+    referencias = {coleccion: datos[coleccion] for coleccion in ('pacientes', 'servicios', 'usuarios_sistema')}
+    datos['citas'] = {}
+    datos[COLECCION_OCUPACION] = {}
+    for i, (fecha, hora) in enumerate(ocupados):
+        cita_id = f"cita-{i}"
+        cita = {
+            'fecha': fecha, 'hora': hora,
+            'paciente_id': azar.choice(ids_pacientes),
+            'servicio_id': azar.choice(ids_servicios),
+            'profesional_id': azar.choice(ids_profesionales),
+            'estado': 'pendiente_reprogramacion' if azar.random() < PROPORCION_PENDIENTES else 'programada',
+            'observaciones': '',
+            'fecha_creacion': ahora,
+            'creado_por': uid_administrador
+        }
+        agregar_nombres(cita, referencias)
+        datos['citas'][cita_id] = cita
+        if cita['estado'] not in ESTADOS_OCULTOS:
+            datos[COLECCION_OCUPACION][clave_bloque(fecha, hora)] = datos_ocupacion(cita_id, cita)
+
+    # Semanas materializadas, como las deja reconstruir_semana
+    datos[COLECCION_SEMANAS] = {}
+    for semana in range(semanas):
+        lunes = (inicio + timedelta(weeks=semana)).strftime('%Y-%m-%d')
+        datos[COLECCION_SEMANAS][lunes] = {'lunes': lunes, 'citas': {}, 'completa': True, 'fecha_modificacion': ahora}
+    for cita_id, cita in datos['citas'].items():
+        if cita['estado'] not in ESTADOS_OCULTOS:
+            semana = datos[COLECCION_SEMANAS][lunes_de(cita['fecha'])]
+            semana['citas'][clave_cita(cita)] = entrada_calendario(cita_id, cita, referencias)
+
+    return datos
+
+
+def poblar(db, datos, lote=500):
+    """Escribe los datos en la base con batches de hasta 500 escrituras"""
+    escrituras = [(coleccion, doc_id, documento)
+                  for coleccion, documentos in datos.items() for doc_id, documento in documentos.items()]
+    for inicio in range(0, len(escrituras), lote):
+        batch = db.batch()
+        for coleccion, doc_id, documento in escrituras[inicio:inicio + lote]:
+            batch.set(db.collection(coleccion).document(doc_id), documento)
+        batch.commit()
+    return len(escrituras)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pacientes', type=int, default=500)
+    parser.add_argument('--citas', type=int, default=5000)
+    parser.add_argument('--profesionales', type=int, default=6)
+    parser.add_argument('--servicios', type=int, default=8)
+    parser.add_argument('--semilla', type=int, default=1)
+    parser.add_argument('--uid-administrador', default=UID_ADMINISTRADOR,
+                        help='UID de Firebase Auth del administrador (al usar el emulador de Auth)')
+    parser.add_argument('--salida', help='Archivo JSON para FIRESTORE_MEMORIA_DATOS')
+    parser.add_argument('--poblar', action='store_true', help='Escribir en la base configurada (emulador)')
+    parser.add_argument('--proyecto-de-prueba', metavar='PROYECTO',
+                        help='Permite --poblar fuera del emulador si coincide con el proyecto configurado')
+    args = parser.parse_args()
+
+    datos = generar(args.pacientes, args.citas, args.profesionales, args.servicios, args.semilla,
+                    uid_administrador=args.uid_administrador)
+    print(', '.join(f"{coleccion}: {len(documentos)}" for coleccion, documentos in datos.items()))
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            json.dump(datos, archivo, ensure_ascii=False)
+        print(f"Guardado en {args.salida}")
+
+    if args.poblar:
+        from backend.config.firebase_config import firebase_config
+        db = firebase_config.get_db()
+        proyecto = getattr(db, 'project', None)
+        if not os.getenv('FIRESTORE_EMULATOR_HOST') and (not proyecto or args.proyecto_de_prueba != proyecto):
+            sys.exit(f"--poblar sobrescribe datos del proyecto '{proyecto}'. Usa el emulador "
+                     f"(FIRESTORE_EMULATOR_HOST) o confirma con --proyecto-de-prueba {proyecto}")
+        print(f"Escritos {poblar(db, datos)} documentos")
+
+
+if __name__ == '__main__':
+    main()
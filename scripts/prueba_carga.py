@@ -0,0 +1,334 @@
+"""
+Prueba de carga con la mezcla de tráfico del centro.
+
+Uso:
+    # En proceso, contra Firestore en memoria con datos sintéticos (no necesita credenciales)
+    python scripts/prueba_carga.py --usuarios 20 --duracion 60 --latencia-ms 25 --salida carga.json
+
+    # Contra un servidor corriendo (con el emulador de Firestore/Auth o un proyecto de prueba)
+    python scripts/prueba_carga.py --url http://localhost:5000 --email admin@carga.local --password ...
+
+    # Comparar con una corrida anterior (por ejemplo la del commit base)
+    python scripts/prueba_carga.py --salida nueva.json --comparar carga.json
+
+Cada usuario virtual inicia sesión y repite acciones elegidas según PESOS_ACCIONES:
+navegar semanas del calendario (con If-None-Match, como el navegador), consultar
+/api/horarios-fecha, agendar con /citas/nueva (GET + POST) y reprogramar
+(marcar la cita, abrir /reprogramaciones/<id>/reprogramar y asignar el nuevo bloque).
+Reporta por ruta: cantidad, errores, p50/p95/p99 y el tiempo en Firestore del header
+Server-Timing; y el throughput total. En proceso, iniciar sesión carga /login y
+escribe la sesión directamente, porque no hay Firebase Auth en memoria.
+Los resultados incluyen el commit, así las corridas se pueden comparar entre cambios.
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import subprocess
+from datetime import date, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+# Bajo carga casi todo request pasaría el umbral del log de consultas lentas
+os.environ.setdefault('FIRESTORE_LOG_UMBRAL_MS', '1e9')
+
+from scripts.datos_sinteticos import generar, UID_ADMINISTRADOR, EMAIL_ADMINISTRADOR
+
+PESOS_ACCIONES = {
+    'calendario': 40,
+    'horarios_fecha': 30,
+    'nueva_cita': 15,
+    'reprogramar': 10,
+    'login': 5,
+}
+
+# Días hacia adelante en que se agenda y se consultan horarios
+DIAS_AGENDA = 28
+
+SERVER_TIMING = re.compile(r'firestore;dur=([\d.]+)')
+
+
+class ClienteEnProceso:
+    """Usuario sobre el test client de Flask (la app y Firestore en memoria en este proceso)"""
+
+    def __init__(self, app):
+        self._app = app
+        self._cliente = app.test_client()
+
+    def iniciar_sesion(self, email, password):
+        respuesta = self._cliente.get('/login')
+        self._cliente = self._app.test_client()
+        with self._cliente.session_transaction() as sesion:
+            sesion['user_id'] = UID_ADMINISTRADOR
+            sesion['user_email'] = EMAIL_ADMINISTRADOR
+        return respuesta.status_code, respuesta.headers
+
+    def solicitar(self, metodo, ruta, **kwargs):
+        respuesta = self._cliente.open(ruta, method=metodo, **kwargs)
+        # Recorrer el cuerpo completo (las respuestas en streaming se generan recién aquí)
+        respuesta.get_data()
+        respuesta.close()
+        return respuesta.status_code, respuesta.headers
+
+
+class ClienteHttp:
+    """Usuario sobre HTTP contra un servidor en ejecución"""
+
+    def __init__(self, url):
+        import requests
+        self._url = url.rstrip('/')
+        self._requests = requests
+        self._sesion = requests.Session()
+
+    def iniciar_sesion(self, email, password):
+        self._sesion = self._requests.Session()
+        return self.solicitar('POST', '/login', data={'email': email, 'password': password})
+
+    def solicitar(self, metodo, ruta, data=None, json=None, headers=None):
+        respuesta = self._sesion.request(metodo, self._url + ruta, data=data, json=json, headers=headers,
+                                         allow_redirects=False, timeout=30)
+        return respuesta.status_code, respuesta.headers
+
+
+class Resultados:
+    """Latencias, errores y tiempo de Firestore por ruta"""
+
+    def __init__(self):
+        self.rutas = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, ruta, segundos, error, headers=None):
+        firestore_ms = None
+        coincidencia = SERVER_TIMING.search((headers or {}).get('Server-Timing', ''))
+        if coincidencia:
+            firestore_ms = float(coincidencia.group(1))
+        with self._lock:
+            datos = self.rutas.setdefault(ruta, {'latencias': [], 'errores': 0, 'firestore_ms': []})
+            datos['latencias'].append(segundos)
+            datos['errores'] += int(error)
+            if firestore_ms is not None:
+                datos['firestore_ms'].append(firestore_ms)
+
+    def resumen(self, duracion):
+        def percentil(valores, p):
+            return round(valores[min(len(valores) - 1, int(len(valores) * p))] * 1000, 1)
+
+        rutas = {}
+        for ruta, datos in sorted(self.rutas.items()):
+            latencias = sorted(datos['latencias'])
+            rutas[ruta] = {
+                'solicitudes': len(latencias),
+                'errores': datos['errores'],
+                'tasa_error': round(datos['errores'] / len(latencias), 4),
+                'por_segundo': round(len(latencias) / duracion, 2),
+                'p50_ms': percentil(latencias, 0.50),
+                'p95_ms': percentil(latencias, 0.95),
+                'p99_ms': percentil(latencias, 0.99),
+                'firestore_ms_promedio': (round(sum(datos['firestore_ms']) / len(datos['firestore_ms']), 1)
+                                          if datos['firestore_ms'] else None)
+            }
+        total = sum(ruta['solicitudes'] for ruta in rutas.values())
+        errores = sum(ruta['errores'] for ruta in rutas.values())
+        return {
+            'duracion_segundos': round(duracion, 1),
+            'solicitudes': total,
+            'por_segundo': round(total / duracion, 2),
+            'tasa_error': round(errores / total, 4) if total else 0.0,
+            'rutas': rutas
+        }
+
+
+class UsuarioVirtual:
+    """Recorre la mezcla de acciones con un cliente propio"""
+
+    def __init__(self, cliente, resultados, datos, args, azar, indice=0):
+        self.cliente = cliente
+        self.resultados = resultados
+        self.args = args
+        self.azar = azar
+        self.etags = {}
+        self.pacientes = list(datos['pacientes'])
+        self.servicios = list(datos['servicios'])
+        self.profesionales = [doc_id for doc_id, usuario in datos['usuarios_sistema'].items()
+                              if usuario['rol'] == 'profesional']
+        self.horas = [f"{hora:02d}:00" for hora in range(9, 19)]
+        hoy = date.today().strftime('%Y-%m-%d')
+        # Citas futuras que este usuario puede reprogramar (cada usuario tiene las suyas)
+        self.citas = [cita_id for cita_id, cita in datos['citas'].items()
+                      if cita['fecha'] > hoy and cita['estado'] == 'programada'][indice::args.usuarios]
+        self.semana = 0
+
+    def _medir(self, ruta, metodo, url, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            status, headers = self.cliente.solicitar(metodo, url, **kwargs)
+        except Exception as e:
+            print(f"Error en {ruta}: {e}")
+            self.resultados.registrar(ruta, time.perf_counter() - inicio, True)
+            return None, {}
+        # Un redirect a /login significa que se perdió la sesión
+        error = status >= 400 or '/login' in headers.get('Location', '')
+        self.resultados.registrar(ruta, time.perf_counter() - inicio, error, headers)
+        return status, headers
+
+    def _fecha_futura(self):
+        dia = date.today() + timedelta(days=self.azar.randint(1, DIAS_AGENDA))
+        if dia.weekday() > 4:
+            dia += timedelta(days=7 - dia.weekday())
+        return dia.strftime('%Y-%m-%d')
+
+    def login(self):
+        inicio = time.perf_counter()
+        try:
+            status, headers = self.cliente.iniciar_sesion(self.args.email, self.args.password)
+            error = status >= 400
+        except Exception as e:
+            print(f"Error en login: {e}")
+            error, headers = True, {}
+        self.resultados.registrar('login', time.perf_counter() - inicio, error, headers)
+        self.etags = {}
+
+    def calendario(self):
+        # Se navega una semana hacia adelante o atrás, o se vuelve a la actual
+        self.semana = self.azar.choice([self.semana - 1, self.semana + 1, 0])
+        lunes = date.today() - timedelta(days=date.today().weekday()) + timedelta(weeks=self.semana)
+        url = f"/calendario?fecha_inicio={lunes.strftime('%Y-%m-%d')}"
+        headers = {'If-None-Match': self.etags[url]} if url in self.etags else {}
+        status, respuesta = self._medir('GET /calendario', 'GET', url, headers=headers)
+        if status == 200 and respuesta.get('ETag'):
+            self.etags[url] = respuesta['ETag']
+
+    def horarios_fecha(self):
+        self._medir('POST /api/horarios-fecha', 'POST', '/api/horarios-fecha', json={'fecha': self._fecha_futura()})
+
+    def nueva_cita(self):
+        fecha, hora = self._fecha_futura(), self.azar.choice(self.horas)
+        url = f"/citas/nueva?fecha={fecha}&hora={hora}"
+        self._medir('GET /citas/nueva', 'GET', url)
+        self._medir('POST /citas/nueva', 'POST', url, data={
+            'paciente_id': self.azar.choice(self.pacientes),
+            'servicio_id': self.azar.choice(self.servicios),
+            'profesional_id': self.azar.choice(self.profesionales),
+            'observaciones': 'prueba de carga'
+        })
+
+    def reprogramar(self):
+        if not self.citas:
+            return
+        cita_id = self.citas.pop(self.azar.randrange(len(self.citas)))
+        self._medir('POST /citas/<id>/reprogramar', 'POST', f"/citas/{cita_id}/reprogramar",
+                    data={'motivo': 'prueba de carga'})
+        url = f"/reprogramaciones/{cita_id}/reprogramar"
+        self._medir('GET /reprogramaciones/<id>/reprogramar', 'GET', url)
+        self._medir('POST /reprogramaciones/<id>/reprogramar', 'POST', url, data={
+            'nueva_fecha': self._fecha_futura(),
+            'nueva_hora': self.azar.choice(self.horas),
+            'profesional_id': self.azar.choice(self.profesionales),
+            'observaciones': 'prueba de carga'
+        })
+
+    def ejecutar(self, hasta):
+        self.login()
+        acciones, pesos = zip(*PESOS_ACCIONES.items())
+        while time.monotonic() < hasta:
+            getattr(self, self.azar.choices(acciones, pesos)[0])()
+            if self.args.pausa_ms:
+                time.sleep(self.azar.expovariate(1000 / self.args.pausa_ms))
+
+
+def commit_actual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def preparar_en_proceso(datos, latencia_ms):
+    """Importa la app con Firestore en memoria cargado con los datos sintéticos"""
+    os.environ['FIRESTORE_BACKEND'] = 'memoria'
+    os.environ['FIRESTORE_LATENCIA_MS'] = str(latencia_ms)
+    from app import app
+    from backend.config.firebase_config import firebase_config
+    firebase_config.get_db().cargar(datos)
+    return app
+
+
+def imprimir(resumen, base=None):
+    print(f"\n{resumen['solicitudes']} solicitudes en {resumen['duracion_segundos']}s: "
+          f"{resumen['por_segundo']}/s, errores {resumen['tasa_error']:.2%}")
+    if base:
+        print(f"  base: {base['por_segundo']}/s, errores {base['tasa_error']:.2%}")
+    print(f"\n{'ruta':<42} {'n':>6} {'err%':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'fs ms':>8}"
+          + (f" {'Δp95':>8}" if base else ''))
+    for ruta, datos in resumen['rutas'].items():
+        linea = (f"{ruta:<42} {datos['solicitudes']:>6} {datos['tasa_error']:>6.1%} {datos['p50_ms']:>8} "
+                 f"{datos['p95_ms']:>8} {datos['p99_ms']:>8} {datos['firestore_ms_promedio'] or '-':>8}")
+        if base and ruta in base['rutas']:
+            linea += f" {datos['p95_ms'] - base['rutas'][ruta]['p95_ms']:>+8.1f}"
+        print(linea)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='Servidor en ejecución (sin --url la app corre en este proceso, en memoria)')
+    parser.add_argument('--email', default=EMAIL_ADMINISTRADOR)
+    parser.add_argument('--password', default='')
+    parser.add_argument('--usuarios', type=int, default=10, help='Usuarios virtuales simultáneos')
+    parser.add_argument('--duracion', type=float, default=30, help='Segundos de carga')
+    parser.add_argument('--pausa-ms', type=float, default=0, help='Pausa media entre acciones de un usuario')
+    parser.add_argument('--latencia-ms', type=float, default=20, help='Latencia por RPC de Firestore en memoria')
+    parser.add_argument('--pacientes', type=int, default=500)
+    parser.add_argument('--citas', type=int, default=5000)
+    parser.add_argument('--semilla', type=int, default=1)
+    parser.add_argument('--salida', help='Guardar el resultado en JSON')
+    parser.add_argument('--comparar', help='Resultado JSON anterior con el que comparar')
+    args = parser.parse_args()
+
+    datos = generar(args.pacientes, args.citas, semilla=args.semilla)
+    if args.url:
+        crear_cliente = lambda: ClienteHttp(args.url)
+    else:
+        app = preparar_en_proceso(datos, args.latencia_ms)
+        crear_cliente = lambda: ClienteEnProceso(app)
+
+    hasta = time.monotonic() + args.duracion
+    resultados = Resultados()
+    hilos = [
+        threading.Thread(target=UsuarioVirtual(crear_cliente(), resultados, datos, args,
+                                               random.Random(args.semilla * 1000 + i), i).ejecutar, args=(hasta,))
+        for i in range(args.usuarios)
+    ]
+    inicio = time.monotonic()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    resumen = resultados.resumen(time.monotonic() - inicio)
+    resumen['configuracion'] = {clave: valor for clave, valor in vars(args).items()
+                                if clave not in ('password', 'salida', 'comparar')}
+    resumen['commit'] = commit_actual()
+
+    base = None
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as archivo:
+            base = json.load(archivo)
+    imprimir(resumen, base)
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            json.dump(resumen, archivo, indent=2, ensure_ascii=False)
+            archivo.write('\n')
+        print(f"\nResultado guardado en {args.salida}")
+
+    sys.exit(1 if resumen['solicitudes'] == 0 else 0)
+
+
+if __name__ == '__main__':
+    main()
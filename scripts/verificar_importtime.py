@@ -0,0 +1,112 @@
+"""
+Presupuesto de tiempo de importación de app.py (arranque en frío).
+
+Uso:
+    python scripts/verificar_importtime.py                  # compara con la línea base
+    python scripts/verificar_importtime.py --actualizar     # registra una nueva línea base
+
+Importa `app` con `python -X importtime` en un proceso nuevo (varias veces, se usa el
+mínimo, que es lo menos afectado por la carga de la máquina) y muestra los módulos más
+costosos. Termina con código 1 si se cargó algún módulo pesado que debe importarse recién
+en el primer uso (ver backend/config/dependencias.py), o si el tiempo total supera la línea
+base en más del umbral. El tiempo solo se exige si la línea base se registró con la misma
+versión de Python en el mismo host; si no, la regresión se informa como advertencia.
+"""
+import os
+import re
+import sys
+import json
+import platform
+import argparse
+import subprocess
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ARCHIVO_BASE = os.path.join(RAIZ, 'scripts', 'importtime_base.json')
+
+# No deben importarse al cargar app.py
+MODULOS_DIFERIDOS = ['firebase_admin', 'google.cloud.firestore', 'grpc', 'requests']
+
+LINEA = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$')
+
+
+def medir():
+    """Retorna (total_us, {modulo: (propio_us, acumulado_us)}) de un import de app en frío"""
+    resultado = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=RAIZ, capture_output=True, text=True,
+        env=dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    )
+    if resultado.returncode != 0:
+        sys.exit(f"No se pudo importar app:\n{resultado.stderr[-2000:]}")
+
+    modulos = {}
+    for linea in resultado.stderr.splitlines():
+        coincidencia = LINEA.match(linea)
+        if coincidencia:
+            propio, acumulado, _, modulo = coincidencia.groups()
+            modulos[modulo] = (int(propio), int(acumulado))
+    return modulos['app'][1], modulos
+
+
+def entorno():
+    """Dónde se mide: el tiempo solo es comparable con una línea base del mismo entorno"""
+    return {'python': sys.version.split()[0], 'host': platform.node()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticiones', type=int, default=10)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--umbral', type=float, help='Regresión permitida sobre la línea base (0.25 = 25%%)')
+    parser.add_argument('--actualizar', action='store_true', help='Guardar la medición como nueva línea base')
+    args = parser.parse_args()
+
+    mediciones = [medir() for _ in range(args.repeticiones)]
+    total, modulos = min(mediciones, key=lambda medicion: medicion[0])
+
+    print(f"import app: {total / 1000:.1f} ms (mínimo de {args.repeticiones})\n")
+    print(f"{'acumulado ms':>12} {'propio ms':>10}  módulo")
+    for modulo, (propio, acumulado) in sorted(modulos.items(), key=lambda item: -item[1][1])[:args.top]:
+        print(f"{acumulado / 1000:>12.1f} {propio / 1000:>10.1f}  {modulo}")
+    print()
+
+    errores = []
+    advertencias = []
+    cargados = [modulo for modulo in MODULOS_DIFERIDOS if modulo in modulos]
+    if cargados:
+        errores.append(f"Módulos que deben importarse en el primer uso: {', '.join(cargados)}")
+
+    base = {}
+    if os.path.exists(ARCHIVO_BASE):
+        with open(ARCHIVO_BASE) as archivo:
+            base = json.load(archivo)
+
+    if args.actualizar:
+        base = dict(entorno(), total_us=total, umbral=args.umbral or base.get('umbral', 0.25))
+        with open(ARCHIVO_BASE, 'w') as archivo:
+            json.dump(base, archivo, indent=2)
+            archivo.write('\n')
+        print(f"Línea base actualizada: {total / 1000:.1f} ms")
+    elif base:
+        umbral = args.umbral if args.umbral is not None else base.get('umbral', 0.25)
+        limite = base['total_us'] * (1 + umbral)
+        print(f"Línea base: {base['total_us'] / 1000:.1f} ms, límite: {limite / 1000:.1f} ms (+{umbral:.0%})")
+        if total > limite:
+            mensaje = f"import app tomó {total / 1000:.1f} ms, sobre el límite de {limite / 1000:.1f} ms"
+            if all(base.get(clave) == valor for clave, valor in entorno().items()):
+                errores.append(mensaje)
+            else:
+                advertencias.append(f"{mensaje} (línea base de otro entorno: "
+                                    f"python {base.get('python')} en {base.get('host')})")
+    else:
+        print('Sin línea base registrada (usar --actualizar)')
+
+    for advertencia in advertencias:
+        print(f"ADVERTENCIA: {advertencia}")
+    for error in errores:
+        print(f"ERROR: {error}")
+    sys.exit(1 if errores else 0)
+
+
+if __name__ == '__main__':
+    main()
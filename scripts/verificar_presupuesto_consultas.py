@@ -0,0 +1,140 @@
+"""
+Presupuesto de consultas a Firestore por ruta.
+
+Uso:
+    python scripts/verificar_presupuesto_consultas.py                          # 5000 pacientes, 50000 citas
+    python scripts/verificar_presupuesto_consultas.py --pacientes 500 --citas 5000
+
+Renderiza cada ruta en este proceso contra Firestore en memoria cargado con datos
+sintéticos (scripts/datos_sinteticos.py) y cuenta los RPC de lectura (consultas más
+lecturas por referencia) y los documentos devueltos, con el mismo contador que arma el
+header Server-Timing. Cada ruta se mide con el cache de referencias vacío, que es el peor
+caso. Termina con código 1 si alguna ruta supera su presupuesto o responde con error: un
+cambio que vuelva a leer una cita o un paciente por fila (N+1) lo hace fallar.
+Las rutas /api/async/* no se miden: el backend en memoria no tiene cliente asíncrono.
+"""
+import os
+import sys
+import time
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.datos_sinteticos import generar, UID_ADMINISTRADOR, EMAIL_ADMINISTRADOR
+from scripts.prueba_carga import preparar_en_proceso
+from backend.services.cache import cache_referencias
+from backend.services.consumo_firestore import consumo_actual
+from backend.services.horarios import configuracion_horarios
+from backend.services.roles import ROL_TTL_SEGUNDOS
+
+# Máximo de RPC de lectura y de documentos devueltos por ruta. No dependen del tamaño de
+# los datos, salvo /reprogramaciones, que lista todas las citas pendientes (documentos=None)
+PRESUPUESTOS = {
+    'GET /calendario': {'rpc': 4, 'documentos': 10},
+    'GET /reprogramaciones': {'rpc': 2, 'documentos': None},
+    'GET /servicios': {'rpc': 3, 'documentos': 15},
+    'GET /usuarios': {'rpc': 3, 'documentos': 15},
+    'GET /pacientes': {'rpc': 3, 'documentos': 55},
+    'GET /citas/nueva': {'rpc': 3, 'documentos': 20},
+    'GET /api/citas': {'rpc': 3, 'documentos': 55},
+    'GET /api/pacientes': {'rpc': 4, 'documentos': 55},
+    'GET /api/pacientes/buscar': {'rpc': 3, 'documentos': 15},
+    'GET /api/servicios': {'rpc': 3, 'documentos': 15},
+    'POST /api/horarios-fecha': {'rpc': 3, 'documentos': 15},
+    'POST /api/citas': {'rpc': 6, 'documentos': 10},
+    'POST /api/citas/bulk': {'rpc': 7, 'documentos': 15},
+    'PUT /api/citas/<id>/reprogramar': {'rpc': 4, 'documentos': 10},
+}
+
+
+def solicitudes(datos):
+    """[(ruta, método, url, kwargs)] con IDs tomados de los datos sintéticos"""
+    paciente_id = next(iter(datos['pacientes']))
+    servicio_id = next(iter(datos['servicios']))
+    profesional_id = next(doc_id for doc_id, usuario in datos['usuarios_sistema'].items()
+                          if usuario['rol'] == 'profesional')
+    lunes = max(datos['calendario_semanas'], key=lambda lunes: len(datos['calendario_semanas'][lunes]['citas']))
+    cita_id = next(doc_id for doc_id, cita in datos['citas'].items()
+                   if cita['fecha'] >= lunes and cita['estado'] == 'programada')
+    nombre = datos['pacientes'][paciente_id]['nombre_paciente'].split()[0]
+
+    # Bloques libres de la semana con más citas (sábado: la semana sintética es de lunes a viernes)
+    sabado = (datetime.strptime(lunes, '%Y-%m-%d') + timedelta(days=5)).strftime('%Y-%m-%d')
+    nueva = {'paciente_id': paciente_id, 'servicio_id': servicio_id, 'profesional_id': profesional_id}
+    return [
+        ('GET /calendario', 'GET', f"/calendario?fecha_inicio={lunes}", {}),
+        ('GET /reprogramaciones', 'GET', '/reprogramaciones', {}),
+        ('GET /servicios', 'GET', '/servicios', {}),
+        ('GET /usuarios', 'GET', '/usuarios', {}),
+        ('GET /pacientes', 'GET', '/pacientes', {}),
+        ('GET /citas/nueva', 'GET', f"/citas/nueva?fecha={lunes}&hora=09:00", {}),
+        ('GET /api/citas', 'GET', f"/api/citas?fecha_desde={lunes}&fecha_hasta={sabado}", {}),
+        ('GET /api/pacientes', 'GET', '/api/pacientes', {}),
+        ('GET /api/pacientes/buscar', 'GET', f"/api/pacientes/buscar?q={nombre}", {}),
+        ('GET /api/servicios', 'GET', '/api/servicios', {}),
+        ('POST /api/horarios-fecha', 'POST', '/api/horarios-fecha', {'json': {'fecha': lunes}}),
+        ('POST /api/citas', 'POST', '/api/citas', {'json': dict(nueva, fecha=sabado, hora='09:00')}),
+        ('POST /api/citas/bulk', 'POST', '/api/citas/bulk', {'json': {'citas': [
+            dict(nueva, fecha=sabado, hora=hora) for hora in ('10:00', '11:00', '12:00')
+        ]}}),
+        ('PUT /api/citas/<id>/reprogramar', 'PUT', f"/api/citas/{cita_id}/reprogramar", {'json': {'motivo': 'prueba'}}),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pacientes', type=int, default=5000)
+    parser.add_argument('--citas', type=int, default=50000)
+    parser.add_argument('--semilla', type=int, default=1)
+    args = parser.parse_args()
+
+    datos = generar(args.pacientes, args.citas, semilla=args.semilla)
+    app = preparar_en_proceso(datos, latencia_ms=0)
+
+    # El consumo de cada request (se lee después de recorrer la respuesta completa)
+    @app.before_request
+    def guardar_consumo():
+        medidos.append(consumo_actual())
+
+    medidos = []
+    configuracion_horarios.cargar()
+    cliente = app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion['user_id'] = UID_ADMINISTRADOR
+        sesion['user_email'] = EMAIL_ADMINISTRADOR
+        sesion['user_role'] = 'administrador'
+        sesion['user_role_expira'] = time.time() + ROL_TTL_SEGUNDOS
+
+    print(f"Datos: {args.pacientes} pacientes, {args.citas} citas\n")
+    print(f"{'ruta':<36} {'estado':>6} {'rpc':>5} {'docs':>6} {'escr':>5}  presupuesto")
+    errores = []
+    for ruta, metodo, url, kwargs in solicitudes(datos):
+        cache_referencias.limpiar()
+        medidos.clear()
+        respuesta = cliente.open(url, method=metodo, **kwargs)
+        respuesta.get_data()
+        respuesta.close()
+
+        consumo = medidos[0]
+        rpc = consumo.consultas + consumo.lecturas
+        presupuesto = PRESUPUESTOS[ruta]
+        print(f"{ruta:<36} {respuesta.status_code:>6} {rpc:>5} {consumo.documentos:>6} {consumo.escrituras:>5}  "
+              f"rpc<={presupuesto['rpc']} docs<={presupuesto['documentos'] or '-'}")
+
+        if respuesta.status_code >= 400:
+            errores.append(f"{ruta} respondió {respuesta.status_code}")
+        if rpc > presupuesto['rpc']:
+            errores.append(f"{ruta}: {rpc} RPC de lectura, presupuesto {presupuesto['rpc']}")
+        if presupuesto['documentos'] is not None and consumo.documentos > presupuesto['documentos']:
+            errores.append(f"{ruta}: {consumo.documentos} documentos, presupuesto {presupuesto['documentos']}")
+
+    print()
+    for error in errores:
+        print(f"ERROR: {error}")
+    print('Presupuesto de consultas: ' + ('FALLA' if errores else 'OK'))
+    sys.exit(1 if errores else 0)
+
+
+if __name__ == '__main__':
+    main()